@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+Admin Endpoint Authentication
+Operational endpoints take the same HMAC tokens as the profiler, created
+with `python profiler.py sign --ttl 300` and sent as X-Admin-Token. While
+PROFILE_SECRET is unset they answer 404, as if they did not exist.
+"""
+
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+from profiler import profile_controller
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """FastAPI dependency rejecting requests without a valid, unexpired token"""
+    if not profile_controller.enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not profile_controller.verify(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid or expired X-Admin-Token")
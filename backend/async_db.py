@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Async MySQL Data Access Layer
+Non-blocking queries on an aiomysql pool, so a slow statement never
+stalls the event loop for unrelated requests
+"""
+
+import asyncio
+import os
+import re
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Dict, Any, Callable, List, Optional, Sequence
+
+import aiomysql
+
+from db_pool import DB_CONFIG, PoolTimeoutError
+from metrics import metrics
+import server_timing
+
+
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+DB_QUERY_SECONDS = metrics.histogram(
+    "db_query_duration_seconds", "Statement execution time by statement name", ("statement",), buckets=QUERY_BUCKETS
+)
+DB_POOL_WAIT_SECONDS = metrics.histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", buckets=QUERY_BUCKETS
+)
+DB_POOL_TIMEOUTS = metrics.counter(
+    "db_pool_checkout_timeouts_total", "Checkouts that gave up waiting for a connection"
+)
+DB_POOL_CONNECTIONS = metrics.gauge(
+    "db_pool_connections", "Open pool connections by state", ("state",)
+)
+DB_POOL_WAITING = metrics.gauge(
+    "db_pool_waiting", "Coroutines currently waiting for a connection"
+)
+
+_STATEMENT_VERB = re.compile(r"[\s(]*(?:/\*.*?\*/[\s(]*)?(\w+)", re.DOTALL)
+_STATEMENT_TABLE = {
+    verb: re.compile(pattern + r"\s+`?(\w+)", re.IGNORECASE | re.DOTALL)
+    for verb, pattern in (("select", r"\bFROM"), ("delete", r"\bFROM"), ("insert", r"\bINTO"),
+                          ("replace", r"\bINTO"), ("update", r"^\s*UPDATE"), ("describe", r"^\s*DESCRIBE"))
+}
+
+
+@lru_cache(maxsize=1024)
+def statement_name(sql: str) -> str:
+    """
+    Low-cardinality metric label for a statement: verb plus first table,
+    e.g. "select xendit_payments"
+    """
+    match = _STATEMENT_VERB.match(sql)
+    if not match:
+        return "other"
+    verb = match.group(1).lower()
+    pattern = _STATEMENT_TABLE.get(verb)
+    table = pattern.search(sql) if pattern else None
+    return f"{verb} {table.group(1)}" if table else verb
+
+
+class TimedCursor:
+    """Cursor proxy that times execute/executemany; everything else is passed through"""
+
+    def __init__(self, database: "AsyncDatabase", cursor):
+        self._database = database
+        self._cursor = cursor
+
+    async def execute(self, sql: str, args: Optional[Sequence] = None):
+        return await self._database._execute(self._cursor, sql, args)
+
+    async def executemany(self, sql: str, args: Sequence):
+        return await self._database._execute(self._cursor, sql, args, many=True)
+
+    def __getattr__(self, name: str):
+        return getattr(self._cursor, name)
+
+
+class AsyncDatabase:
+    """Async connection pool plus query helpers shared by every handler"""
+
+    def __init__(self, minsize: int = 1, maxsize: int = 10, timeout: float = 10.0,
+                 max_lifetime: float = 1800.0, idle_timeout: float = 300.0,
+                 health_check_interval: float = 30.0, **connect_args):
+        """
+        Args:
+            minsize: Connections opened at startup and kept warm
+            maxsize: Maximum number of open connections
+            timeout: Seconds a checkout may wait for a free connection
+            max_lifetime: Seconds after which a connection is closed and replaced
+            idle_timeout: Seconds an unused connection may sit in the pool
+            health_check_interval: Ping connections idle longer than this on checkout (0 = always)
+            connect_args: Passed to aiomysql.connect
+        """
+        self.minsize = minsize
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.connect_args = connect_args
+        self.pool: Optional[aiomysql.Pool] = None
+        self._observers: List[Callable[[str, Any, float, bool], None]] = []
+
+        self._waiting = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._recycled = 0
+        self._failed_health_checks = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @classmethod
+    def from_env(cls) -> "AsyncDatabase":
+        connect_args = dict(DB_CONFIG)
+        connect_args["db"] = connect_args.pop("database")
+        return cls(
+            minsize=int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+            maxsize=int(os.getenv("DB_POOL_SIZE", "10")),
+            timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+            max_lifetime=float(os.getenv("DB_POOL_MAX_LIFETIME", "1800")),
+            idle_timeout=float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300")),
+            health_check_interval=float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "30")),
+            **connect_args
+        )
+
+    async def connect(self):
+        """Open the pool (call from application startup)"""
+        if self.pool is None:
+            self.pool = await aiomysql.create_pool(
+                minsize=self.minsize,
+                maxsize=self.maxsize,
+                pool_recycle=int(self.idle_timeout),
+                autocommit=True,
+                charset="utf8mb4",
+                **self.connect_args
+            )
+
+    async def close(self):
+        """Close the pool (call from application shutdown)"""
+        if self.pool is not None:
+            self.pool.close()
+            await self.pool.wait_closed()
+            self.pool = None
+
+    @asynccontextmanager
+    async def acquire(self):
+        """
+        Check a connection out of the pool
+
+        Raises:
+            PoolTimeoutError: if the pool stays saturated for longer than the timeout
+        """
+        requested = time.monotonic()
+        if self.pool is None:
+            await self.connect()
+
+        started = time.monotonic()
+        conn = await self._checkout(started + self.timeout)
+        waited = time.monotonic() - started
+        # Checkout includes opening a new connection when the pool grows
+        server_timing.record("db-connect", time.monotonic() - requested)
+        self._checkouts += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+        DB_POOL_WAIT_SECONDS.observe(waited)
+
+        try:
+            yield conn
+        finally:
+            self.pool.release(conn)
+
+    @asynccontextmanager
+    async def transaction(self):
+        """
+        Run several statements atomically
+
+        Yields:
+            DictCursor bound to a connection inside BEGIN (statements are
+            timed); committed on success, rolled back on error
+        """
+        async with self.acquire() as conn:
+            await conn.begin()
+            try:
+                async with conn.cursor(aiomysql.DictCursor) as cursor:
+                    yield TimedCursor(self, cursor)
+                await conn.commit()
+            except BaseException:
+                await conn.rollback()
+                raise
+
+    async def fetch_one(self, sql: str, args: Optional[Sequence] = None) -> Optional[Dict[str, Any]]:
+        async with self.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await self._execute(cursor, sql, args)
+                return await cursor.fetchone()
+
+    async def fetch_all(self, sql: str, args: Optional[Sequence] = None) -> List[Dict[str, Any]]:
+        async with self.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await self._execute(cursor, sql, args)
+                return list(await cursor.fetchall())
+
+    async def execute(self, sql: str, args: Optional[Sequence] = None) -> int:
+        """Run a single autocommitted statement and return the affected row count"""
+        async with self.acquire() as conn:
+            async with conn.cursor() as cursor:
+                await self._execute(cursor, sql, args)
+                return cursor.rowcount
+
+    async def insert(self, sql: str, args: Optional[Sequence] = None) -> int:
+        """Run a single autocommitted INSERT and return the generated id"""
+        async with self.acquire() as conn:
+            async with conn.cursor() as cursor:
+                await self._execute(cursor, sql, args)
+                return cursor.lastrowid
+
+    async def _execute(self, cursor, sql: str, args: Optional[Sequence] = None, many: bool = False):
+        started = time.perf_counter()
+        try:
+            if many:
+                return await cursor.executemany(sql, args)
+            return await cursor.execute(sql, args)
+        finally:
+            elapsed = time.perf_counter() - started
+            name = statement_name(sql)
+            DB_QUERY_SECONDS.observe(elapsed, statement=name)
+            server_timing.record("db", elapsed, name)
+            for observer in self._observers:
+                observer(sql, args, elapsed, many)
+
+    def add_observer(self, observer: Callable[[str, Any, float, bool], None]):
+        """Call observer(sql, args, seconds, many) after every statement; it must not block"""
+        self._observers.append(observer)
+
+    def collect_metrics(self):
+        """Refresh the pool gauges (called on each metrics scrape)"""
+        size = self.pool.size if self.pool else 0
+        idle = self.pool.freesize if self.pool else 0
+        DB_POOL_CONNECTIONS.set(size - idle, state="in_use")
+        DB_POOL_CONNECTIONS.set(idle, state="idle")
+        DB_POOL_WAITING.set(self._waiting)
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool occupancy and checkout wait figures for sizing"""
+        size = self.pool.size if self.pool else 0
+        idle = self.pool.freesize if self.pool else 0
+        in_use = size - idle
+        return {
+            "size": self.maxsize,
+            "open": size,
+            "in_use": in_use,
+            "idle": idle,
+            "waiting": self._waiting,
+            "saturation": round(in_use / self.maxsize, 3) if self.maxsize else 0.0,
+            "checkouts": self._checkouts,
+            "timeouts": self._timeouts,
+            "recycled": self._recycled,
+            "failed_health_checks": self._failed_health_checks,
+            "wait_avg_ms": round(self._wait_total / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+            "wait_max_ms": round(self._wait_max * 1000, 3),
+        }
+
+    async def _checkout(self, deadline: float):
+        while True:
+            remaining = deadline - time.monotonic()
+            self._waiting += 1
+            try:
+                conn = await asyncio.wait_for(self.pool.acquire(), max(remaining, 0))
+            except asyncio.TimeoutError:
+                self._timeouts += 1
+                DB_POOL_TIMEOUTS.inc()
+                raise PoolTimeoutError(
+                    f"No database connection available after {self.timeout}s "
+                    f"({self.pool.size - self.pool.freesize}/{self.maxsize} in use)"
+                )
+            finally:
+                self._waiting -= 1
+
+            now = time.monotonic()
+            created_at = getattr(conn, "_pool_created_at", None)
+            if created_at is None:
+                conn._pool_created_at = created_at = now
+
+            if now - created_at > self.max_lifetime:
+                self._recycled += 1
+                await self._drop(conn)
+                continue
+
+            if conn._loop.time() - conn.last_usage >= self.health_check_interval:
+                try:
+                    await conn.ping(reconnect=False)
+                except Exception:
+                    self._failed_health_checks += 1
+                    await self._drop(conn)
+                    continue
+
+            return conn
+
+    async def _drop(self, conn):
+        conn.close()
+        await self.pool.release(conn)
+
+
+# Create singleton instance
+db = AsyncDatabase.from_env()
+metrics.add_collector(db.collect_metrics)
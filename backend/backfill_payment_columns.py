@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Backfill xendit_payments.expired_at and account_number from metadata
+Walks the table in primary-key chunks so each UPDATE locks a bounded range;
+safe to re-run, rows that already have the columns are skipped.
+
+Usage:
+    python backfill_payment_columns.py --chunk 2000 --pause 0.05
+"""
+
+import argparse
+import json
+import time
+from typing import Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from db_pool import db_pool
+from expiry_sweeper import parse_expired_at
+
+
+def backfill_chunk(conn, start_id: int, end_id: int) -> Tuple[int, int]:
+    """Fill one id range; returns (rows updated, rows skipped for unusable metadata)"""
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("""
+        SELECT id, metadata FROM xendit_payments
+        WHERE id >= %s AND id < %s AND metadata IS NOT NULL
+          AND (expired_at IS NULL OR (payment_type = 'virtual_account' AND account_number IS NULL))
+    """, (start_id, end_id))
+    rows = cursor.fetchall()
+
+    updates = []
+    skipped = 0
+    for row in rows:
+        try:
+            metadata = json.loads(row["metadata"])
+        except (TypeError, ValueError):
+            skipped += 1
+            continue
+        if not isinstance(metadata, dict):
+            # Legacy text quoted into a JSON string by the JSON column migration
+            skipped += 1
+            continue
+        expired_at = parse_expired_at(metadata.get("expired_at"))
+        account_number = metadata.get("account_number")
+        if expired_at or account_number:
+            updates.append((expired_at, account_number, row["id"]))
+
+    if updates:
+        cursor.executemany("""
+            UPDATE xendit_payments
+            SET expired_at = COALESCE(expired_at, %s),
+                account_number = COALESCE(account_number, %s)
+            WHERE id = %s
+        """, updates)
+    conn.commit()
+    cursor.close()
+    return len(updates), skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk", type=int, default=2000, help="Primary-key range per chunk")
+    parser.add_argument("--pause", type=float, default=0.05, help="Seconds to sleep between chunks")
+    args = parser.parse_args()
+
+    conn = db_pool.get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COALESCE(MIN(id), 0), COALESCE(MAX(id), 0) FROM xendit_payments")
+        first_id, last_id = cursor.fetchone()
+        cursor.close()
+
+        updated = skipped = 0
+        for start_id in range(first_id, last_id + 1, args.chunk):
+            chunk_updated, chunk_skipped = backfill_chunk(conn, start_id, start_id + args.chunk)
+            updated += chunk_updated
+            skipped += chunk_skipped
+            print(f"  ids < {min(start_id + args.chunk, last_id + 1)}: {updated} rows updated, {skipped} skipped")
+            time.sleep(args.pause)
+        print(f"\n✅ Backfill completed: {updated} rows updated, {skipped} skipped (metadata not a JSON object)")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
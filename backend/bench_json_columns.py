@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Benchmark: TEXT columns decoded per read (json.loads + re-encode) versus
+JSON columns passed through as RawJSON fragments, for large
+payment_methods and xendit_payments reads
+
+Usage:
+    python bench_json_columns.py --rows 50000 --repeat 20
+    python bench_json_columns.py --render-only     # no database needed
+"""
+
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from fastapi.encoders import jsonable_encoder
+
+from json_render import dumps, raw_json
+
+
+BENCH_TABLES = {
+    "payment_methods": ("payment_methods_bench_text", "payment_methods_bench_json", "config"),
+    "xendit_payments": ("xendit_payments_bench_text", "xendit_payments_bench_json", "metadata"),
+}
+
+
+def sample_config(n: int) -> dict:
+    return {"provider": "xendit", "fee_percent": 0.7, "min_amount": 1000 + n,
+            "labels": {"id": f"Metode {n}", "en": f"Method {n}"}, "flags": ["pos", "dine_in"]}
+
+
+def sample_metadata(n: int) -> dict:
+    return {"qr_string": "00020101021226" + "%030d" % n + "5204599953033605802ID" * 4,
+            "expired_at": "2024-05-01T10:00:00.000Z", "account_number": f"8808{n:012d}"}
+
+
+def synthetic_rows(kind: str, rows: int):
+    now = datetime(2024, 5, 1, 10, 0, 0)
+    if kind == "payment_methods":
+        return [{"id": n, "name": f"Method {n}", "type": "ewallet", "is_active": 1, "channel_code": "OVO",
+                 "config": json.dumps(sample_config(n)), "created_at": now} for n in range(rows)]
+    return [{"id": n, "reference_id": f"qris_pos_main_{n:019d}", "payment_id": f"{n:024x}",
+             "amount": Decimal("150000.00"), "status": "PENDING",
+             "metadata": json.dumps(sample_metadata(n)), "created_at": now} for n in range(rows)]
+
+
+def render_old(rows, column):
+    """Per-read decode, then FastAPI's jsonable_encoder + json.dumps"""
+    items = []
+    for row in rows:
+        item = dict(row)
+        try:
+            item[column] = json.loads(item[column]) if item[column] else {}
+        except ValueError:
+            item[column] = {}
+        items.append(item)
+    return json.dumps(jsonable_encoder({"success": True, "items": items}), separators=(",", ":")).encode()
+
+
+def render_new(rows, column):
+    """JSON column value spliced in verbatim"""
+    items = []
+    for row in rows:
+        item = dict(row)
+        item[column] = raw_json(item[column]) or {}
+        items.append(item)
+    return dumps({"success": True, "items": items})
+
+
+def time_calls(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[-1]
+
+
+def report(name, old, new):
+    print(f"  {name:<28} old p50={old[0]:8.2f}ms max={old[1]:8.2f}ms   "
+          f"new p50={new[0]:8.2f}ms max={new[1]:8.2f}ms   speedup x{old[0] / new[0]:.1f}")
+
+
+def bench_render(rows: int, repeat: int):
+    print(f"\nRender only ({rows} rows, {repeat} runs)")
+    for kind, (_, _, column) in BENCH_TABLES.items():
+        data = synthetic_rows(kind, rows)
+        assert json.loads(render_old(data, column)) == json.loads(render_new(data, column))
+        report(kind, time_calls(lambda: render_old(data, column), repeat),
+               time_calls(lambda: render_new(data, column), repeat))
+
+
+def bench_database(rows: int, repeat: int, keep: bool):
+    from db_pool import db_pool
+
+    conn = db_pool.get_connection()
+    try:
+        cursor = conn.cursor()
+        for kind, (text_table, json_table, column) in BENCH_TABLES.items():
+            data = synthetic_rows(kind, rows)
+            columns = [key for key in data[0] if key != "id"]
+            for table, column_type in ((text_table, "TEXT"), (json_table, "JSON")):
+                cursor.execute(f"DROP TABLE IF EXISTS {table}")
+                definitions = ", ".join(
+                    f"{col} {column_type if col == column else 'DATETIME' if col == 'created_at' else 'DECIMAL(15, 2)' if col == 'amount' else 'VARCHAR(255)'}"
+                    for col in columns
+                )
+                cursor.execute(f"CREATE TABLE {table} (id INT PRIMARY KEY, {definitions}) ENGINE=InnoDB")
+                for start in range(0, rows, 5000):
+                    chunk = data[start:start + 5000]
+                    cursor.executemany(
+                        f"INSERT INTO {table} (id, {', '.join(columns)}) VALUES ({', '.join(['%s'] * (len(columns) + 1))})",
+                        [tuple(row[key] for key in ["id"] + columns) for row in chunk]
+                    )
+                conn.commit()
+        cursor.close()
+
+        print(f"\nSELECT + render ({rows} rows, {repeat} runs)")
+        for kind, (text_table, json_table, column) in BENCH_TABLES.items():
+            def read(table, render):
+                cur = conn.cursor(dictionary=True)
+                cur.execute(f"SELECT * FROM {table}")
+                body = render(cur.fetchall(), column)
+                cur.close()
+                return body
+            report(kind, time_calls(lambda: read(text_table, render_old), repeat),
+                   time_calls(lambda: read(json_table, render_new), repeat))
+    finally:
+        if not keep:
+            cursor = conn.cursor()
+            for text_table, json_table, _ in BENCH_TABLES.values():
+                cursor.execute(f"DROP TABLE IF EXISTS {text_table}")
+                cursor.execute(f"DROP TABLE IF EXISTS {json_table}")
+            cursor.close()
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000, help="Rows per table")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed reads per variant")
+    parser.add_argument("--render-only", action="store_true", help="Skip the database, time rendering only")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark tables afterwards")
+    args = parser.parse_args()
+
+    bench_render(args.rows, args.repeat)
+    if not args.render_only:
+        bench_database(args.rows, args.repeat, args.keep)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Benchmark: payment lookup by `payment_id = %s OR reference_id = %s`
+versus the payment_lookup resolver, on a large synthetic table
+
+Usage:
+    python bench_payment_lookup.py --rows 500000 --lookups 2000
+"""
+
+import argparse
+import random
+import statistics
+import time
+import uuid
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from db_pool import db_pool
+from payment_lookup import select_payment_sql
+
+
+BENCH_TABLE = "xendit_payments_bench"
+
+
+def create_table(cursor):
+    cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+    cursor.execute(f"""
+        CREATE TABLE {BENCH_TABLE} (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            reference_id VARCHAR(255) UNIQUE NOT NULL,
+            payment_id VARCHAR(255) NOT NULL,
+            payment_type ENUM('qris', 'virtual_account', 'ewallet') NOT NULL,
+            channel_code VARCHAR(50) NOT NULL,
+            amount DECIMAL(15, 2) NOT NULL,
+            status VARCHAR(50) DEFAULT 'PENDING',
+            metadata TEXT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_reference_id (reference_id),
+            INDEX idx_payment_id (payment_id),
+            INDEX idx_status (status)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+
+def fill_table(conn, rows: int, batch: int = 5000):
+    """Insert synthetic payments; returns (reference_ids, payment_ids) samples"""
+    cursor = conn.cursor()
+    types = [("qris", "QRIS", "qris_pos_main"), ("virtual_account", "BCA", "va_BCA"),
+             ("ewallet", "OVO", "ewallet_OVO")]
+    references, payments = [], []
+    for start in range(0, rows, batch):
+        values = []
+        for n in range(start, min(start + batch, rows)):
+            payment_type, channel, prefix = types[n % 3]
+            reference_id = f"{prefix}_{n:012d}"
+            payment_id = uuid.uuid4().hex[:24]
+            values.append((reference_id, payment_id, payment_type, channel,
+                           random.randint(1, 500) * 1000, random.choice(["PENDING", "PAID", "EXPIRED"])))
+            if n % 97 == 0:
+                references.append(reference_id)
+                payments.append(payment_id)
+        cursor.executemany(f"""
+            INSERT INTO {BENCH_TABLE} (reference_id, payment_id, payment_type, channel_code, amount, status)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, values)
+        conn.commit()
+        print(f"  inserted {min(start + batch, rows)}/{rows}")
+    cursor.execute(f"ANALYZE TABLE {BENCH_TABLE}")
+    cursor.fetchall()
+    cursor.close()
+    return references, payments
+
+
+def time_queries(conn, name, queries):
+    cursor = conn.cursor(dictionary=True)
+    timings = []
+    for sql, args in queries:
+        started = time.perf_counter()
+        cursor.execute(sql, args)
+        cursor.fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    sql, args = queries[0]
+    cursor.execute("EXPLAIN " + sql, args)
+    plan = cursor.fetchall()
+    cursor.close()
+
+    timings.sort()
+    print(f"\n{name}")
+    print(f"  p50={statistics.median(timings):.3f}ms  "
+          f"p95={timings[int(len(timings) * 0.95) - 1]:.3f}ms  max={timings[-1]:.3f}ms")
+    for row in plan:
+        print(f"  EXPLAIN: type={row.get('type')} key={row.get('key')} rows={row.get('rows')} extra={row.get('Extra')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000, help="Synthetic rows to insert")
+    parser.add_argument("--lookups", type=int, default=1000, help="Lookups per strategy")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark table afterwards")
+    args = parser.parse_args()
+
+    conn = db_pool.get_connection()
+    try:
+        cursor = conn.cursor()
+        print(f"Creating {BENCH_TABLE} with {args.rows} rows...")
+        create_table(cursor)
+        cursor.close()
+        references, payments = fill_table(conn, args.rows)
+
+        identifiers = [random.choice(references + payments) for _ in range(args.lookups)]
+        or_sql = f"SELECT * FROM {BENCH_TABLE} WHERE payment_id = %s OR reference_id = %s"
+
+        time_queries(conn, "OR lookup", [(or_sql, (i, i)) for i in identifiers])
+        time_queries(conn, "Resolver (single index)",
+                     [select_payment_sql(i, table=BENCH_TABLE) for i in identifiers])
+        time_queries(conn, "Resolver fallback for unknown id shapes (UNION ALL, miss)",
+                     [select_payment_sql(f"legacy-{i}", table=BENCH_TABLE) for i in identifiers])
+    finally:
+        if not args.keep:
+            cursor = conn.cursor()
+            cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+            cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
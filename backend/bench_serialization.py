@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark: response serialization cost per endpoint
+Old path is FastAPI's default (isoformat/json.loads done in the handler,
+jsonable_encoder, then JSONResponse's json.dumps); new path is
+FastJSONResponse rendering the raw rows through json_render.dumps.
+No database or network needed, payloads are synthetic.
+
+Usage:
+    python bench_serialization.py --repeat 2000
+    python bench_serialization.py --methods 200 --batch 50
+"""
+
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+
+from json_render import dumps, raw_json
+
+
+NOW = datetime(2024, 5, 1, 10, 0, 0, 123456)
+
+
+def payment_row(n: int) -> dict:
+    return {
+        "reference_id": f"qris_pos_main_{n:019d}", "payment_id": f"{n:024x}", "payment_type": "qris",
+        "amount": Decimal("150000.00"), "status": "PENDING", "created_at": NOW, "paid_at": None,
+        "metadata": json.dumps({"qr_string": "00020101021226" + "%030d" % n + "5204599953033605802ID" * 4,
+                                "expired_at": "2024-05-01T10:15:00.000Z"}),
+    }
+
+
+def method_row(n: int) -> dict:
+    return {
+        "id": n, "name": f"Method {n}", "type": "ewallet", "channel_code": f"CH{n}", "is_active": 1,
+        "config": json.dumps({"fee_percent": 0.7, "min_amount": 1000, "labels": {"id": f"Metode {n}"}}),
+        "created_at": NOW, "circuit_state": "closed", "available": True,
+    }
+
+
+def old_status(row):
+    return {"success": True, "reference_id": row["reference_id"], "payment_id": row["payment_id"],
+            "payment_type": row["payment_type"], "amount": float(row["amount"]), "status": row["status"],
+            "metadata": json.loads(row["metadata"]) if row["metadata"] else {},
+            "created_at": row["created_at"].isoformat() if row["created_at"] else None,
+            "paid_at": row["paid_at"].isoformat() if row["paid_at"] else None}
+
+
+def new_status(row):
+    return {"success": True, "reference_id": row["reference_id"], "payment_id": row["payment_id"],
+            "payment_type": row["payment_type"], "amount": row["amount"], "status": row["status"],
+            "metadata": raw_json(row["metadata"]) or {}, "created_at": row["created_at"],
+            "paid_at": row["paid_at"]}
+
+
+def old_methods(rows):
+    methods = []
+    for row in rows:
+        method = dict(row)
+        method["config"] = json.loads(method["config"]) if method["config"] else {}
+        method["created_at"] = method["created_at"].isoformat()
+        methods.append(method)
+    return {"success": True, "payment_methods": methods, "unavailable_channels": []}
+
+
+def new_methods(rows):
+    methods = []
+    for row in rows:
+        method = dict(row)
+        method["config"] = raw_json(method["config"]) or {}
+        methods.append(method)
+    return {"success": True, "payment_methods": methods, "unavailable_channels": []}
+
+
+def create_response(n: int) -> dict:
+    return {"success": True, "reference_id": f"qris_pos_main_{n:019d}", "payment_id": f"{n:024x}",
+            "qr_string": "00020101021226" + "%030d" % n + "5204599953033605802ID" * 4,
+            "amount": 150000.0, "expired_at": "2024-05-01T10:15:00.000Z"}
+
+
+def health(breakers: int) -> dict:
+    return {"status": "OK", "timestamp": NOW.isoformat(),
+            "db_pool": {"size": 10, "free": 7, "maxsize": 20},
+            "circuit_breakers": [{"operation": "create_ewallet_charge", "channel_code": f"CH{n}",
+                                  "state": "closed", "calls": 120, "failure_rate": 0.01}
+                                 for n in range(breakers)],
+            "xendit_calls": {f"xendit_attempts_total{{operation=op{n}}}": n for n in range(breakers)}}
+
+
+def old_render(content):
+    """FastAPI's default: jsonable_encoder, then starlette's JSONResponse.render"""
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def build_cases(args):
+    payments = [payment_row(n) for n in range(args.batch)]
+    methods = [method_row(n) for n in range(args.methods)]
+    batch = [dict(create_response(n), index=n, payment_type="qris") for n in range(args.batch)]
+    return {
+        "GET /api/health": (lambda: health(24), lambda: health(24)),
+        "GET /api/payment-methods": (lambda: old_methods(methods), lambda: new_methods(methods)),
+        "GET /api/xendit/payment/{id}": (lambda: old_status(payments[0]), lambda: new_status(payments[0])),
+        "POST /api/xendit/qris": (lambda: create_response(1), lambda: create_response(1)),
+        "POST /api/xendit/payments/batch": (
+            lambda: {"success": True, "total": len(batch), "succeeded": len(batch), "failed": 0, "results": batch},
+        ) * 2,
+        "POST /api/xendit/webhook": (lambda: {"success": True}, lambda: {"success": True}),
+    }
+
+
+def time_calls(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1_000_000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000, help="Timed renders per endpoint and variant")
+    parser.add_argument("--methods", type=int, default=50, help="Payment methods in the list response")
+    parser.add_argument("--batch", type=int, default=50, help="Items in the batch create response")
+    args = parser.parse_args()
+
+    print(f"\nSerialization per response ({args.repeat} runs, microseconds)")
+    for name, (build_old, build_new) in build_cases(args).items():
+        assert json.loads(old_render(build_old())) == json.loads(dumps(build_new()))
+        old = time_calls(lambda: old_render(build_old()), args.repeat)
+        new = time_calls(lambda: dumps(build_new()), args.repeat)
+        print(f"  {name:<32} old p50={old[0]:8.1f} p99={old[1]:8.1f}   "
+              f"new p50={new[0]:8.1f} p99={new[1]:8.1f}   speedup x{old[0] / new[0]:.1f}")
+
+
+if __name__ == "__main__":
+    main()
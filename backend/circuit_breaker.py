@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Circuit Breakers for Xendit Calls
+One breaker per (operation, channel_code): trips on error rate or slow-call
+rate over a rolling window, fails fast while open, then lets probe calls
+through in half-open state before closing again
+"""
+
+import logging
+import os
+import time
+from collections import deque
+from typing import Dict, Any, Optional, Tuple
+
+from payment_models import channel_key
+
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Worst state wins when several operations share a channel
+STATE_SEVERITY = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Xendit while a breaker is open"""
+
+    def __init__(self, operation: str, channel_code: str, retry_after: float):
+        super().__init__(
+            f"Xendit {channel_code} is unavailable ({operation} circuit open, "
+            f"retry in {retry_after:.0f}s)"
+        )
+        self.operation = operation
+        self.channel_code = channel_code
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Rolling-window breaker for one operation on one channel"""
+
+    def __init__(self, operation: str, channel_code: str, window: int = 20, min_calls: int = 5,
+                 failure_rate: float = 0.5, slow_call_duration: float = 5.0, slow_call_rate: float = 0.5,
+                 open_duration: float = 30.0, half_open_calls: int = 1):
+        """
+        Args:
+            operation: XenditService method the breaker guards
+            channel_code: QRIS, bank code or e-wallet type
+            window: Number of recent calls the rates are computed over
+            min_calls: Calls needed in the window before the breaker can trip
+            failure_rate: Share of failed calls that trips the breaker
+            slow_call_duration: Seconds after which a successful call counts as slow
+            slow_call_rate: Share of slow calls that trips the breaker
+            open_duration: Seconds to fail fast before letting a probe through
+            half_open_calls: Concurrent probe calls allowed while half-open
+        """
+        self.operation = operation
+        self.channel_code = channel_code
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_duration = slow_call_duration
+        self.slow_call_rate = slow_call_rate
+        self.open_duration = open_duration
+        self.half_open_calls = half_open_calls
+
+        self._calls: deque = deque(maxlen=window)  # (failed, slow) per call
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+
+        self.rejected = 0
+        self.trips = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_duration:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def before_call(self):
+        """Reserve a call slot, raising CircuitOpenError when the call must fail fast"""
+        state = self.state
+        if state == OPEN or (state == HALF_OPEN and self._probes >= self.half_open_calls):
+            self.rejected += 1
+            retry_after = max(self.open_duration - (time.monotonic() - self._opened_at), 0)
+            raise CircuitOpenError(self.operation, self.channel_code, retry_after)
+        if state == HALF_OPEN:
+            self._probes += 1
+
+    def cancel_call(self):
+        """Give back the slot of a call that was cancelled before it finished"""
+        if self._state == HALF_OPEN:
+            self._probes = max(self._probes - 1, 0)
+
+    def record(self, success: bool, duration: float, error: Optional[str] = None):
+        """Record a finished call and move between states"""
+        slow = duration >= self.slow_call_duration
+        if not success:
+            self.last_error = error
+
+        if self._state == HALF_OPEN:
+            self._probes = max(self._probes - 1, 0)
+            if success and not slow:
+                self._state = CLOSED
+                self._calls.clear()
+            else:
+                self._trip()
+            return
+
+        self._calls.append((not success, slow))
+        if self._state == CLOSED and len(self._calls) >= self.min_calls:
+            failed = sum(1 for call in self._calls if call[0]) / len(self._calls)
+            slowed = sum(1 for call in self._calls if call[1]) / len(self._calls)
+            if failed >= self.failure_rate or slowed >= self.slow_call_rate:
+                self._trip()
+
+    def stats(self) -> Dict[str, Any]:
+        calls = len(self._calls)
+        return {
+            "state": self.state,
+            "calls": calls,
+            "failure_rate": round(sum(1 for call in self._calls if call[0]) / calls, 3) if calls else 0.0,
+            "slow_call_rate": round(sum(1 for call in self._calls if call[1]) / calls, 3) if calls else 0.0,
+            "trips": self.trips,
+            "rejected": self.rejected,
+            "last_error": self.last_error,
+        }
+
+    def _trip(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._calls.clear()
+        self.trips += 1
+        logger.warning("Circuit opened for Xendit %s on %s: %s", self.operation, self.channel_code, self.last_error,
+                       extra={"operation": self.operation, "channel_code": self.channel_code})
+
+
+class CircuitBreakerRegistry:
+    """Creates breakers lazily, one per (operation, channel_code)"""
+
+    def __init__(self, call_timeout: Optional[float] = None, **breaker_options):
+        """
+        Args:
+            call_timeout: Latency budget in seconds applied to Xendit calls that
+                do not pass their own timeout (None keeps the client default)
+            breaker_options: Keyword arguments for every CircuitBreaker
+        """
+        self.call_timeout = call_timeout
+        self.breaker_options = breaker_options
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+
+    @classmethod
+    def from_env(cls) -> "CircuitBreakerRegistry":
+        call_timeout = os.getenv("XENDIT_CALL_TIMEOUT")
+        return cls(
+            call_timeout=float(call_timeout) if call_timeout else None,
+            window=int(os.getenv("CIRCUIT_WINDOW", "20")),
+            min_calls=int(os.getenv("CIRCUIT_MIN_CALLS", "5")),
+            failure_rate=float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5")),
+            slow_call_duration=float(os.getenv("CIRCUIT_SLOW_CALL_DURATION", "5")),
+            slow_call_rate=float(os.getenv("CIRCUIT_SLOW_CALL_RATE", "0.5")),
+            open_duration=float(os.getenv("CIRCUIT_OPEN_DURATION", "30")),
+            half_open_calls=int(os.getenv("CIRCUIT_HALF_OPEN_CALLS", "1")),
+        )
+
+    def get(self, operation: str, channel_code: str) -> CircuitBreaker:
+        """Breaker of one operation and channel; unsupported channel codes share the "other" breaker"""
+        key = (operation, channel_key(channel_code))
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = self._breakers[key] = CircuitBreaker(key[0], key[1], **self.breaker_options)
+        return breaker
+
+    def channel_state(self, channel_code: Optional[str]) -> str:
+        """Worst state across the operations of one channel (closed when never called)"""
+        if not channel_code:
+            return CLOSED
+        channel_code = channel_key(channel_code)
+        states = [breaker.state for (_, channel), breaker in self._breakers.items() if channel == channel_code]
+        return max(states, key=STATE_SEVERITY.__getitem__, default=CLOSED)
+
+    def unavailable_channels(self) -> Dict[str, str]:
+        """Channels whose breakers are not closed, with their state"""
+        channels = {channel for _, channel in self._breakers}
+        states = {channel: self.channel_state(channel) for channel in channels}
+        return {channel: state for channel, state in sorted(states.items()) if state != CLOSED}
+
+    def stats(self) -> Dict[str, Any]:
+        breakers: Dict[str, Dict[str, Any]] = {}
+        for (operation, channel), breaker in sorted(self._breakers.items()):
+            breakers.setdefault(channel, {})[operation] = breaker.stats()
+        return {
+            "call_timeout": self.call_timeout,
+            "unavailable_channels": self.unavailable_channels(),
+            "channels": breakers,
+        }
+
+
+# Create singleton instance
+xendit_breakers = CircuitBreakerRegistry.from_env()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+MySQL Connection Pool
+Keeps warm connections to the remote database so requests skip the
+TCP + TLS + auth handshake on every call
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Any
+
+import mysql.connector
+
+
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "srv1412.hstgr.io"),
+    "port": int(os.getenv("DB_PORT", "3306")),
+    "user": os.getenv("DB_USER", "u215947863_pos_dev"),
+    "password": os.getenv("DB_PASSWORD", "Pos_dev123#"),
+    "database": os.getenv("DB_NAME", "u215947863_pos_dev"),
+}
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes available within the checkout timeout"""
+    pass
+
+
+class PooledConnection:
+    """
+    Proxy around a mysql.connector connection.
+    close() hands the connection back to the pool instead of disconnecting.
+    """
+
+    _checked_out = False
+
+    def __init__(self, pool: "ConnectionPool", conn, created_at: float):
+        self._pool = pool
+        self._conn = conn
+        self.created_at = created_at
+        self.last_used = time.monotonic()
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # Safety net for handlers that raise before close(): free the slot
+        # but drop the connection, since its session state is unknown
+        if self._checked_out:
+            self._checked_out = False
+            self._pool._discard(self)
+
+    def close(self):
+        if not self._checked_out:
+            return
+        self._checked_out = False
+        self._pool._release(self)
+
+
+class ConnectionPool:
+    """Thread-safe, lazily filled pool of MySQL connections"""
+
+    def __init__(self, size: int = 10, timeout: float = 10.0, max_lifetime: float = 1800.0,
+                 idle_timeout: float = 300.0, health_check_interval: float = 30.0,
+                 **connect_args):
+        """
+        Args:
+            size: Maximum number of open connections
+            timeout: Seconds a checkout may wait for a free connection
+            max_lifetime: Seconds after which a connection is closed and replaced
+            idle_timeout: Seconds an unused connection may sit in the pool
+            health_check_interval: Ping connections idle longer than this on checkout (0 = always)
+            connect_args: Passed to mysql.connector.connect
+        """
+        self.size = size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.connect_args = connect_args
+
+        self._idle = deque()
+        self._open = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._failed_health_checks = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @classmethod
+    def from_env(cls) -> "ConnectionPool":
+        return cls(
+            size=int(os.getenv("DB_POOL_SIZE", "10")),
+            timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+            max_lifetime=float(os.getenv("DB_POOL_MAX_LIFETIME", "1800")),
+            idle_timeout=float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300")),
+            health_check_interval=float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "30")),
+            **DB_CONFIG
+        )
+
+    def get_connection(self) -> PooledConnection:
+        """
+        Check a connection out of the pool
+
+        Returns:
+            PooledConnection whose close() returns it to the pool
+
+        Raises:
+            PoolTimeoutError: if the pool stays saturated for longer than the timeout
+        """
+        started = time.monotonic()
+        deadline = started + self.timeout
+
+        while True:
+            stale = []
+            candidate = None
+            create = False
+            timed_out = False
+
+            with self._cond:
+                while True:
+                    stale.extend(self._pop_expired())
+                    if self._idle:
+                        candidate = self._idle.pop()
+                        break
+                    if self._open < self.size:
+                        self._open += 1
+                        create = True
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        timed_out = True
+                        break
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+            self._disconnect(stale)
+            if timed_out:
+                raise PoolTimeoutError(
+                    f"No database connection available after {self.timeout}s "
+                    f"({self._in_use}/{self.size} in use)"
+                )
+
+            if create:
+                try:
+                    candidate = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._open -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_healthy(candidate):
+                self._failed_health_checks += 1
+                self._drop(candidate)
+                continue
+
+            waited = time.monotonic() - started
+            with self._cond:
+                self._in_use += 1
+                self._checkouts += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+
+            candidate._checked_out = True
+            return candidate
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool occupancy and checkout wait figures for sizing"""
+        with self._cond:
+            return {
+                "size": self.size,
+                "open": self._open,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "saturation": round(self._in_use / self.size, 3) if self.size else 0.0,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "created": self._created,
+                "recycled": self._recycled,
+                "failed_health_checks": self._failed_health_checks,
+                "wait_avg_ms": round(self._wait_total / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+                "wait_max_ms": round(self._wait_max * 1000, 3),
+            }
+
+    def close_all(self):
+        """Close every idle connection; checked-out ones close when released"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+        self._disconnect(idle)
+
+    def _connect(self) -> PooledConnection:
+        conn = mysql.connector.connect(**self.connect_args)
+        self._created += 1
+        return PooledConnection(self, conn, time.monotonic())
+
+    def _is_healthy(self, conn: PooledConnection) -> bool:
+        if time.monotonic() - conn.last_used < self.health_check_interval:
+            return True
+        try:
+            conn._conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _is_expired(self, conn: PooledConnection, now: float) -> bool:
+        return (now - conn.created_at > self.max_lifetime or
+                now - conn.last_used > self.idle_timeout)
+
+    def _pop_expired(self):
+        """Remove expired connections from the idle queue (caller holds the lock)"""
+        now = time.monotonic()
+        expired = [c for c in self._idle if self._is_expired(c, now)]
+        if expired:
+            for conn in expired:
+                self._idle.remove(conn)
+            self._open -= len(expired)
+            self._recycled += len(expired)
+        return expired
+
+    def _release(self, conn: PooledConnection):
+        try:
+            if conn._conn.in_transaction:
+                conn._conn.rollback()
+        except Exception:
+            self._discard(conn)
+            return
+
+        conn.last_used = time.monotonic()
+        with self._cond:
+            self._in_use -= 1
+            if time.monotonic() - conn.created_at > self.max_lifetime:
+                self._open -= 1
+                self._recycled += 1
+                recycle = True
+            else:
+                self._idle.append(conn)
+                recycle = False
+            self._cond.notify()
+        if recycle:
+            self._disconnect([conn])
+
+    def _discard(self, conn: PooledConnection):
+        with self._cond:
+            self._in_use -= 1
+        self._drop(conn)
+
+    def _drop(self, conn: PooledConnection):
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+        self._disconnect([conn])
+
+    @staticmethod
+    def _disconnect(conns):
+        for conn in conns:
+            try:
+                conn._conn.close()
+            except Exception:
+                pass
+
+
+# Create singleton instance
+db_pool = ConnectionPool.from_env()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Payment Expiry Sweeper
+Marks PENDING payments past their expired_at as EXPIRED with one indexed
+range UPDATE per interval
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional
+
+from async_db import AsyncDatabase, db
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_expired_at(value: Any) -> Optional[datetime]:
+    """
+    Xendit expiry timestamp (ISO 8601, usually UTC with a Z suffix) as a
+    naive UTC datetime for the expired_at column; None when absent or unparseable
+    """
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class ExpirySweeper:
+    """
+    The UPDATE is a range scan on idx_status_expired_at (status, expired_at)
+    and is idempotent, so every worker can run it
+    """
+
+    def __init__(self, database: AsyncDatabase, interval: float = 60.0):
+        """
+        Args:
+            database: Async database holding xendit_payments
+            interval: Seconds between sweeps (0 disables the background loop)
+        """
+        self.db = database
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.sweeps = 0
+        self.expired = 0
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def sweep(self) -> int:
+        """Expire overdue PENDING payments; returns how many were marked"""
+        expired = await self.db.execute("""
+            UPDATE xendit_payments
+            SET status = 'EXPIRED', updated_at = NOW()
+            WHERE status = 'PENDING' AND expired_at < UTC_TIMESTAMP()
+        """)
+        self.sweeps += 1
+        self.expired += expired
+        return expired
+
+    def stats(self) -> Dict[str, Any]:
+        return {"sweeps": self.sweeps, "expired": self.expired}
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.exception("Payment expiry sweep failed: %s", e)
+
+
+# Create singleton instance
+expiry_sweeper = ExpirySweeper(
+    db,
+    interval=float(os.getenv("EXPIRY_SWEEP_INTERVAL", "60"))
+)
@@ -1679,6 +1679,17 @@ func GetPaymentMethod(c *fiber.Ctx) error {
         return c.JSON(fiber.Map{"success": true, "payment_method": pm})
 }
 
+// bumpCacheVersion makes every Python worker drop its cached copy of name on
+// its next version check (cache_versions, see migration_cache_versions.sql)
+func bumpCacheVersion(name string) {
+        if _, err := DB.Exec(`
+                INSERT INTO cache_versions (name, version) VALUES (?, 1)
+                ON DUPLICATE KEY UPDATE version = version + 1
+        `, name); err != nil {
+                fmt.Printf("⚠️  Failed to bump %s cache version: %v\n", name, err)
+        }
+}
+
 func CreatePaymentMethod(c *fiber.Ctx) error {
         var req struct {
                 Name     string `json:"name"`
@@ -1702,6 +1713,7 @@ func CreatePaymentMethod(c *fiber.Ctx) error {
         if err != nil {
                 return ErrorResponse(c, fmt.Sprintf("Failed to create payment method: %v", err), fiber.StatusInternalServerError)
         }
+        bumpCacheVersion("payment_methods")
 
         id, _ := result.LastInsertId()
 
@@ -1739,6 +1751,7 @@ func UpdatePaymentMethod(c *fiber.Ctx) error {
         if err != nil {
                 return ErrorResponse(c, fmt.Sprintf("Failed to update payment method: %v", err), fiber.StatusInternalServerError)
         }
+        bumpCacheVersion("payment_methods")
 
         return c.JSON(fiber.Map{
                 "success": true,
@@ -1753,6 +1766,7 @@ func DeletePaymentMethod(c *fiber.Ctx) error {
         if err != nil {
                 return ErrorResponse(c, fmt.Sprintf("Failed to delete payment method: %v", err), fiber.StatusInternalServerError)
         }
+        bumpCacheVersion("payment_methods")
 
         return c.JSON(fiber.Map{
                 "success": true,
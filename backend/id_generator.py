@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Reference ID Generator
+Monotonic, k-sortable 64-bit ids (timestamp + worker id + sequence) that
+stay unique across processes and hosts; used for payment reference_ids
+"""
+
+import hashlib
+import logging
+import os
+import socket
+import threading
+import time
+from typing import List, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# 2024-01-01T00:00:00Z; 41 bits of milliseconds from here last ~69 years
+EPOCH_MS = 1704067200000
+
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+TIMESTAMP_SHIFT = WORKER_BITS + SEQUENCE_BITS
+
+
+def multi_worker() -> bool:
+    """True when the server runs several worker processes (WEB_CONCURRENCY > 1)"""
+    return int(os.getenv("WEB_CONCURRENCY") or "1") > 1
+
+
+def default_worker_id(require: bool = False) -> int:
+    """
+    WORKER_ID from the environment (0-1023). Without it the id is derived
+    from the host hash XOR the pid, which is only safe for a single process:
+    two pids equal mod 1024 share a worker id and would issue duplicate
+    reference_ids. With require set a missing WORKER_ID raises instead.
+    """
+    configured = os.getenv("WORKER_ID")
+    if configured is not None:
+        worker_id = int(configured)
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"WORKER_ID must be between 0 and {MAX_WORKER_ID}, got {worker_id}")
+        return worker_id
+    if require:
+        raise RuntimeError(f"WORKER_ID must be set to a distinct value (0-{MAX_WORKER_ID}) "
+                           f"for each worker process")
+    digest = hashlib.blake2b(socket.gethostname().encode(), digest_size=4).digest()
+    worker_id = (int.from_bytes(digest, "big") ^ os.getpid()) & MAX_WORKER_ID
+    logger.warning("WORKER_ID is not set; derived worker id %d from host and pid, which is only "
+                   "unique for a single process", worker_id)
+    return worker_id
+
+
+class ReferenceIdGenerator:
+    """Snowflake-style id source; thread-safe and re-seeded in forked children"""
+
+    def __init__(self, worker_id: int = None, epoch_ms: int = EPOCH_MS):
+        """
+        Args:
+            worker_id: Fixed worker id; by default it is read from WORKER_ID
+                when the first id is drawn
+            epoch_ms: Unix time in ms that timestamps count from
+        """
+        if worker_id is not None and not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"worker_id must be between 0 and {MAX_WORKER_ID}, got {worker_id}")
+        self.epoch_ms = epoch_ms
+        self._fixed_worker_id = worker_id
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_in_child)
+
+    def _reset(self, inherited_worker_id: str = None):
+        # The worker id is resolved on first use rather than here, so a forked
+        # child can still have WORKER_ID set for it (e.g. a post_fork hook)
+        self._lock = threading.Lock()
+        self._inherited_worker_id = inherited_worker_id
+        self.worker_id = None
+        self._worker_bits = 0
+        self._last_ms = -1
+        self._sequence = 0
+
+    def _reset_in_child(self):
+        self._reset(inherited_worker_id=os.getenv("WORKER_ID", ""))
+
+    def _resolve_worker_id(self):
+        if self._fixed_worker_id is not None:
+            worker_id = self._fixed_worker_id
+        else:
+            forked = self._inherited_worker_id is not None
+            worker_id = default_worker_id(require=forked or multi_worker())
+            if forked and os.getenv("WORKER_ID") == self._inherited_worker_id:
+                raise RuntimeError("WORKER_ID was inherited from the parent process; "
+                                   "set a distinct one in each forked worker")
+        self.worker_id = worker_id
+        self._worker_bits = worker_id << SEQUENCE_BITS
+
+    def next_id(self) -> int:
+        with self._lock:
+            if self.worker_id is None:
+                self._resolve_worker_id()
+            now_ms = time.time_ns() // 1_000_000 - self.epoch_ms
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            else:
+                # Same millisecond, or the clock stepped back: keep counting on the
+                # last timestamp and borrow the next millisecond when it fills up
+                self._sequence += 1
+                if self._sequence > MAX_SEQUENCE:
+                    self._last_ms += 1
+                    self._sequence = 0
+
+            return (self._last_ms << TIMESTAMP_SHIFT) | self._worker_bits | self._sequence
+
+    def next_ids(self, count: int) -> List[int]:
+        """Reserve count consecutive ids under a single lock acquisition"""
+        with self._lock:
+            if self.worker_id is None:
+                self._resolve_worker_id()
+            now_ms = time.time_ns() // 1_000_000 - self.epoch_ms
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = -1
+
+            ids = []
+            remaining = count
+            while remaining:
+                start = self._sequence + 1
+                if start > MAX_SEQUENCE:
+                    self._last_ms += 1
+                    start = 0
+                take = min(remaining, MAX_SEQUENCE + 1 - start)
+                base = (self._last_ms << TIMESTAMP_SHIFT) | self._worker_bits
+                ids.extend(range(base + start, base + start + take))
+                self._sequence = start + take - 1
+                remaining -= take
+            return ids
+
+    def reference_id(self, prefix: str, qualifier: str, value: int = None) -> str:
+        """
+        Build a payment reference_id such as qris_pos_main_0012345678901234567
+
+        The id part is zero-padded so reference_ids of one prefix sort by
+        creation time and insert at the right edge of the unique index.
+
+        Args:
+            prefix: Payment type prefix (qris, va, ewallet)
+            qualifier: Channel, bank or wallet code
+            value: Id reserved with next_ids(); a fresh one is drawn when omitted
+        """
+        if value is None:
+            value = self.next_id()
+        return f"{prefix}_{qualifier}_{value:019d}"
+
+    def decode(self, value: int) -> Tuple[int, int, int]:
+        """Split an id into (unix timestamp ms, worker id, sequence)"""
+        sequence = value & MAX_SEQUENCE
+        worker_id = (value >> SEQUENCE_BITS) & MAX_WORKER_ID
+        timestamp_ms = (value >> TIMESTAMP_SHIFT) + self.epoch_ms
+        return timestamp_ms, worker_id, sequence
+
+
+# Create singleton instance
+reference_ids = ReferenceIdGenerator()
+
+
+def check_unique(worker_id: int, count: int = 10000) -> List[int]:
+    """Ids from next_id and next_ids across sequence rollovers: all present, unique and ordered"""
+    generator = ReferenceIdGenerator(worker_id=worker_id)
+    ids = generator.next_ids(count)
+    assert len(ids) == count, f"worker {worker_id}: next_ids({count}) returned {len(ids)} ids"
+    for size in (1, MAX_SEQUENCE, MAX_SEQUENCE + 1, MAX_SEQUENCE + 2, 3 * MAX_SEQUENCE):
+        batch = generator.next_ids(size) + [generator.next_id()]
+        assert len(batch) == size + 1, f"worker {worker_id}: next_ids({size}) returned {len(batch) - 1} ids"
+        ids.extend(batch)
+    assert len(set(ids)) == len(ids) and ids == sorted(ids), f"worker {worker_id}: duplicate or unordered ids"
+    assert all(generator.decode(value)[1] == worker_id for value in ids), f"worker {worker_id}: worker bits changed"
+    return ids
+
+
+if __name__ == "__main__":
+    for worker_id in (0, 4, 5, MAX_WORKER_ID):
+        check_unique(worker_id)
+    print("next_id/next_ids: complete and unique across sequence rollover for even and odd worker ids")
+
+    generator = ReferenceIdGenerator(worker_id=5)
+    count = 1_000_000
+    for name, generate in (("next_id", lambda: [generator.next_id() for _ in range(count)]),
+                           ("next_ids", lambda: generator.next_ids(count))):
+        started = time.perf_counter()
+        ids = generate()
+        elapsed = time.perf_counter() - started
+        assert len(ids) == count and len(set(ids)) == count and ids == sorted(ids)
+        print(f"{name}: {count} unique, ordered ids in {elapsed:.3f}s ({count / elapsed:,.0f} ids/s), "
+              f"worker_id={generator.worker_id}")
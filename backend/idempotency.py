@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Idempotency-Key Support
+The first response for a key is stored; retries replay it without calling
+Xendit again, and concurrent duplicates wait for the in-flight original.
+A key is held in progress under a renewed lease, so one left behind by a
+crashed or cancelled worker is taken over once the lease runs out.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, Any, Awaitable, Callable, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+from async_db import AsyncDatabase, db
+from json_render import FastJSONResponse, dumps
+import server_timing
+
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyStore:
+    """Keys live in the idempotency_keys table, so they hold across workers"""
+
+    def __init__(self, database: AsyncDatabase, ttl: int = 86400, wait_timeout: float = 30.0,
+                 cleanup_interval: float = 600.0, lease: int = 30):
+        """
+        Args:
+            database: Async database the idempotency_keys table lives in
+            ttl: Seconds a stored response is replayed before the key expires
+            wait_timeout: Seconds a duplicate waits for the in-flight original
+            cleanup_interval: Seconds between purges of expired keys (0 disables)
+            lease: Seconds an in-progress key stays locked without renewal; the
+                owner renews it every lease / 3 while its handler runs
+        """
+        self.db = database
+        self.ttl = ttl
+        self.lease = max(lease, 3)
+        self.wait_timeout = wait_timeout
+        self.cleanup_interval = cleanup_interval
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        self.executed = 0
+        self.replayed = 0
+        self.waited = 0
+        self.conflicts = 0
+        self.taken_over = 0
+
+    @classmethod
+    def from_env(cls, database: AsyncDatabase) -> "IdempotencyStore":
+        return cls(
+            database,
+            ttl=int(os.getenv("IDEMPOTENCY_TTL", "86400")),
+            wait_timeout=float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "30")),
+            cleanup_interval=float(os.getenv("IDEMPOTENCY_CLEANUP_INTERVAL", "600")),
+            lease=int(os.getenv("IDEMPOTENCY_LEASE", "30")),
+        )
+
+    async def run(self, key: Optional[str], endpoint: str, body: Any,
+                  handler: Callable[[], Awaitable[Dict[str, Any]]]):
+        """
+        Execute handler at most once per (key, endpoint)
+
+        Args:
+            key: Idempotency-Key header value; without one the handler just runs
+            endpoint: Name of the operation the key is scoped to
+            body: Request body; reusing a key with a different body is rejected
+            handler: Coroutine function producing the response dict
+
+        Returns:
+            The handler's response rendered as JSON, or a replay of the stored one
+        """
+        if not key:
+            return FastJSONResponse(await handler())
+        if len(key) > 191:
+            raise HTTPException(status_code=400, detail="Idempotency-Key is too long")
+
+        if hasattr(body, "model_dump"):
+            body = body.model_dump()
+        request_hash = hashlib.sha256(
+            json.dumps(body, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+        ).hexdigest()
+        local_key = f"{endpoint}:{key}"
+
+        # Duplicate within this process: wait on the original's future
+        in_flight = self._in_flight.get(local_key)
+        if in_flight is not None:
+            self.waited += 1
+            try:
+                await asyncio.wait_for(asyncio.shield(in_flight), self.wait_timeout)
+            except asyncio.TimeoutError:
+                pass  # _claim below reports the key as still in progress
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[local_key] = future
+        try:
+            stored = await self._claim(key, endpoint, request_hash)
+            if stored is not None:
+                return stored
+
+            self.executed += 1
+            renewal = asyncio.create_task(self._renew_lease(key, endpoint))
+            try:
+                result = await handler()
+            except BaseException:
+                # Nothing to replay: release the key so the client can retry
+                renewal.cancel()
+                await self._release(key, endpoint)
+                raise
+            renewal.cancel()
+
+            response = FastJSONResponse(result)
+            body = response.body
+            timings = server_timing.current()
+            if timings is not None and timings.debug:
+                # The "_timing" footer belongs to this request; replays get the plain body
+                body = dumps(result)
+            await self._complete(key, endpoint, body)
+            return response
+        finally:
+            if self._in_flight.get(local_key) is future:
+                del self._in_flight[local_key]
+            if not future.done():
+                future.set_result(None)
+
+    def start(self):
+        if self._task is None and self.cleanup_interval > 0:
+            self._task = asyncio.create_task(self._cleanup_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ttl": self.ttl,
+            "in_flight": len(self._in_flight),
+            "executed": self.executed,
+            "replayed": self.replayed,
+            "waited": self.waited,
+            "conflicts": self.conflicts,
+            "taken_over": self.taken_over,
+        }
+
+    async def _claim(self, key: str, endpoint: str, request_hash: str) -> Optional[Response]:
+        """
+        Take ownership of the key, or return the stored response for it.
+        Waits while another worker holds the key in progress, and takes the
+        key over once that worker's lease has run out.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait_timeout
+        delay = 0.05
+
+        while True:
+            claimed = await self.db.execute("""
+                INSERT IGNORE INTO idempotency_keys
+                (idempotency_key, endpoint, request_hash, locked_until, expires_at)
+                VALUES (%s, %s, %s, NOW() + INTERVAL %s SECOND, NOW() + INTERVAL %s SECOND)
+            """, (key, endpoint, request_hash, self.lease, self.ttl))
+            if claimed:
+                return None
+
+            row = await self.db.fetch_one("""
+                SELECT request_hash, status, response_status, response_body,
+                       expires_at < NOW() AS expired,
+                       COALESCE(locked_until, created_at + INTERVAL %s SECOND) < NOW() AS stale
+                FROM idempotency_keys WHERE idempotency_key = %s AND endpoint = %s
+            """, (self.lease, key, endpoint))
+            if row is not None:
+                if row["expired"]:
+                    await self._release(key, endpoint)
+                    continue
+                if row["request_hash"] != request_hash:
+                    self.conflicts += 1
+                    raise HTTPException(
+                        status_code=422,
+                        detail="Idempotency-Key was already used with a different request body"
+                    )
+                if row["status"] == "completed":
+                    self.replayed += 1
+                    # Stored body is replayed byte for byte, no decode/encode round trip
+                    return Response(
+                        content=row["response_body"],
+                        status_code=row["response_status"] or 200,
+                        media_type="application/json",
+                        headers={"Idempotent-Replayed": "true"}
+                    )
+                if row["stale"] and await self._take_over(key, endpoint):
+                    return None
+
+            # Held by a live owner, or released between the INSERT and the SELECT
+            if loop.time() >= deadline:
+                self.conflicts += 1
+                raise HTTPException(
+                    status_code=409,
+                    detail="A request with this Idempotency-Key is still being processed"
+                )
+            self.waited += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    async def _take_over(self, key: str, endpoint: str) -> bool:
+        """Claim an in-progress key whose owner stopped renewing its lease; False if another worker won"""
+        taken = await self.db.execute("""
+            UPDATE idempotency_keys
+            SET locked_until = NOW() + INTERVAL %s SECOND
+            WHERE idempotency_key = %s AND endpoint = %s AND status = 'in_progress'
+              AND COALESCE(locked_until, created_at + INTERVAL %s SECOND) < NOW()
+        """, (self.lease, key, endpoint, self.lease))
+        if taken:
+            self.taken_over += 1
+            logger.warning("Took over stale in-progress Idempotency-Key", extra={"endpoint": endpoint})
+        return bool(taken)
+
+    async def _renew_lease(self, key: str, endpoint: str):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await self.db.execute("""
+                    UPDATE idempotency_keys SET locked_until = NOW() + INTERVAL %s SECOND
+                    WHERE idempotency_key = %s AND endpoint = %s AND status = 'in_progress'
+                """, (self.lease, key, endpoint))
+            except Exception as e:
+                logger.warning("Idempotency lease renewal failed: %s", e)
+
+    async def _complete(self, key: str, endpoint: str, body: bytes):
+        await self.db.execute("""
+            UPDATE idempotency_keys
+            SET status = 'completed', response_status = 200, response_body = %s
+            WHERE idempotency_key = %s AND endpoint = %s
+        """, (body.decode("utf-8"), key, endpoint))
+
+    async def _release(self, key: str, endpoint: str):
+        await self.db.execute(
+            "DELETE FROM idempotency_keys WHERE idempotency_key = %s AND endpoint = %s",
+            (key, endpoint)
+        )
+
+    async def _cleanup_loop(self):
+        while True:
+            await asyncio.sleep(self.cleanup_interval)
+            try:
+                while await self.db.execute(
+                    "DELETE FROM idempotency_keys WHERE expires_at < NOW() LIMIT 1000"
+                ) == 1000:
+                    pass
+            except Exception as e:
+                logger.exception("Idempotency key cleanup failed: %s", e)
+
+
+# Create singleton instance
+idempotency_store = IdempotencyStore.from_env(db)
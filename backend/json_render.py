@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Fast JSON Rendering
+orjson-backed serialization used as the API's default response class.
+datetimes, Decimals and pre-serialized fragments (values read from MySQL
+JSON columns) are handled natively; falls back to the stdlib json module
+when orjson is not installed.
+"""
+
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from time import perf_counter
+from typing import Any, List
+
+from fastapi.responses import JSONResponse
+
+import server_timing
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - stdlib fallback below
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        # Same rule as FastAPI's jsonable_encoder: integral Decimals become ints
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None and hasattr(orjson, "Fragment"):
+    RawJSON = orjson.Fragment
+
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(value: Any) -> bytes:
+        """Compact UTF-8 JSON; RawJSON fragments, datetimes and Decimals handled natively"""
+        return orjson.dumps(value, default=_default, option=_OPTIONS)
+
+else:
+    class RawJSON(str):
+        """JSON text that is already valid and is emitted as-is"""
+
+        __slots__ = ()
+
+    _encoder = json.JSONEncoder(ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default)
+
+    def _contains_raw(value: Any) -> bool:
+        if isinstance(value, RawJSON):
+            return True
+        if isinstance(value, dict):
+            return any(_contains_raw(item) for item in value.values())
+        if isinstance(value, (list, tuple)):
+            return any(_contains_raw(item) for item in value)
+        return False
+
+    def _encode(value: Any, parts: List[str]):
+        if isinstance(value, RawJSON):
+            parts.append(value)
+        elif not _contains_raw(value):
+            # Subtrees without fragments go through the C encoder in one call
+            parts.append(_encoder.encode(value))
+        elif isinstance(value, dict):
+            parts.append("{")
+            for index, (key, item) in enumerate(value.items()):
+                if index:
+                    parts.append(",")
+                parts.append(_encoder.encode(str(key)))
+                parts.append(":")
+                _encode(item, parts)
+            parts.append("}")
+        else:
+            parts.append("[")
+            for index, item in enumerate(value):
+                if index:
+                    parts.append(",")
+                _encode(item, parts)
+            parts.append("]")
+
+    def dumps(value: Any) -> bytes:
+        """Compact UTF-8 JSON; RawJSON fragments, datetimes and Decimals handled natively"""
+        parts: List[str] = []
+        _encode(value, parts)
+        return "".join(parts).encode("utf-8")
+
+
+def raw_json(value: Any) -> Any:
+    """
+    Wrap a JSON column value for pass-through without decoding it.
+    The text is trusted: migration_json_columns.sql repairs invalid rows and
+    makes the columns native JSON, so MySQL only stores valid documents.
+    None and empty text give None, so the caller's default applies.
+    """
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode("utf-8")
+    if value is None or value == "":
+        return None
+    if not isinstance(value, str):
+        # Already decoded by the driver; dumps encodes it like any other value
+        return value
+    return RawJSON(value)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Default response class of the payment API.
+    Endpoints that return it directly also skip FastAPI's jsonable_encoder
+    pass, which is needed for RawJSON fragments.
+    Rendering is reported as a Server-Timing span, and debug requests get
+    the spans so far appended to object bodies as "_timing".
+    """
+
+    def render(self, content: Any) -> bytes:
+        timings = server_timing.current()
+        if timings is None:
+            return dumps(content)
+        started = perf_counter()
+        if timings.debug and isinstance(content, dict):
+            content = {**content, "_timing": timings.as_dict()}
+        body = dumps(content)
+        timings.add("render", perf_counter() - started)
+        return body
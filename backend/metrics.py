@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+In-Process Metrics
+Labelled counters, gauges and histograms kept in memory per worker process,
+rendered in the Prometheus text exposition format for scraping
+"""
+
+import bisect
+import math
+import threading
+from typing import Dict, Any, Callable, Iterable, List, Tuple
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+class Metric:
+    """Base class: one value per combination of label values"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def labelled(self) -> List[Tuple[Dict[str, str], Any]]:
+        with self._lock:
+            items = list(self._values.items())
+        return [(dict(zip(self.labelnames, key)), value) for key, value in items]
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(labels)} {_format_value(value)}" for labels, value in self.labelled()]
+
+    def exposition(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [{**labels, "value": value} for labels, value in self.labelled()]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [{**labels, "value": value} for labels, value in self.labelled()]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, the +Inf bucket last
+                state = self._values[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            state["counts"][index] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def labelled(self) -> List[Tuple[Dict[str, str], Any]]:
+        # Copied under the lock so a scrape sees counts, sum and count from the same moment
+        with self._lock:
+            items = [(key, {**state, "counts": list(state["counts"])}) for key, state in self._values.items()]
+        return [(dict(zip(self.labelnames, key)), state) for key, state in items]
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, state in self.labelled():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), state["counts"]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(float(bound))})} "
+                             f"{cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(state['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {state['count']}")
+        return lines
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        rows = []
+        for labels, state in self.labelled():
+            count = state["count"]
+            rows.append({
+                **labels,
+                "count": count,
+                "avg_ms": round(state["sum"] / count * 1000, 2) if count else 0.0,
+            })
+        return rows
+
+
+class MetricsRegistry:
+    """Holds every metric of the process, keyed by name"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, documentation: str, labelnames: Iterable[str], **kwargs) -> Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def add_collector(self, collector: Callable[[], None]):
+        """Register a callback that refreshes gauges right before each scrape"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def metrics(self) -> List[Metric]:
+        with self._lock:
+            return list(self._metrics.values())
+
+    def snapshot(self, prefix: str = "") -> Dict[str, List[Dict[str, Any]]]:
+        return {metric.name: metric.snapshot() for metric in self.metrics() if metric.name.startswith(prefix)}
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text format (served with CONTENT_TYPE)"""
+        with self._lock:
+            collectors = list(self._collectors)
+        for collector in collectors:
+            collector()
+        return "\n".join(metric.exposition() for metric in self.metrics()) + "\n"
+
+
+# Create singleton instance
+metrics = MetricsRegistry()
@@ -0,0 +1,12 @@
+-- Cache Versions Migration
+-- One counter per cached table. Writers bump it (the Go payment method
+-- handlers do after every create/update/delete) and each Python worker
+-- drops its in-memory response cache when it reads a new value
+
+CREATE TABLE IF NOT EXISTS cache_versions (
+    name VARCHAR(64) NOT NULL PRIMARY KEY,
+    version BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+INSERT IGNORE INTO cache_versions (name, version) VALUES ('payment_methods', 0);
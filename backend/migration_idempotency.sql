@@ -0,0 +1,23 @@
+-- Idempotency Keys Migration
+-- Stores the first response of payment creation requests sent with an
+-- Idempotency-Key header so client retries replay it instead of creating
+-- a second Xendit payment
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    idempotency_key VARCHAR(191) NOT NULL,
+    endpoint VARCHAR(100) NOT NULL,
+    request_hash CHAR(64) NOT NULL COMMENT 'SHA-256 of the canonical request body',
+    status ENUM('in_progress', 'completed') NOT NULL DEFAULT 'in_progress',
+    response_status INT NULL,
+    response_body MEDIUMTEXT NULL,
+    locked_until TIMESTAMP NULL COMMENT 'Lease of the in-progress owner; a stale key is taken over',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (idempotency_key, endpoint),
+    INDEX idx_expires_at (expires_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Tables created before the lease column
+ALTER TABLE idempotency_keys
+ADD COLUMN IF NOT EXISTS locked_until TIMESTAMP NULL COMMENT 'Lease of the in-progress owner; a stale key is taken over'
+AFTER response_body;
@@ -0,0 +1,22 @@
+-- JSON Columns Migration
+-- Converts metadata, webhook_data and payment_methods.config from TEXT to
+-- native JSON so they are validated on write and can be served without
+-- being decoded on every read.
+-- Rows holding invalid JSON would make the ALTER fail, so they are fixed
+-- first: free text is kept as a JSON string, unparseable config becomes {}.
+
+UPDATE xendit_payments SET metadata = JSON_QUOTE(metadata)
+WHERE metadata IS NOT NULL AND JSON_VALID(metadata) = 0;
+
+UPDATE xendit_payments SET webhook_data = JSON_QUOTE(webhook_data)
+WHERE webhook_data IS NOT NULL AND JSON_VALID(webhook_data) = 0;
+
+UPDATE payment_methods SET config = '{}'
+WHERE config IS NOT NULL AND JSON_VALID(config) = 0;
+
+ALTER TABLE xendit_payments
+MODIFY COLUMN metadata JSON NULL COMMENT 'QR string, VA number, etc',
+MODIFY COLUMN webhook_data JSON NULL COMMENT 'Raw webhook data';
+
+ALTER TABLE payment_methods
+MODIFY COLUMN config JSON NULL;
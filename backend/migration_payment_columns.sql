@@ -0,0 +1,15 @@
+-- Payment Columns Migration
+-- Promotes expired_at and account_number out of the metadata JSON into
+-- indexed columns. Existing rows are filled by backfill_payment_columns.py
+-- in id-range chunks; new rows are written with them by the API.
+
+ALTER TABLE xendit_payments
+ADD COLUMN IF NOT EXISTS expired_at DATETIME NULL COMMENT 'Payment expiry (UTC)';
+
+ALTER TABLE xendit_payments
+ADD COLUMN IF NOT EXISTS account_number VARCHAR(50) NULL COMMENT 'Virtual Account number';
+
+-- Expiry sweeper range: status = 'PENDING' AND expired_at < UTC_TIMESTAMP()
+CREATE INDEX IF NOT EXISTS idx_status_expired_at ON xendit_payments (status, expired_at);
+
+CREATE INDEX IF NOT EXISTS idx_account_number ON xendit_payments (account_number);
@@ -0,0 +1,9 @@
+-- Payment Reconciliation Migration
+-- Lease columns that let several reconciliation workers split the PENDING
+-- backlog without checking the same payment twice
+
+ALTER TABLE xendit_payments
+ADD COLUMN IF NOT EXISTS reconcile_owner VARCHAR(100) NULL COMMENT 'Worker holding the reconciliation lease';
+
+ALTER TABLE xendit_payments
+ADD COLUMN IF NOT EXISTS reconcile_at TIMESTAMP NULL COMMENT 'Not reconciled again before this time';
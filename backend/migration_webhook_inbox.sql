@@ -0,0 +1,31 @@
+-- Xendit Webhook Inbox Migration
+-- Durable queue of raw callbacks; the webhook endpoint appends and acks,
+-- background consumers apply them to xendit_payments and orders
+
+CREATE TABLE IF NOT EXISTS xendit_webhook_inbox (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    payload MEDIUMTEXT NOT NULL COMMENT 'Raw webhook body',
+    status ENUM('pending', 'processing', 'done', 'failed', 'unmatched') NOT NULL DEFAULT 'pending'
+        COMMENT 'unmatched: no payment had the reference yet; re-queued until max attempts',
+    attempts INT NOT NULL DEFAULT 0,
+    claimed_by VARCHAR(100) NULL COMMENT 'Consumer that holds the row while processing',
+    claimed_at TIMESTAMP NULL,
+    last_error TEXT NULL,
+    received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    processed_at TIMESTAMP NULL,
+    INDEX idx_status_id (status, id),
+    INDEX idx_claimed_by (claimed_by)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Callbacks already applied, keyed on payment id + status, so redeliveries
+-- are acknowledged without touching xendit_payments or orders
+CREATE TABLE IF NOT EXISTS xendit_webhook_events (
+    event_key VARCHAR(191) PRIMARY KEY COMMENT 'event:payment_id:status',
+    inbox_id BIGINT NULL,
+    processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Inbox tables created before the unmatched status
+ALTER TABLE xendit_webhook_inbox
+MODIFY COLUMN status ENUM('pending', 'processing', 'done', 'failed', 'unmatched') NOT NULL DEFAULT 'pending'
+    COMMENT 'unmatched: no payment had the reference yet; re-queued until max attempts';
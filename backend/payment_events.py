@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Payment Status Notifier
+In-process fan-out of payment status changes to Server-Sent Events
+subscribers, so waiting terminals are pushed the result instead of polling
+"""
+
+import asyncio
+import logging
+import os
+from typing import Dict, Any, Iterable, List, Optional, Set
+
+from async_db import AsyncDatabase, db
+from json_render import dumps
+
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATUSES = ("PAID", "SETTLED", "COMPLETED", "EXPIRED", "FAILED", "VOIDED", "CANCELLED")
+
+
+def format_sse(event: Dict[str, Any], name: str = "status") -> str:
+    return f"event: {name}\ndata: {dumps(event).decode('utf-8')}\n\n"
+
+
+class PaymentNotifier:
+    """
+    Subscribers register a queue under a payment's reference_id and payment_id.
+    Status changes are published by the webhook consumer after commit; callbacks
+    applied by another worker process are picked up by one batched status query
+    per sync interval, however many terminals are waiting.
+    """
+
+    def __init__(self, database: AsyncDatabase, sync_interval: float = 5.0, queue_size: int = 8):
+        """
+        Args:
+            database: Async database used for the cross-worker sync query
+            sync_interval: Seconds between batched status checks (0 disables them)
+            queue_size: Pending events kept per subscriber before the oldest is dropped
+        """
+        self.db = database
+        self.sync_interval = sync_interval
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._status: Dict[str, str] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, reference_id: str, payment_id: Optional[str], status: str) -> asyncio.Queue:
+        queue = asyncio.Queue(self.queue_size)
+        for key in (reference_id, payment_id):
+            if key:
+                self._subscribers.setdefault(key, set()).add(queue)
+        self._status[reference_id] = status
+        return queue
+
+    def unsubscribe(self, reference_id: str, payment_id: Optional[str], queue: asyncio.Queue):
+        for key in (reference_id, payment_id):
+            queues = self._subscribers.get(key)
+            if queues is None:
+                continue
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[key]
+        if reference_id not in self._subscribers:
+            self._status.pop(reference_id, None)
+
+    def publish(self, keys: Iterable[Optional[str]], event: Dict[str, Any]):
+        """Deliver an event to every subscriber of any of the given keys"""
+        self.published += 1
+        targets: Set[asyncio.Queue] = set()
+        for key in keys:
+            if key:
+                targets.update(self._subscribers.get(key, ()))
+        if event.get("reference_id") in self._status:
+            self._status[event["reference_id"]] = event.get("status")
+
+        for queue in targets:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+            self.delivered += 1
+
+    def start(self):
+        if self._task is None and self.sync_interval > 0:
+            self._task = asyncio.create_task(self._sync_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "watched_payments": len(self._status),
+            "subscriptions": len(set().union(*self._subscribers.values())) if self._subscribers else 0,
+            "published": self.published,
+            "delivered": self.delivered,
+        }
+
+    async def _sync_loop(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            if not self._status:
+                continue
+            try:
+                await self._sync()
+            except Exception as e:
+                logger.exception("Payment status sync failed: %s", e)
+
+    async def _sync(self, chunk: int = 500):
+        references: List[str] = list(self._status)
+        for start in range(0, len(references), chunk):
+            batch = references[start:start + chunk]
+            placeholders = ", ".join(["%s"] * len(batch))
+            rows = await self.db.fetch_all(f"""
+                SELECT reference_id, payment_id, status, paid_at
+                FROM xendit_payments WHERE reference_id IN ({placeholders})
+            """, batch)
+            for row in rows:
+                if self._status.get(row["reference_id"]) != row["status"]:
+                    self.publish((row["reference_id"], row["payment_id"]), dict(row))
+
+
+# Create singleton instance
+payment_notifier = PaymentNotifier(
+    db,
+    sync_interval=float(os.getenv("PAYMENT_EVENTS_SYNC_INTERVAL", "5"))
+)
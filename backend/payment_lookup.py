@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Payment Lookup Resolver
+Routes a payment identifier to a single-column index lookup instead of
+`payment_id = %s OR reference_id = %s`, which MySQL tends to answer with
+an index merge or a scan as xendit_payments grows
+"""
+
+import re
+from typing import Optional, Tuple
+
+
+# reference_id prefixes issued by the create endpoints (Python and Go services)
+REFERENCE_PREFIXES = ("qris_", "va_", "ewallet_")
+
+# Xendit object ids: 24-hex invoice / VA ids, or prefixed ids such as ewc_<uuid>
+XENDIT_ID_PATTERN = re.compile(r"^(?:[0-9a-f]{24}|[a-z]{2,6}_[0-9a-f-]{20,})$")
+
+
+def lookup_column(identifier: str) -> Optional[str]:
+    """
+    Column that can hold this identifier
+
+    Returns:
+        "reference_id", "payment_id", or None when the shape is not recognised
+    """
+    if identifier.startswith(REFERENCE_PREFIXES):
+        return "reference_id"
+    if XENDIT_ID_PATTERN.match(identifier):
+        return "payment_id"
+    return None
+
+
+def select_payment_sql(identifier: str, columns: str = "*",
+                       table: str = "xendit_payments") -> Tuple[str, tuple]:
+    """
+    SELECT for one payment by payment_id or reference_id
+
+    Known identifier shapes become a single point lookup on the matching
+    index; anything else becomes a UNION ALL of the two point lookups.
+    """
+    column = lookup_column(identifier)
+    if column:
+        return f"SELECT {columns} FROM {table} WHERE {column} = %s LIMIT 1", (identifier,)
+    return (
+        f"(SELECT {columns} FROM {table} WHERE payment_id = %s LIMIT 1) "
+        f"UNION ALL "
+        f"(SELECT {columns} FROM {table} WHERE reference_id = %s LIMIT 1) "
+        f"LIMIT 1"
+    ), (identifier, identifier)
+
+
+def webhook_match(external_id: Optional[str], payment_id: Optional[str]) -> Tuple[str, str]:
+    """
+    Column and value that identify the payment a callback refers to
+
+    The external_id Xendit echoes back is the reference_id we issued, so it
+    goes to the unique reference_id index; callbacks without one fall back
+    to the payment_id index.
+    """
+    if external_id and (external_id.startswith(REFERENCE_PREFIXES) or not payment_id):
+        return "reference_id", external_id
+    if payment_id:
+        return "payment_id", payment_id
+    return "reference_id", external_id
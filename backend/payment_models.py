@@ -3,9 +3,32 @@
 Payment Models and Database Schema
 """
 
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Literal, Union, Annotated, get_args
 from datetime import datetime
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, BeforeValidator, Field
+
+
+# Channel ids as stored in payment_methods.channel_id (pos_main, dine_in, takeaway, all)
+CHANNEL_ID_PATTERN = r"^[a-z0-9_]{1,32}$"
+
+BankCode = Literal["BCA", "BNI", "BRI", "MANDIRI", "PERMATA", "BSI", "BJB", "CIMB"]
+WalletType = Literal["OVO", "DANA", "LINKAJA", "GOPAY", "SHOPEEPAY"]
+
+BANK_CODES = get_args(BankCode)
+WALLET_TYPES = get_args(WalletType)
+# Channel codes Xendit calls are made for; QRIS/VA/EWALLET label calls without a bank or wallet
+XENDIT_CHANNELS = frozenset(("QRIS", "VA", "EWALLET") + BANK_CODES + WALLET_TYPES)
+UNKNOWN_CHANNEL = "other"
+
+
+def channel_key(channel_code: Optional[str]) -> str:
+    """Upper-cased channel code if supported, else "other" (breaker keys, metric labels)"""
+    code = (channel_code or "").upper()
+    return code if code in XENDIT_CHANNELS else UNKNOWN_CHANNEL
+
+
+def _upper(value: Any) -> Any:
+    return value.strip().upper() if isinstance(value, str) else value
 
 
 class PaymentRequest(BaseModel):
@@ -25,16 +48,46 @@ class QRISPaymentRequest(PaymentRequest):
 
 class VirtualAccountRequest(PaymentRequest):
     """Virtual Account payment request"""
-    bank_code: str = Field(..., description="Bank code (BCA, BNI, BRI, MANDIRI, etc)")
+    bank_code: Annotated[BankCode, BeforeValidator(_upper)] = Field(
+        ..., description="Bank code (BCA, BNI, BRI, MANDIRI, PERMATA, BSI, BJB, CIMB)"
+    )
 
 
 class EWalletPaymentRequest(PaymentRequest):
     """E-wallet payment request"""
-    wallet_type: str = Field(..., description="E-wallet type (OVO, DANA, LINKAJA, GOPAY, SHOPEEPAY)")
+    wallet_type: Annotated[WalletType, BeforeValidator(_upper)] = Field(
+        ..., description="E-wallet type (OVO, DANA, LINKAJA, GOPAY, SHOPEEPAY)"
+    )
     success_url: str = Field(default="http://localhost:3000/payment-success")
     failure_url: str = Field(default="http://localhost:3000/payment-failed")
 
 
+class BatchQRISPayment(QRISPaymentRequest):
+    """QRIS item of a batch payment request"""
+    payment_type: Literal["qris"]
+
+
+class BatchVirtualAccountPayment(VirtualAccountRequest):
+    """Virtual Account item of a batch payment request"""
+    payment_type: Literal["virtual_account"]
+
+
+class BatchEWalletPayment(EWalletPaymentRequest):
+    """E-wallet item of a batch payment request"""
+    payment_type: Literal["ewallet"]
+
+
+BatchPaymentItem = Annotated[
+    Union[BatchQRISPayment, BatchVirtualAccountPayment, BatchEWalletPayment],
+    Field(discriminator="payment_type")
+]
+
+
+class BatchPaymentRequest(BaseModel):
+    """Several payments created in one call (split bills, group orders)"""
+    payments: List[BatchPaymentItem] = Field(..., min_length=1, max_length=50)
+
+
 class PaymentMethodConfig(BaseModel):
     """Payment method configuration"""
     id: Optional[int] = None
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+On-Demand Sampling Profiler
+Wall-clock sampler for a live worker: a helper thread snapshots the event
+loop thread's stack every few milliseconds and writes speedscope JSON or
+collapsed stacks (flamegraph.pl / speedscope input) to PROFILE_DIR.
+Triggered for one request by a signed X-Profile header, or for N seconds
+from the admin endpoint. Nothing runs, and the middleware is not even
+installed, unless PROFILE_SECRET is set.
+
+Usage (create a header value valid for 5 minutes):
+    python profiler.py sign --ttl 300
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+from typing import Dict, Any, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+PROFILE_FORMATS = ("speedscope", "collapsed")
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+class SamplingProfiler:
+    """Samples one thread's stack from a helper thread until stopped"""
+
+    def __init__(self, thread_id: int, interval: float = 0.005, anchor: Optional[FrameType] = None):
+        """
+        Args:
+            thread_id: Thread to sample (the event loop thread)
+            interval: Seconds between samples
+            anchor: Only keep samples whose stack runs through this frame (the
+                profiling middleware's call for one request). Other requests
+                share the loop thread; their time slices are skipped.
+        """
+        self.thread_id = thread_id
+        self.interval = interval
+        self.anchor = anchor
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.skipped = 0
+        self.started_at = 0.0
+        self.duration = 0.0
+        self._labels: Dict[Any, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Signal the sampler to stop; returns without waiting for it"""
+        self._stop.set()
+
+    def join(self, timeout: Optional[float] = None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+        self.duration = time.perf_counter() - self.started_at
+
+    def _sample(self):
+        # Which request is running is read from the same stack snapshot that is
+        # recorded, so a sample can never be credited to another request
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        anchored = self.anchor is None
+        while frame is not None:
+            if frame is self.anchor:
+                anchored = True
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = _frame_label(code)
+            stack.append(label)
+            frame = frame.f_back
+        if not anchored:
+            self.skipped += 1
+            return
+        if stack:
+            stack.reverse()
+            self.stacks[tuple(stack)] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """One "root;child;leaf count" line per distinct stack"""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def speedscope(self, name: str) -> Dict[str, Any]:
+        """Sampled profile in the speedscope file format, weights in seconds"""
+        frames: List[Dict[str, Any]] = []
+        index: Dict[str, int] = {}
+        samples, weights = [], []
+        for stack, count in self.stacks.items():
+            ids = []
+            for label in stack:
+                if label not in index:
+                    index[label] = len(frames)
+                    frames.append({"name": label})
+                ids.append(index[label])
+            samples.append(ids)
+            weights.append(round(count * self.interval, 6))
+        total = round(sum(weights), 6)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled", "name": name, "unit": "seconds",
+                "startValue": 0, "endValue": total, "samples": samples, "weights": weights,
+            }],
+            "name": name,
+            "exporter": "pos-backend profiler",
+        }
+
+    def write(self, directory: str, name: str, fmt: str) -> str:
+        os.makedirs(directory, exist_ok=True)
+        if fmt == "collapsed":
+            path = os.path.join(directory, f"{name}.folded")
+            content = self.collapsed()
+        else:
+            path = os.path.join(directory, f"{name}.speedscope.json")
+            content = json.dumps(self.speedscope(name))
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+
+class ProfileController:
+    """Checks profiling requests and runs at most one profiler at a time"""
+
+    def __init__(self, secret: str = "", directory: str = "profiles", interval: float = 0.005,
+                 max_seconds: float = 60.0, default_format: str = "speedscope"):
+        """
+        Args:
+            secret: HMAC key for X-Profile tokens; empty disables profiling entirely
+            directory: Where profiles are written
+            interval: Seconds between stack samples
+            max_seconds: Longest profile the admin endpoint will run
+            default_format: speedscope or collapsed
+        """
+        self.secret = secret.encode("utf-8")
+        self.directory = directory
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.default_format = default_format if default_format in PROFILE_FORMATS else "speedscope"
+        self._active: Optional[SamplingProfiler] = None
+        self.written: List[str] = []
+
+    @classmethod
+    def from_env(cls) -> "ProfileController":
+        return cls(
+            secret=os.getenv("PROFILE_SECRET", ""),
+            directory=os.getenv("PROFILE_DIR", "profiles"),
+            interval=float(os.getenv("PROFILE_INTERVAL", "0.005")),
+            max_seconds=float(os.getenv("PROFILE_MAX_SECONDS", "60")),
+            default_format=os.getenv("PROFILE_FORMAT", "speedscope"),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.secret)
+
+    @property
+    def busy(self) -> bool:
+        return self._active is not None
+
+    def sign(self, expires: int) -> str:
+        """X-Profile header value valid until the given unix time"""
+        digest = hmac.new(self.secret, str(expires).encode("ascii"), hashlib.sha256).hexdigest()
+        return f"{expires}.{digest}"
+
+    def verify(self, token: Optional[str]) -> bool:
+        if not self.enabled or not token or "." not in token:
+            return False
+        expires, _, _ = token.partition(".")
+        if not expires.isdigit() or int(expires) < time.time():
+            return False
+        return hmac.compare_digest(self.sign(int(expires)), token)
+
+    def begin(self, anchor: Optional[FrameType] = None) -> Optional[SamplingProfiler]:
+        """
+        Start sampling the calling event loop thread, or None if a profile is
+        already running; with anchor, only stacks running through that frame count
+        """
+        if self._active is not None:
+            return None
+        self._active = SamplingProfiler(threading.get_ident(), self.interval, anchor=anchor)
+        self._active.start()
+        return self._active
+
+    async def finish(self, profiler: SamplingProfiler, name: str, fmt: Optional[str] = None) -> Dict[str, Any]:
+        """Stop the profiler and write its output off the event loop"""
+        profiler.stop()
+        try:
+            path = await asyncio.to_thread(self._write, profiler, name, fmt or self.default_format)
+        finally:
+            self._active = None
+        return {"path": path, "samples": profiler.samples, "skipped": profiler.skipped,
+                "seconds": round(profiler.duration, 3)}
+
+    def _write(self, profiler: SamplingProfiler, name: str, fmt: str) -> str:
+        profiler.join()
+        path = profiler.write(self.directory, name, fmt)
+        self.written = (self.written + [path])[-20:]
+        return path
+
+    async def profile_for(self, seconds: float, fmt: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Sample the whole worker for N seconds; None if a profile is already running"""
+        profiler = self.begin()
+        if profiler is None:
+            return None
+        await asyncio.sleep(min(max(seconds, 0.1), self.max_seconds))
+        return await self.finish(profiler, f"worker-{os.getpid()}-{int(time.time())}", fmt)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "active": self.busy, "recent": list(self.written)}
+
+
+class ProfilerMiddleware:
+    """
+    Profiles a single request carrying a valid X-Profile token; the output
+    file name is returned in X-Profile-Output. Requests without the header
+    pass straight through.
+    """
+
+    def __init__(self, app, controller: "ProfileController", exclude_paths: Tuple[str, ...] = ()):
+        """
+        Args:
+            app: ASGI application
+            controller: Verifies tokens and owns the running profiler
+            exclude_paths: Paths never profiled per request (the admin profiling endpoint)
+        """
+        self.app = app
+        self.controller = controller
+        self.exclude_paths = exclude_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        token = fmt = None
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                token = value.decode("latin-1")
+            elif name == b"x-profile-format":
+                fmt = value.decode("latin-1")
+        if token is None or not self.controller.verify(token):
+            await self.app(scope, receive, send)
+            return
+
+        # This coroutine's frame is on the loop thread's stack exactly while
+        # the request's own code runs (not while other requests' tasks do)
+        profiler = self.controller.begin(anchor=sys._getframe())
+        if profiler is None:
+            await self.app(scope, receive, send)
+            return
+
+        fmt = fmt if fmt in PROFILE_FORMATS else None
+        name = f"request-{os.getpid()}-{int(time.time() * 1000)}"
+
+        async def send_with_output(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-output", name.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_output)
+        finally:
+            await self.controller.finish(profiler, name, fmt)
+
+
+# Create singleton instance
+profile_controller = ProfileController.from_env()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    sign = subparsers.add_parser("sign", help="Print an X-Profile or X-Admin-Token header value")
+    sign.add_argument("--ttl", type=int, default=300, help="Seconds the token stays valid")
+    args = parser.parse_args()
+
+    if not profile_controller.enabled:
+        parser.error("PROFILE_SECRET is not set")
+    print(profile_controller.sign(int(time.time()) + args.ttl))
+
+
+if __name__ == "__main__":
+    main()
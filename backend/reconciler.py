@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Payment Reconciliation Sweeper
+Finds payments still PENDING long after creation (e.g. a lost webhook),
+asks Xendit for their status and applies the changes in batched UPDATEs
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from typing import Dict, Any, List, Optional, Tuple
+
+from async_db import AsyncDatabase, db
+from payment_events import payment_notifier
+from webhook_inbox import EWALLET_STATUSES, PAID_STATUSES
+from xendit_service import AsyncXenditService, async_xendit_service
+
+
+logger = logging.getLogger(__name__)
+
+# xendit_payments.payment_type -> get_payment_status payment_type
+STATUS_LOOKUP_TYPES = {"qris": "invoice", "ewallet": "ewallet"}
+
+# Xendit status -> status stored in xendit_payments; anything else stays PENDING.
+# Virtual accounts are left to their callbacks: the VA status says whether the
+# account is open, not whether it was paid.
+RECONCILED_STATUSES = {
+    "invoice": {"PAID": "PAID", "SETTLED": "SETTLED", "EXPIRED": "EXPIRED"},
+    "ewallet": EWALLET_STATUSES,
+}
+
+
+class RateLimiter:
+    """Spaces calls evenly at rate per second within this process"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class PaymentReconciler:
+    """
+    Each sweep walks PENDING rows in id order over idx_status (InnoDB keeps
+    the primary key in the secondary index, so the walk needs no sort) and
+    stops at the first row younger than min_age. Pages are leased with
+    reconcile_owner/reconcile_at before Xendit is asked, so workers running
+    the sweep at the same time skip each other's rows.
+    """
+
+    def __init__(self, database: AsyncDatabase, xendit: AsyncXenditService, interval: float = 60.0,
+                 min_age_minutes: int = 15, batch_size: int = 100, concurrency: int = 5,
+                 rate: float = 10.0, lease_seconds: int = 120, recheck_seconds: int = 300):
+        """
+        Args:
+            database: Async database holding xendit_payments
+            xendit: Service used for the status calls
+            interval: Seconds between sweeps (0 disables the background loop)
+            min_age_minutes: Only payments PENDING for longer than this are checked
+            batch_size: Rows leased and updated per page
+            concurrency: Status calls in flight at once
+            rate: Status calls per second per worker process
+            lease_seconds: How long a leased page is hidden from other workers
+            recheck_seconds: Delay before a payment still PENDING at Xendit is checked again
+        """
+        self.db = database
+        self.xendit = xendit
+        self.interval = interval
+        self.min_age_minutes = min_age_minutes
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.rate_limiter = RateLimiter(rate)
+        self.lease_seconds = lease_seconds
+        self.recheck_seconds = recheck_seconds
+        self._owner_prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self._task: Optional[asyncio.Task] = None
+
+        self.sweeps = 0
+        self.checked = 0
+        self.updated = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls, database: AsyncDatabase, xendit: AsyncXenditService) -> "PaymentReconciler":
+        return cls(
+            database,
+            xendit,
+            interval=float(os.getenv("RECONCILE_INTERVAL", "60")),
+            min_age_minutes=int(os.getenv("RECONCILE_MIN_AGE_MINUTES", "15")),
+            batch_size=int(os.getenv("RECONCILE_BATCH_SIZE", "100")),
+            concurrency=int(os.getenv("RECONCILE_CONCURRENCY", "5")),
+            rate=float(os.getenv("RECONCILE_RATE", "10")),
+            lease_seconds=int(os.getenv("RECONCILE_LEASE_SECONDS", "120")),
+            recheck_seconds=int(os.getenv("RECONCILE_RECHECK_SECONDS", "300")),
+        )
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sweeps": self.sweeps,
+            "checked": self.checked,
+            "updated": self.updated,
+            "errors": self.errors,
+        }
+
+    async def sweep(self) -> int:
+        """Run one pass over the PENDING backlog; returns the number of payments updated"""
+        updated = 0
+        last_id = 0
+        while True:
+            ids, last_id, done = await self._scan(last_id)
+            if ids:
+                rows = await self._lease(ids)
+                if rows:
+                    updated += await self._reconcile(rows)
+            if done:
+                break
+        self.sweeps += 1
+        return updated
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.exception("Payment reconciliation sweep failed: %s", e)
+
+    async def _scan(self, after_id: int) -> Tuple[List[int], int, bool]:
+        """
+        Next page of candidate ids after after_id
+
+        Returns:
+            (ids old enough and not leased, last id seen, whether the walk is over)
+        """
+        rows = await self.db.fetch_all("""
+            SELECT id, payment_type,
+                   created_at < NOW() - INTERVAL %s MINUTE AS old_enough,
+                   reconcile_at IS NULL OR reconcile_at <= NOW() AS due
+            FROM xendit_payments FORCE INDEX (idx_status)
+            WHERE status = 'PENDING' AND id > %s
+            ORDER BY id
+            LIMIT %s
+        """, (self.min_age_minutes, after_id, self.batch_size))
+        if not rows:
+            return [], after_id, True
+
+        ids = []
+        for row in rows:
+            if not row["old_enough"]:
+                # Ids grow with created_at, so everything after this is younger too
+                return ids, row["id"], True
+            if row["due"] and row["payment_type"] in STATUS_LOOKUP_TYPES:
+                ids.append(row["id"])
+        return ids, rows[-1]["id"], len(rows) < self.batch_size
+
+    async def _lease(self, ids: List[int]) -> List[Dict[str, Any]]:
+        """Take the rows no other worker holds; returns the ones this call now owns"""
+        owner = f"{self._owner_prefix}:{uuid.uuid4().hex[:12]}"
+        placeholders = ", ".join(["%s"] * len(ids))
+        leased = await self.db.execute(f"""
+            UPDATE xendit_payments
+            SET reconcile_owner = %s, reconcile_at = NOW() + INTERVAL %s SECOND
+            WHERE id IN ({placeholders}) AND status = 'PENDING'
+              AND (reconcile_at IS NULL OR reconcile_at <= NOW())
+        """, [owner, self.lease_seconds, *ids])
+        if not leased:
+            return []
+        return await self.db.fetch_all(f"""
+            SELECT id, reference_id, payment_id, payment_type, channel_code
+            FROM xendit_payments
+            WHERE id IN ({placeholders}) AND reconcile_owner = %s
+        """, [*ids, owner])
+
+    async def _reconcile(self, rows: List[Dict[str, Any]]) -> int:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def check(row):
+            lookup_type = STATUS_LOOKUP_TYPES[row["payment_type"]]
+            async with semaphore:
+                await self.rate_limiter.acquire()
+                result = await self.xendit.get_payment_status(
+                    row["payment_id"], lookup_type, channel_code=row["channel_code"]
+                )
+            if not result.get("success"):
+                self.errors += 1
+                return None  # the lease expires and the row is retried later
+            return RECONCILED_STATUSES[lookup_type].get(result["status"], "PENDING"), result.get("amount")
+
+        results = await asyncio.gather(*[check(row) for row in rows])
+        self.checked += len(rows)
+
+        changes = []
+        unchanged = []
+        for row, result in zip(rows, results):
+            if result is None:
+                continue
+            status, amount = result
+            if status == "PENDING":
+                unchanged.append(row["id"])
+            else:
+                changes.append((row, status, amount))
+
+        async with self.db.transaction() as cursor:
+            if changes:
+                await self._apply(cursor, changes)
+            if unchanged:
+                placeholders = ", ".join(["%s"] * len(unchanged))
+                await cursor.execute(f"""
+                    UPDATE xendit_payments
+                    SET reconcile_owner = NULL, reconcile_at = NOW() + INTERVAL %s SECOND
+                    WHERE id IN ({placeholders})
+                """, [self.recheck_seconds, *unchanged])
+
+        for row, status, _ in changes:
+            payment_notifier.publish((row["reference_id"], row["payment_id"]), {
+                "reference_id": row["reference_id"],
+                "payment_id": row["payment_id"],
+                "status": status,
+            })
+        self.updated += len(changes)
+        return len(changes)
+
+    @staticmethod
+    async def _apply(cursor, changes: List[Tuple[Dict[str, Any], str, Any]]):
+        """One UPDATE for every status change of the page, one for the paid orders"""
+        ids = [row["id"] for row, _, _ in changes]
+        placeholders = ", ".join(["%s"] * len(ids))
+        status_cases = " ".join(["WHEN %s THEN %s"] * len(changes))
+        paid = [(row["id"], amount) for row, status, amount in changes if status in PAID_STATUSES and amount]
+        amount_cases = " ".join(["WHEN %s THEN %s"] * len(paid)) or "WHEN NULL THEN NULL"
+
+        # MySQL applies SET assignments left to right, so paid_at sees the new status
+        await cursor.execute(f"""
+            UPDATE xendit_payments
+            SET status = CASE id {status_cases} END,
+                paid_amount = CASE id {amount_cases} ELSE paid_amount END,
+                paid_at = CASE WHEN status IN ('PAID', 'SETTLED', 'COMPLETED') THEN COALESCE(paid_at, NOW())
+                               ELSE paid_at END,
+                reconcile_owner = NULL,
+                reconcile_at = NULL,
+                updated_at = NOW()
+            WHERE id IN ({placeholders}) AND status = 'PENDING'
+        """, [
+            *[value for row, status, _ in changes for value in (row["id"], status)],
+            *[value for pair in paid for value in pair],
+            *ids,
+        ])
+
+        paid_ids = [row["id"] for row, status, _ in changes if status in PAID_STATUSES]
+        if paid_ids:
+            placeholders = ", ".join(["%s"] * len(paid_ids))
+            await cursor.execute(f"""
+                UPDATE orders o
+                JOIN xendit_payments xp ON o.id = xp.order_id
+                SET o.payment_verified = TRUE,
+                    o.status = 'confirmed'
+                WHERE xp.id IN ({placeholders})
+            """, paid_ids)
+
+
+# Create singleton instance
+payment_reconciler = PaymentReconciler.from_env(db, async_xendit_service)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+HTTP Request Metrics
+ASGI middleware recording per-route latency, status counts and in-flight
+requests into the metrics registry, plus the /metrics scrape response
+"""
+
+import time
+
+from fastapi.responses import Response
+
+from metrics import CONTENT_TYPE, MetricsRegistry, metrics
+
+
+HTTP_REQUESTS = metrics.counter(
+    "http_requests_total", "Requests by route template and status code", ("method", "route", "status")
+)
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    "http_request_duration_seconds", "Request latency by route template", ("method", "route")
+)
+HTTP_IN_FLIGHT = metrics.gauge(
+    "http_requests_in_flight", "Requests currently being served"
+)
+
+
+class MetricsMiddleware:
+    """
+    Labels use the matched route template (/api/xendit/payments/{payment_id}/status)
+    rather than the raw path, so label cardinality stays bounded
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.observe(elapsed, method=scope["method"], route=path)
+            HTTP_REQUESTS.inc(method=scope["method"], route=path, status=status)
+
+
+def metrics_response(registry: MetricsRegistry = metrics) -> Response:
+    """Prometheus text exposition of every registered metric"""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
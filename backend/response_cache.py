@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+In-memory Response Cache
+Serves rarely-changing read endpoints from pre-serialized bodies with a
+strong ETag, answering matching If-None-Match requests with 304.
+The cache is per process; writers bump a shared row in cache_versions
+(migration_cache_versions.sql) and every worker drops its entries when it
+sees the new version.
+"""
+
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from fastapi.responses import Response
+
+from async_db import AsyncDatabase, db
+from json_render import dumps
+
+
+logger = logging.getLogger(__name__)
+
+
+class CachedResponse:
+    """Serialized body plus validators, built once per cache fill"""
+
+    __slots__ = ("body", "etag", "expires_at", "headers")
+
+    def __init__(self, body: bytes, expires_at: float, cache_control: str):
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.expires_at = expires_at
+        self.headers = {"ETag": self.etag, "Cache-Control": cache_control}
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        # If-None-Match uses weak comparison, so W/"x" matches "x"
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag == self.etag:
+                return True
+        return False
+
+    def response(self, if_none_match: Optional[str] = None) -> Response:
+        if self.matches(if_none_match):
+            return Response(status_code=304, headers=self.headers)
+        return Response(content=self.body, media_type="application/json", headers=self.headers)
+
+
+class ResponseCache:
+    """Keyed TTL cache of rendered JSON responses, bounded to max_entries (LRU)"""
+
+    def __init__(self, ttl: float = 60.0, max_age: int = 0, max_entries: int = 256,
+                 database: Optional[AsyncDatabase] = None, version_key: Optional[str] = None,
+                 version_check: float = 1.0):
+        """
+        Args:
+            ttl: Seconds a rendered response stays valid server-side
+            max_age: Cache-Control max-age sent to clients
+            max_entries: Entries kept; the least recently used is evicted past it
+            database: Database holding cache_versions (None: only ttl and local
+                invalidate() expire entries)
+            version_key: cache_versions row the table's writers bump
+            version_check: Seconds between reads of the shared version, which
+                bounds how long another process's write can go unseen
+        """
+        self.db = database
+        self.version_key = version_key
+        self.version_check = version_check
+        self.version: Optional[int] = None
+        self._next_check = 0.0
+        self.ttl = ttl
+        self.cache_control = f"public, max-age={max_age}, must-revalidate"
+        self.max_entries = max(max_entries, 1)
+        self.generation = 0
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.version_errors = 0
+
+    async def check_version(self):
+        """Drop every entry if the shared version moved since the last check (at most every version_check)"""
+        if self.db is None or not self.version_key:
+            return
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.version_check
+        try:
+            row = await self.db.fetch_one("SELECT version FROM cache_versions WHERE name = %s", (self.version_key,))
+            version = int(row["version"]) if row else 0
+        except Exception as e:
+            # Without the table entries still expire after ttl
+            self.version_errors += 1
+            if self.version_errors == 1:
+                logger.warning("Cache version check for %s failed, relying on the TTL: %s", self.version_key, e)
+            return
+        if self.version is not None and version != self.version:
+            self.invalidate()
+        self.version = version
+
+    async def bump_version(self):
+        """Invalidate this cache in every process: bump the shared version, then drop local entries"""
+        if self.db is not None and self.version_key:
+            await self.db.execute("""
+                INSERT INTO cache_versions (name, version) VALUES (%s, 1)
+                ON DUPLICATE KEY UPDATE version = version + 1
+            """, (self.version_key,))
+        self.invalidate()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, payload: Any, generation: Optional[int] = None) -> CachedResponse:
+        """
+        Serialize payload and store it under key
+
+        Args:
+            key: Cache key
+            payload: JSON-compatible content; datetimes, Decimals and RawJSON
+                fragments are handled by json_render.dumps
+            generation: Value of self.generation read before the data was loaded; the entry
+                is not stored if an invalidation happened in between
+
+        Returns:
+            CachedResponse for the payload
+        """
+        body = dumps(payload)
+        now = time.monotonic()
+        entry = CachedResponse(body, now + self.ttl, self.cache_control)
+        if generation is None or generation == self.generation:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._evict(now)
+        return entry
+
+    def _evict(self, now: float):
+        """Drop expired entries, then the least recently used until under max_entries"""
+        for key in [key for key, entry in self._entries.items() if entry.expires_at < now]:
+            del self._entries[key]
+            self.evictions += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def respond(self, entry: CachedResponse, if_none_match: Optional[str]) -> Response:
+        response = entry.response(if_none_match)
+        if response.status_code == 304:
+            self.not_modified += 1
+        return response
+
+    def invalidate(self):
+        """Drop every entry in this process (bump_version reaches the other workers too)"""
+        self.generation += 1
+        self._entries.clear()
+        self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "version": self.version,
+            "version_errors": self.version_errors,
+        }
+
+
+# Create singleton instance
+payment_methods_cache = ResponseCache(
+    ttl=float(os.getenv("PAYMENT_METHODS_CACHE_TTL", "60")),
+    max_age=int(os.getenv("PAYMENT_METHODS_CACHE_MAX_AGE", "0")),
+    max_entries=int(os.getenv("PAYMENT_METHODS_CACHE_MAX_ENTRIES", "256")),
+    database=db,
+    version_key="payment_methods",
+    version_check=float(os.getenv("PAYMENT_METHODS_CACHE_VERSION_CHECK", "1"))
+)
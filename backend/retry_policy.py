@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Retry Policies for Xendit Calls
+Exponential backoff with full jitter, rolling latency percentiles and
+hedged duplicate reads for slow status calls
+"""
+
+import asyncio
+import os
+import random
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+
+import httpx
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Transport errors, 429 and 5xx are transient; other 4xx responses and
+    open circuits are not worth another attempt
+    """
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code >= 500 or status_code == 429
+    return isinstance(error, httpx.TransportError)
+
+
+class RetryPolicy:
+    """Attempt budget and jittered exponential backoff between attempts"""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.2, max_delay: float = 2.0):
+        """
+        Args:
+            max_attempts: Total attempts including the first (1 disables retries)
+            base_delay: Backoff ceiling in seconds before the second attempt
+            max_delay: Upper bound of the backoff ceiling
+        """
+        self.max_attempts = max(max_attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_env(cls, prefix: str, max_attempts: int = 3) -> "RetryPolicy":
+        return cls(
+            max_attempts=int(os.getenv(f"{prefix}_MAX_ATTEMPTS", str(max_attempts))),
+            base_delay=float(os.getenv(f"{prefix}_BASE_DELAY", "0.2")),
+            max_delay=float(os.getenv(f"{prefix}_MAX_DELAY", "2")),
+        )
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: uniform between 0 and base_delay * 2^(attempt - 1), capped"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class LatencyTracker:
+    """Rolling window of call durations for percentile estimates"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self._samples: deque = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """q-th percentile (0-1) in seconds, or None until min_samples are recorded"""
+        if len(self._samples) < self.min_samples:
+            return None
+        samples = sorted(self._samples)
+        return samples[min(int(len(samples) * q), len(samples) - 1)]
+
+
+async def hedged(call: Callable[[], Awaitable[Any]], delay: float,
+                 on_hedge: Optional[Callable[[], None]] = None) -> Any:
+    """
+    Run call(); if it has not finished after delay seconds start a duplicate
+    and return whichever succeeds first, cancelling the other
+
+    Only for idempotent reads: both requests may reach the server.
+    """
+    first = asyncio.ensure_future(call())
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done:
+        return first.result()
+
+    if on_hedge is not None:
+        on_hedge()
+    pending = {first, asyncio.ensure_future(call())}
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
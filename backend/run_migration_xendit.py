@@ -6,11 +6,34 @@ Run Xendit database migration
 
 import mysql.connector
 import os
+import sys
+import time
+import requests
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def run_migration():
+from profiler import profile_controller
+
+
+def notify_schema_refresh():
+    """Ask the running payment API to re-read its cached table layouts"""
+    url = f"{os.getenv('API_BASE_URL', 'http://localhost:' + os.getenv('PORT', '8001'))}/api/schema/refresh"
+    if not profile_controller.enabled:
+        print("Schema cache not refreshed (PROFILE_SECRET unset); running servers pick it up on the next timer refresh")
+        return
+    try:
+        token = profile_controller.sign(int(time.time()) + 60)
+        response = requests.post(url, headers={"X-Admin-Token": token}, timeout=5)
+        print(f"Schema cache refresh: HTTP {response.status_code}")
+    except Exception as e:
+        print(f"Schema cache not refreshed ({e}); running servers pick it up on the next timer refresh")
+
+
+DEFAULT_MIGRATION = "migration_xendit.sql"
+
+
+def run_migration(migration_file: str = DEFAULT_MIGRATION):
     try:
         print("Connecting to database...")
         conn = mysql.connector.connect(
@@ -23,12 +46,15 @@ def run_migration():
         
         cursor = conn.cursor()
         
-        print("Reading migration file...")
-        with open("migration_xendit.sql", "r") as f:
+        print(f"Reading migration file {migration_file}...")
+        with open(migration_file, "r") as f:
             sql_content = f.read()
         
-        # Split by semicolon and execute each statement
-        statements = [s.strip() for s in sql_content.split(";") if s.strip() and not s.strip().startswith("--")]
+        # Drop comment lines, then split by semicolon and execute each statement
+        sql_content = "\n".join(
+            line for line in sql_content.splitlines() if not line.strip().startswith("--")
+        )
+        statements = [s.strip() for s in sql_content.split(";") if s.strip()]
         
         print(f"Executing {len(statements)} SQL statements...")
         
@@ -48,10 +74,13 @@ def run_migration():
         conn.close()
         
         print("\n✅ Migration completed!")
-        print("\nCreated/updated tables:")
-        print("  - xendit_payments")
-        print("  - xendit_settings")
-        print("  - payment_methods (updated with Xendit methods)")
+        if migration_file == DEFAULT_MIGRATION:
+            print("\nCreated/updated tables:")
+            print("  - xendit_payments")
+            print("  - xendit_settings")
+            print("  - payment_methods (updated with Xendit methods)")
+        
+        notify_schema_refresh()
         
     except Exception as e:
         print(f"\n❌ Migration failed: {e}")
@@ -59,4 +88,5 @@ def run_migration():
         traceback.print_exc()
 
 if __name__ == "__main__":
-    run_migration()
+    # Usage: python run_migration_xendit.py [migration_file.sql]
+    run_migration(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_MIGRATION)
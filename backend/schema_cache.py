@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Schema Cache
+Resolves optional payment_methods columns once instead of running
+DESCRIBE on every request, and precompiles the queries and row mapper
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Any, Optional, Sequence, Callable, List, Tuple
+
+from async_db import AsyncDatabase, db
+from json_render import raw_json
+
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_REFRESH_INTERVAL = float(os.getenv("SCHEMA_REFRESH_INTERVAL", "300"))
+
+
+class PaymentMethodsSchema:
+    """Queries and row mapper compiled for one observed payment_methods layout"""
+
+    BASE_COLUMNS = ["id", "name", "type", "is_active"]
+    OPTIONAL_COLUMNS = ["config", "created_at", "updated_at", "channel_id", "channel_code",
+                        "display_name", "display_order", "min_amount", "max_amount"]
+    CONVERTERS: Dict[str, Callable[[Any], Any]] = {
+        # JSON column: passed through, never decoded; datetimes are rendered by json_render
+        "config": raw_json,
+    }
+
+    def __init__(self, columns: Sequence[str]):
+        self.columns = frozenset(columns)
+        self.optional = [col for col in self.OPTIONAL_COLUMNS if col in self.columns]
+        self.selected = self.BASE_COLUMNS + self.optional
+        self.supports_channel = "channel_id" in self.columns
+
+        select = f"SELECT {', '.join(self.selected)} FROM payment_methods WHERE is_active = TRUE"
+        order = " ORDER BY display_order, id" if "display_order" in self.columns else " ORDER BY id"
+        self.list_sql = select + order
+        self.channel_sql = (
+            select + " AND (channel_id = %s OR channel_id = 'all')" + order
+            if self.supports_channel else None
+        )
+
+        self._converters: List[Tuple[str, Optional[Callable[[Any], Any]]]] = [
+            (col, self.CONVERTERS.get(col)) for col in self.optional
+        ]
+
+    def query(self, channel_id: Optional[str] = None) -> Tuple[str, Optional[tuple]]:
+        """SQL and args for listing active methods, filtered by channel when supported"""
+        if channel_id and self.supports_channel:
+            return self.channel_sql, (channel_id,)
+        return self.list_sql, None
+
+    def map_row(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        method = {
+            "id": row["id"],
+            "name": row["name"],
+            "type": row["type"],
+            "is_active": row["is_active"],
+        }
+        for col, convert in self._converters:
+            value = row[col]
+            method[col] = convert(value) if convert and value else value
+        return method
+
+
+class SchemaCache:
+    """Holds table layouts resolved at startup and refreshes them on a timer"""
+
+    def __init__(self, database: AsyncDatabase, refresh_interval: float = SCHEMA_REFRESH_INTERVAL):
+        self.db = database
+        self.refresh_interval = refresh_interval
+        self.refreshed_at: Optional[float] = None
+        self._payment_methods: Optional[PaymentMethodsSchema] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self):
+        """Re-read table layouts (run at startup, on the timer, and after migrations)"""
+        async with self._lock:
+            rows = await self.db.fetch_all("DESCRIBE payment_methods")
+            self._payment_methods = PaymentMethodsSchema([row["Field"] for row in rows])
+            self.refreshed_at = time.time()
+
+    async def payment_methods(self) -> PaymentMethodsSchema:
+        if self._payment_methods is None:
+            await self.refresh()
+        return self._payment_methods
+
+    def start(self):
+        """Start the background refresh loop"""
+        if self._task is None and self.refresh_interval > 0:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "refreshed_at": self.refreshed_at,
+            "refresh_interval": self.refresh_interval,
+            "payment_methods_columns": sorted(self._payment_methods.columns) if self._payment_methods else None,
+        }
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.exception("Schema cache refresh failed: %s", e)
+
+
+# Create singleton instance
+schema_cache = SchemaCache(db)
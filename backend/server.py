@@ -1,21 +1,36 @@
 #!/usr/bin/env python3
 
-from fastapi import FastAPI, HTTPException, Request, Header
+from fastapi import FastAPI, HTTPException, Request, Header, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
-import mysql.connector
 import os
 from typing import List, Dict, Any, Optional
 import uvicorn
 import json
-from datetime import datetime
+import logging
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+from structured_logging import logging_setup, RequestIdMiddleware
+
+logging_setup.start()
+logger = logging.getLogger(__name__)
+
+from async_db import db
+from schema_cache import schema_cache
+from response_cache import payment_methods_cache
+from id_generator import reference_ids
+from payment_lookup import select_payment_sql, webhook_match
+from expiry_sweeper import parse_expired_at
+from json_render import FastJSONResponse, raw_json
+from admin_auth import require_admin_token
+from payment_models import CHANNEL_ID_PATTERN
+from webhook_inbox import PAID_STATUSES, normalize_callback
+
 # Import Xendit service
 try:
-    from xendit_service import xendit_service
+    from xendit_service import async_xendit_service
     from payment_models import (
         QRISPaymentRequest,
         VirtualAccountRequest,
@@ -23,10 +38,10 @@ try:
     )
     XENDIT_ENABLED = True
 except Exception as e:
-    print(f"Warning: Xendit not enabled: {e}")
+    logger.warning("Xendit not enabled: %s", e)
     XENDIT_ENABLED = False
 
-app = FastAPI(title="POS API with Xendit", version="2.0.0")
+app = FastAPI(title="POS API with Xendit", version="2.0.0", default_response_class=FastJSONResponse)
 
 # CORS middleware
 app.add_middleware(
@@ -36,16 +51,36 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestIdMiddleware)
 
-# Database connection
-def get_db_connection():
-    return mysql.connector.connect(
-        host=os.getenv("DB_HOST", "srv1412.hstgr.io"),
-        port=int(os.getenv("DB_PORT", "3306")),
-        user=os.getenv("DB_USER", "u215947863_pos_dev"),
-        password=os.getenv("DB_PASSWORD", "Pos_dev123#"),
-        database=os.getenv("DB_NAME", "u215947863_pos_dev")
-    )
+@app.on_event("startup")
+async def open_db():
+    try:
+        await db.connect()
+    except Exception as e:
+        # The pool is opened lazily on first use if the DB is unreachable now
+        logger.warning("Database pool not opened at startup: %s", e)
+
+
+@app.on_event("startup")
+async def load_schema_cache():
+    try:
+        await schema_cache.refresh()
+    except Exception as e:
+        logger.warning("Schema cache not loaded at startup: %s", e)
+    schema_cache.start()
+
+
+@app.on_event("shutdown")
+async def close_db():
+    await schema_cache.stop()
+    await db.close()
+
+
+if XENDIT_ENABLED:
+    @app.on_event("shutdown")
+    async def close_xendit_client():
+        await async_xendit_service.aclose()
 
 @app.get("/api/health")
 async def health_check():
@@ -53,68 +88,58 @@ async def health_check():
         "status": "OK",
         "message": "POS API with Xendit is running",
         "version": "2.0.0",
-        "xendit_enabled": XENDIT_ENABLED and bool(os.getenv("XENDIT_API_KEY"))
+        "xendit_enabled": XENDIT_ENABLED and bool(os.getenv("XENDIT_API_KEY")),
+        "db_pool": db.stats(),
+        "logging": logging_setup.stats()
     }
 
 @app.get("/api/payment-methods")
-async def get_payment_methods(channel_id: Optional[str] = None):
+async def get_payment_methods(request: Request,
+                              channel_id: Optional[str] = Query(None, pattern=CHANNEL_ID_PATTERN)):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        cache_key = channel_id or ""
+        await payment_methods_cache.check_version()
+        cached = payment_methods_cache.get(cache_key)
+        if cached is not None:
+            return payment_methods_cache.respond(cached, request.headers.get("if-none-match"))
         
-        # Check columns
-        cursor.execute("DESCRIBE payment_methods")
-        columns = [row["Field"] for row in cursor.fetchall()]
-        
-        # Build query
-        base_columns = ["id", "name", "type", "is_active"]
-        optional_columns = ["config", "created_at", "updated_at", "channel_id", "channel_code", "display_name", "display_order", "min_amount", "max_amount"]
-        
-        available_columns = base_columns + [col for col in optional_columns if col in columns]
-        
-        if channel_id and "channel_id" in columns:
-            query = f"SELECT {', '.join(available_columns)} FROM payment_methods WHERE is_active = TRUE AND (channel_id = %s OR channel_id = 'all') ORDER BY display_order, id"
-            cursor.execute(query, (channel_id,))
-        else:
-            query = f"SELECT {', '.join(available_columns)} FROM payment_methods WHERE is_active = TRUE ORDER BY display_order, id"
-            cursor.execute(query)
-        
-        methods = []
-        for row in cursor.fetchall():
-            method = {
-                "id": row["id"],
-                "name": row["name"],
-                "type": row["type"],
-                "is_active": row["is_active"],
-            }
-            
-            # Add optional columns
-            for col in optional_columns:
-                if col in row:
-                    if col in ["created_at", "updated_at"] and row[col]:
-                        method[col] = row[col].isoformat()
-                    elif col == "config" and row[col]:
-                        try:
-                            method[col] = json.loads(row[col])
-                        except:
-                            method[col] = row[col]
-                    else:
-                        method[col] = row[col]
+        generation = payment_methods_cache.generation
         
-            methods.append(method)
+        # Query and row mapper are precompiled from the cached table layout
+        schema = await schema_cache.payment_methods()
+        query, args = schema.query(channel_id)
+        rows = await db.fetch_all(query, args)
         
-        cursor.close()
-        conn.close()
+        methods = [schema.map_row(row) for row in rows]
         
-        return {"success": True, "payment_methods": methods}
+        cached = payment_methods_cache.put(cache_key, {"success": True, "payment_methods": methods}, generation)
+        return payment_methods_cache.respond(cached, request.headers.get("if-none-match"))
         
     except Exception as e:
-        print(f"Error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error getting payment methods: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/schema/refresh", include_in_schema=False, dependencies=[Depends(require_admin_token)])
+async def refresh_schema_cache():
+    """Re-read cached table layouts, e.g. after running a migration"""
+    try:
+        await schema_cache.refresh()
+        payment_methods_cache.invalidate()
+        return {"success": True, "schema": schema_cache.stats()}
+    except Exception as e:
+        logger.exception("Error refreshing schema cache: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/payment-methods/cache/invalidate", include_in_schema=False,
+          dependencies=[Depends(require_admin_token)])
+async def invalidate_payment_methods_cache():
+    """Drop cached payment method responses in every worker (bumps the shared cache version)"""
+    await payment_methods_cache.bump_version()
+    return {"success": True, "cache": payment_methods_cache.stats()}
+
+
 # ========== XENDIT ENDPOINTS ==========
 
 if XENDIT_ENABLED:
@@ -122,9 +147,9 @@ if XENDIT_ENABLED:
     @app.post("/api/xendit/payments/qris")
     async def create_qris_payment(request: QRISPaymentRequest):
         try:
-            reference_id = f"qris_{request.channel_id}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+            reference_id = reference_ids.reference_id("qris", request.channel_id)
             
-            result = xendit_service.create_qris_payment(
+            result = await async_xendit_service.create_qris_payment(
                 amount=request.amount,
                 reference_id=reference_id,
                 channel_id=request.channel_id
@@ -134,25 +159,19 @@ if XENDIT_ENABLED:
                 raise HTTPException(status_code=500, detail=result.get("error"))
             
             # Store in DB
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("""
+            await db.execute("""
                 INSERT INTO xendit_payments 
                 (reference_id, payment_id, payment_type, channel_code, amount, status, order_id, 
-                 customer_name, channel_id, metadata, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+                 customer_name, channel_id, metadata, expired_at, account_number, created_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
             """, (
                 reference_id, result["payment_id"], "qris", "QRIS",
                 request.amount, result["status"], request.order_id,
                 request.customer_name, request.channel_id,
-                json.dumps({"qr_string": result["qr_string"]})
+                json.dumps({"qr_string": result["qr_string"], "expired_at": result.get("expired_at")}),
+                parse_expired_at(result.get("expired_at")), None
             ))
             
-            conn.commit()
-            cursor.close()
-            conn.close()
-            
             return {
                 "success": True,
                 "payment_id": result["payment_id"],
@@ -162,18 +181,16 @@ if XENDIT_ENABLED:
                 "amount": request.amount
             }
         except Exception as e:
-            print(f"Error: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error creating QRIS payment: %s", e)
             raise HTTPException(status_code=500, detail=str(e))
     
     
     @app.post("/api/xendit/payments/virtual-account")
     async def create_va_payment(request: VirtualAccountRequest):
         try:
-            reference_id = f"va_{request.bank_code}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+            reference_id = reference_ids.reference_id("va", request.bank_code)
             
-            result = xendit_service.create_virtual_account(
+            result = await async_xendit_service.create_virtual_account(
                 amount=request.amount,
                 reference_id=reference_id,
                 bank_code=request.bank_code,
@@ -183,25 +200,23 @@ if XENDIT_ENABLED:
             if not result.get("success"):
                 raise HTTPException(status_code=500, detail=result.get("error"))
             
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("""
+            await db.execute("""
                 INSERT INTO xendit_payments 
                 (reference_id, payment_id, payment_type, channel_code, amount, status, order_id, 
-                 customer_name, channel_id, metadata, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+                 customer_name, channel_id, metadata, expired_at, account_number, created_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
             """, (
                 reference_id, result["payment_id"], "virtual_account", request.bank_code,
                 request.amount, result["status"], request.order_id,
                 request.customer_name, request.channel_id,
-                json.dumps({"account_number": result["account_number"], "bank_name": result["bank_name"]})
+                json.dumps({
+                    "account_number": result["account_number"],
+                    "bank_name": result["bank_name"],
+                    "expired_at": result.get("expired_at")
+                }),
+                parse_expired_at(result.get("expired_at")), result["account_number"]
             ))
             
-            conn.commit()
-            cursor.close()
-            conn.close()
-            
             return {
                 "success": True,
                 "payment_id": result["payment_id"],
@@ -213,18 +228,16 @@ if XENDIT_ENABLED:
                 "amount": request.amount
             }
         except Exception as e:
-            print(f"Error: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error creating Virtual Account: %s", e)
             raise HTTPException(status_code=500, detail=str(e))
     
     
     @app.post("/api/xendit/payments/ewallet")
     async def create_ewallet_payment(request: EWalletPaymentRequest):
         try:
-            reference_id = f"ewallet_{request.wallet_type}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+            reference_id = reference_ids.reference_id("ewallet", request.wallet_type)
             
-            result = xendit_service.create_ewallet_payment(
+            result = await async_xendit_service.create_ewallet_payment(
                 amount=request.amount,
                 reference_id=reference_id,
                 wallet_type=request.wallet_type,
@@ -235,25 +248,19 @@ if XENDIT_ENABLED:
             if not result.get("success"):
                 raise HTTPException(status_code=500, detail=result.get("error"))
             
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("""
+            await db.execute("""
                 INSERT INTO xendit_payments 
                 (reference_id, payment_id, payment_type, channel_code, amount, status, order_id, 
-                 customer_name, channel_id, metadata, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+                 customer_name, channel_id, metadata, expired_at, account_number, created_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
             """, (
                 reference_id, result["payment_id"], "ewallet", request.wallet_type,
                 request.amount, result["status"], request.order_id,
                 request.customer_name, request.channel_id,
-                json.dumps({"redirect_url": result["redirect_url"]})
+                json.dumps({"redirect_url": result["redirect_url"]}),
+                None, None
             ))
             
-            conn.commit()
-            cursor.close()
-            conn.close()
-            
             return {
                 "success": True,
                 "payment_id": result["payment_id"],
@@ -263,31 +270,19 @@ if XENDIT_ENABLED:
                 "amount": request.amount
             }
         except Exception as e:
-            print(f"Error: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error creating E-wallet payment: %s", e)
             raise HTTPException(status_code=500, detail=str(e))
     
     
     @app.get("/api/xendit/payments/{payment_id}/status")
     async def get_payment_status(payment_id: str):
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor(dictionary=True)
-            
-            cursor.execute("""
-                SELECT * FROM xendit_payments 
-                WHERE payment_id = %s OR reference_id = %s
-            """, (payment_id, payment_id))
-            
-            payment = cursor.fetchone()
-            cursor.close()
-            conn.close()
+            payment = await db.fetch_one(*select_payment_sql(payment_id))
             
             if not payment:
                 raise HTTPException(status_code=404, detail="Payment not found")
             
-            return {
+            return FastJSONResponse({
                 "success": True,
                 "payment": {
                     "id": payment["id"],
@@ -295,15 +290,15 @@ if XENDIT_ENABLED:
                     "reference_id": payment["reference_id"],
                     "payment_type": payment["payment_type"],
                     "channel_code": payment["channel_code"],
-                    "amount": float(payment["amount"]),
+                    "amount": payment["amount"],
                     "status": payment["status"],
                     "order_id": payment["order_id"],
-                    "metadata": json.loads(payment["metadata"]) if payment["metadata"] else {},
-                    "created_at": payment["created_at"].isoformat() if payment["created_at"] else None
+                    "metadata": raw_json(payment["metadata"]) or {},
+                    "created_at": payment["created_at"]
                 }
-            }
+            })
         except Exception as e:
-            print(f"Error: {e}")
+            logger.exception("Error getting payment status: %s", e)
             raise HTTPException(status_code=500, detail=str(e))
     
     
@@ -318,50 +313,44 @@ if XENDIT_ENABLED:
             if x_callback_token != expected_token:
                 raise HTTPException(status_code=401, detail="Unauthorized")
             
-            data = json.loads(payload)
-            print(f"Xendit webhook: {json.dumps(data, indent=2)}")
+            data = normalize_callback(json.loads(payload))
+            # Sampled with the DEBUG level (LOG_SAMPLE_RATES), bodies are high volume
+            logger.debug("Xendit webhook received", extra={"webhook_body": payload})
             
             # Update payment
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
             external_id = data.get("external_id") or data.get("reference_id")
             payment_id = data.get("id")
             status = data.get("status", "PENDING")
             paid_amount = data.get("paid_amount") or data.get("amount", 0)
             
             if external_id:
-                cursor.execute("""
-                    UPDATE xendit_payments 
-                    SET status = %s, paid_amount = %s,
-                        paid_at = CASE WHEN %s IN ('PAID', 'SETTLED', 'COMPLETED') THEN NOW() ELSE paid_at END,
-                        webhook_data = %s, updated_at = NOW()
-                    WHERE reference_id = %s OR payment_id = %s
-                """, (status, paid_amount, status, payload, external_id, payment_id))
-                
-                # Update order if paid
-                if status in ['PAID', 'SETTLED', 'COMPLETED']:
-                    cursor.execute("""
-                        UPDATE orders o
-                        JOIN xendit_payments xp ON o.id = xp.order_id
-                        SET o.payment_verified = TRUE, o.status = 'confirmed'
-                        WHERE xp.reference_id = %s OR xp.payment_id = %s
-                    """, (external_id, payment_id))
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
+                column, value = webhook_match(external_id, payment_id)
+                async with db.transaction() as cursor:
+                    await cursor.execute(f"""
+                        UPDATE xendit_payments 
+                        SET status = %s, paid_amount = %s,
+                            paid_at = CASE WHEN %s IN ('PAID', 'SETTLED', 'COMPLETED') THEN NOW() ELSE paid_at END,
+                            webhook_data = %s, updated_at = NOW()
+                        WHERE {column} = %s
+                    """, (status, paid_amount, status, payload, value))
+                    
+                    # Update order if paid
+                    if status in PAID_STATUSES:
+                        await cursor.execute(f"""
+                            UPDATE orders o
+                            JOIN xendit_payments xp ON o.id = xp.order_id
+                            SET o.payment_verified = TRUE, o.status = 'confirmed'
+                            WHERE xp.{column} = %s
+                        """, (value,))
             
             return {"success": True, "message": "Webhook processed"}
         except Exception as e:
-            print(f"Webhook error: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Webhook error: %s", e)
             return {"success": False, "error": str(e)}
 
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", "8001"))
-    print(f"Starting POS API with Xendit on port {port}")
-    print(f"Xendit enabled: {XENDIT_ENABLED}")
+    logger.info("Starting POS API with Xendit on port %d", port)
+    logger.info("Xendit enabled: %s", XENDIT_ENABLED)
     uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Server-Timing Breakdown
+Per-request spans (DB checkout, each query, each Xendit call, response
+rendering) reported in the Server-Timing header, so cashier devices and
+load tests can attribute latency without a tracing backend
+"""
+
+import os
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional, Tuple
+
+
+SERVER_TIMING_MAX_SPANS = int(os.getenv("SERVER_TIMING_MAX_SPANS", "40"))
+
+
+class RequestTimings:
+    """Spans recorded while serving one request"""
+
+    def __init__(self, debug: bool = False):
+        """
+        Args:
+            debug: Also append the spans to JSON object responses as "_timing"
+        """
+        self.debug = debug
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float, Optional[str]]] = []
+
+    def add(self, name: str, seconds: float, desc: Optional[str] = None):
+        self.spans.append((name, seconds * 1000, desc))
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def header(self, max_spans: int = SERVER_TIMING_MAX_SPANS) -> str:
+        """
+        Server-Timing value; past max_spans the remaining spans are folded
+        into one entry per name
+        """
+        entries = [_entry(name, duration, desc) for name, duration, desc in self.spans[:max_spans]]
+        folded: Dict[str, List[float]] = {}
+        for name, duration, _ in self.spans[max_spans:]:
+            folded.setdefault(name, []).append(duration)
+        for name, durations in folded.items():
+            entries.append(_entry(name, sum(durations), f"{len(durations)} more"))
+        entries.append(_entry("total", self.total_ms()))
+        return ", ".join(entries)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "total_ms": round(self.total_ms(), 3),
+            "spans": [{"name": name, "ms": round(duration, 3), "desc": desc} for name, duration, desc in self.spans],
+        }
+
+
+_UNSAFE_DESC = re.compile(r'[^\x20-\x7e]|["\\]')
+
+
+def _entry(name: str, duration: float, desc: Optional[str] = None) -> str:
+    entry = f"{name};dur={duration:.2f}"
+    if desc:
+        # Header values are sent as latin-1; keep printable ASCII and drop quote breakers
+        entry += ';desc="{}"'.format(_UNSAFE_DESC.sub("?", desc[:100]))
+    return entry
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("server_timing", default=None)
+
+
+def current() -> Optional[RequestTimings]:
+    """Timings of the request being served, or None outside the middleware"""
+    return _current.get()
+
+
+def record(name: str, seconds: float, desc: Optional[str] = None):
+    """Add an already-measured span to the current request, if any"""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds, desc)
+
+
+@contextmanager
+def span(name: str, desc: Optional[str] = None):
+    """Time the enclosed block as a span of the current request"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started, desc)
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware collecting the spans of each HTTP request and adding
+    the Server-Timing header. With debug_header enabled, requests sending
+    that header also get the spans as a "_timing" member of JSON bodies.
+    """
+
+    def __init__(self, app, debug_header: Optional[str] = None, timing_allow_origin: Optional[str] = None):
+        """
+        Args:
+            app: ASGI application
+            debug_header: Request header that turns on the JSON footer (None disables it)
+            timing_allow_origin: Timing-Allow-Origin value, needed for browsers to
+                expose the header to cross-origin pages
+        """
+        self.app = app
+        self.debug_header = debug_header.lower().encode("latin-1") if debug_header else None
+        self.extra_headers = [(b"timing-allow-origin", timing_allow_origin.encode("latin-1"))] \
+            if timing_allow_origin else []
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        debug = self.debug_header is not None and any(
+            name == self.debug_header for name, _ in scope["headers"]
+        )
+        timings = RequestTimings(debug=debug)
+        token = _current.set(timings)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", timings.header().encode("latin-1"))
+                ] + self.extra_headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
@@ -5,30 +5,63 @@ POS System Backend API with Xendit Payment Integration
 Handles QRIS, Virtual Account, E-wallet payments, and webhooks
 """
 
-from fastapi import FastAPI, HTTPException, Request, Depends, Header
+from fastapi import FastAPI, HTTPException, Request, Depends, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import mysql.connector
+from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
+import logging
 import os
 from typing import List, Dict, Any, Optional
 import uvicorn
-from datetime import datetime
 import json
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+from structured_logging import logging_setup, RequestIdMiddleware
+
+logging_setup.start()
+
+from async_db import db
+from response_cache import payment_methods_cache
+from webhook_inbox import webhook_inbox
+from id_generator import reference_ids
+from payment_lookup import select_payment_sql
+from payment_events import payment_notifier, format_sse, FINAL_STATUSES
+from idempotency import idempotency_store
+from circuit_breaker import xendit_breakers
+from metrics import metrics
+from request_metrics import MetricsMiddleware, metrics_response
+from server_timing import ServerTimingMiddleware
+from profiler import profile_controller, ProfilerMiddleware, PROFILE_FORMATS
+from admin_auth import require_admin_token
+from slow_query_log import slow_query_log
+from json_render import FastJSONResponse, raw_json
+from reconciler import payment_reconciler
+from expiry_sweeper import expiry_sweeper, parse_expired_at
+
 # Import payment services
-from xendit_service import xendit_service
+from xendit_service import async_xendit_service
 from payment_models import (
     QRISPaymentRequest,
     VirtualAccountRequest,
     EWalletPaymentRequest,
-    PaymentMethodConfig
+    BatchPaymentRequest,
+    PaymentMethodConfig,
+    CHANNEL_ID_PATTERN
 )
 
-app = FastAPI(title="POS System API with Xendit", version="2.0.0")
+PAYMENT_EVENTS_HEARTBEAT = float(os.getenv("PAYMENT_EVENTS_HEARTBEAT", "15"))
+PAYMENT_EVENTS_MAX_SECONDS = float(os.getenv("PAYMENT_EVENTS_MAX_SECONDS", "900"))
+BATCH_PAYMENT_CONCURRENCY = int(os.getenv("BATCH_PAYMENT_CONCURRENCY", "8"))
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() == "true"
+# Requests sending this header get a "_timing" footer in JSON bodies; empty disables it
+SERVER_TIMING_DEBUG_HEADER = os.getenv("SERVER_TIMING_DEBUG_HEADER", "") or None
+
+logger = logging.getLogger(__name__)
+
+app = FastAPI(title="POS System API with Xendit", version="2.0.0", default_response_class=FastJSONResponse)
 
 # CORS middleware
 app.add_middleware(
@@ -38,249 +71,443 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestIdMiddleware)
+app.add_middleware(MetricsMiddleware)
+if SERVER_TIMING:
+    app.add_middleware(ServerTimingMiddleware, debug_header=SERVER_TIMING_DEBUG_HEADER, timing_allow_origin="*")
+if profile_controller.enabled:
+    app.add_middleware(ProfilerMiddleware, controller=profile_controller, exclude_paths=("/api/admin/profile",))
+
+@app.on_event("startup")
+async def open_db():
+    try:
+        await db.connect()
+    except Exception as e:
+        # The pool is opened lazily on first use if the DB is unreachable now
+        logger.warning("Database pool not opened at startup: %s", e)
+    webhook_inbox.start()
+    payment_notifier.start()
+    idempotency_store.start()
+    payment_reconciler.start()
+    expiry_sweeper.start()
+
+
+@app.on_event("shutdown")
+async def close_db():
+    await expiry_sweeper.stop()
+    await payment_reconciler.stop()
+    await idempotency_store.stop()
+    await payment_notifier.stop()
+    await webhook_inbox.stop()
+    await db.close()
 
-# Database connection
-def get_db_connection():
-    return mysql.connector.connect(
-        host=os.getenv("DB_HOST", "srv1412.hstgr.io"),
-        port=int(os.getenv("DB_PORT", "3306")),
-        user=os.getenv("DB_USER", "u215947863_pos_dev"),
-        password=os.getenv("DB_PASSWORD", "Pos_dev123#"),
-        database=os.getenv("DB_NAME", "u215947863_pos_dev")
-    )
+
+@app.on_event("shutdown")
+async def close_xendit_client():
+    await async_xendit_service.aclose()
 
 
 # ========== HEALTH CHECK ==========
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint (per-worker registry)"""
+    return metrics_response()
+
+
+@app.post("/api/admin/profile", include_in_schema=False)
+async def profile_worker(seconds: float = 10.0, format: Optional[str] = None,
+                         x_profile: Optional[str] = Header(None)):
+    """
+    Sample this worker's event loop for N seconds and write the profile to PROFILE_DIR.
+    Requires a valid X-Profile token (python profiler.py sign).
+    """
+    if not profile_controller.enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not profile_controller.verify(x_profile):
+        raise HTTPException(status_code=403, detail="Invalid or expired X-Profile token")
+    if format is not None and format not in PROFILE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(PROFILE_FORMATS)}")
+
+    result = await profile_controller.profile_for(seconds, format)
+    if result is None:
+        raise HTTPException(status_code=409, detail="A profile is already running in this worker")
+    return {"success": True, **result}
+
+
+@app.get("/api/admin/slow-queries", include_in_schema=False, dependencies=[Depends(require_admin_token)])
+async def list_slow_queries(limit: int = 20, order_by: str = "total_ms"):
+    """
+    Statement shapes slower than SLOW_QUERY_MS in this worker, worst first,
+    with parameter shapes and the EXPLAIN captured when each first went slow
+    """
+    return FastJSONResponse({
+        "success": True,
+        **slow_query_log.stats(),
+        "queries": slow_query_log.top(limit, order_by)
+    })
+
+
+@app.delete("/api/admin/slow-queries", include_in_schema=False, dependencies=[Depends(require_admin_token)])
+async def reset_slow_queries():
+    slow_query_log.reset()
+    return {"success": True}
+
+
 @app.get("/api/health")
 async def health_check():
-    return {
+    return FastJSONResponse({
         "status": "OK",
         "message": "POS System API with Xendit is running",
         "version": "2.0.0",
-        "xendit_enabled": bool(os.getenv("XENDIT_API_KEY"))
-    }
+        "xendit_enabled": bool(os.getenv("XENDIT_API_KEY")),
+        "db_pool": db.stats(),
+        "webhook_inbox": webhook_inbox.stats(),
+        "payment_events": payment_notifier.stats(),
+        "idempotency": idempotency_store.stats(),
+        "circuit_breakers": xendit_breakers.stats(),
+        "xendit_calls": metrics.snapshot("xendit_"),
+        "reconciliation": payment_reconciler.stats(),
+        "expiry_sweeper": expiry_sweeper.stats(),
+        "logging": logging_setup.stats()
+    })
 
 
 # ========== XENDIT PAYMENT ENDPOINTS ==========
 
+PAYMENT_INSERT_SQL = """
+    INSERT INTO xendit_payments
+    (reference_id, payment_id, payment_type, channel_code, amount, status, order_id,
+     customer_name, channel_id, metadata, expired_at, account_number, created_at)
+    VALUES {values}
+"""
+PAYMENT_INSERT_ROW = "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())"
+
+
+async def insert_payments(rows: List[tuple]):
+    """Store xendit_payments rows in a single multi-row INSERT"""
+    await db.execute(
+        PAYMENT_INSERT_SQL.format(values=", ".join([PAYMENT_INSERT_ROW] * len(rows))),
+        [value for row in rows for value in row]
+    )
+
+
+def payment_error(result: Dict[str, Any], default: str) -> HTTPException:
+    """503 with Retry-After while the channel's circuit is open, 500 otherwise"""
+    if result.get("circuit_open"):
+        return HTTPException(
+            status_code=503,
+            detail=result.get("error", default),
+            headers={"Retry-After": str(result.get("retry_after", 0))}
+        )
+    return HTTPException(status_code=500, detail=result.get("error", default))
+
+
+async def dispatch_qris_payment(request: QRISPaymentRequest, reference_id: Optional[str] = None):
+    """
+    Create a QRIS payment at Xendit
+
+    Returns:
+        (xendit_payments row, response dict)
+    """
+    reference_id = reference_id or reference_ids.reference_id("qris", request.channel_id)
+
+    result = await async_xendit_service.create_qris_payment(
+        amount=request.amount,
+        reference_id=reference_id,
+        channel_id=request.channel_id
+    )
+
+    if not result.get("success"):
+        raise payment_error(result, "Failed to create QRIS payment")
+
+    row = (
+        reference_id,
+        result["payment_id"],
+        "qris",
+        "QRIS",
+        request.amount,
+        result["status"],
+        request.order_id,
+        request.customer_name,
+        request.channel_id,
+        json.dumps({"qr_string": result["qr_string"], "expired_at": result.get("expired_at")}),
+        parse_expired_at(result.get("expired_at")),
+        None
+    )
+    return row, {
+        "success": True,
+        "payment_id": result["payment_id"],
+        "reference_id": reference_id,
+        "qr_string": result["qr_string"],
+        "status": result["status"],
+        "amount": request.amount,
+        "expired_at": result.get("expired_at")
+    }
+
+
+async def dispatch_virtual_account_payment(request: VirtualAccountRequest, reference_id: Optional[str] = None):
+    """
+    Create a Virtual Account at Xendit
+
+    Returns:
+        (xendit_payments row, response dict)
+    """
+    reference_id = reference_id or reference_ids.reference_id("va", request.bank_code)
+
+    result = await async_xendit_service.create_virtual_account(
+        amount=request.amount,
+        reference_id=reference_id,
+        bank_code=request.bank_code,
+        customer_name=request.customer_name or "Customer"
+    )
+
+    if not result.get("success"):
+        raise payment_error(result, "Failed to create Virtual Account")
+
+    row = (
+        reference_id,
+        result["payment_id"],
+        "virtual_account",
+        request.bank_code,
+        request.amount,
+        result["status"],
+        request.order_id,
+        request.customer_name,
+        request.channel_id,
+        json.dumps({
+            "account_number": result["account_number"],
+            "bank_name": result["bank_name"],
+            "expired_at": result.get("expired_at")
+        }),
+        parse_expired_at(result.get("expired_at")),
+        result["account_number"]
+    )
+    return row, {
+        "success": True,
+        "payment_id": result["payment_id"],
+        "reference_id": reference_id,
+        "account_number": result["account_number"],
+        "bank_code": request.bank_code,
+        "bank_name": result["bank_name"],
+        "customer_name": result["customer_name"],
+        "status": result["status"],
+        "amount": request.amount,
+        "expired_at": result.get("expired_at")
+    }
+
+
+async def dispatch_ewallet_payment(request: EWalletPaymentRequest, reference_id: Optional[str] = None):
+    """
+    Create an E-wallet charge at Xendit
+
+    Returns:
+        (xendit_payments row, response dict)
+    """
+    reference_id = reference_id or reference_ids.reference_id("ewallet", request.wallet_type)
+
+    result = await async_xendit_service.create_ewallet_payment(
+        amount=request.amount,
+        reference_id=reference_id,
+        wallet_type=request.wallet_type,
+        success_url=request.success_url,
+        failure_url=request.failure_url
+    )
+
+    if not result.get("success"):
+        raise payment_error(result, "Failed to create E-wallet payment")
+
+    row = (
+        reference_id,
+        result["payment_id"],
+        "ewallet",
+        request.wallet_type,
+        request.amount,
+        result["status"],
+        request.order_id,
+        request.customer_name,
+        request.channel_id,
+        json.dumps({
+            "redirect_url": result["redirect_url"],
+            "wallet_type": request.wallet_type
+        }),
+        None,
+        None
+    )
+    return row, {
+        "success": True,
+        "payment_id": result["payment_id"],
+        "reference_id": reference_id,
+        "redirect_url": result["redirect_url"],
+        "status": result["status"],
+        "amount": request.amount,
+        "wallet_type": request.wallet_type
+    }
+
+
+# payment_type -> (dispatcher, reference_id prefix, reference_id qualifier)
+PAYMENT_DISPATCHERS = {
+    "qris": (dispatch_qris_payment, "qris", lambda request: request.channel_id),
+    "virtual_account": (dispatch_virtual_account_payment, "va", lambda request: request.bank_code),
+    "ewallet": (dispatch_ewallet_payment, "ewallet", lambda request: request.wallet_type),
+}
+
+
 @app.post("/api/xendit/payments/qris")
-async def create_qris_payment(request: QRISPaymentRequest):
+async def create_qris_payment(request: QRISPaymentRequest, idempotency_key: Optional[str] = Header(None)):
     """
     Create a QRIS payment
+    A retry sent with the same Idempotency-Key header replays the first response
     """
+    return await idempotency_store.run(
+        idempotency_key, "qris", request, lambda: _create_qris_payment(request)
+    )
+
+
+async def _create_qris_payment(request: QRISPaymentRequest):
     try:
-        reference_id = f"qris_{request.channel_id}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
-        
-        result = xendit_service.create_qris_payment(
-            amount=request.amount,
-            reference_id=reference_id,
-            channel_id=request.channel_id
-        )
-        
-        if not result.get("success"):
-            raise HTTPException(status_code=500, detail=result.get("error", "Failed to create QRIS payment"))
-        
+        row, response = await dispatch_qris_payment(request)
+
         # Store payment in database
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO xendit_payments 
-            (reference_id, payment_id, payment_type, channel_code, amount, status, order_id, 
-             customer_name, channel_id, metadata, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
-        """, (
-            reference_id,
-            result["payment_id"],
-            "qris",
-            "QRIS",
-            request.amount,
-            result["status"],
-            request.order_id,
-            request.customer_name,
-            request.channel_id,
-            json.dumps({"qr_string": result["qr_string"], "expired_at": result.get("expired_at")})
-        ))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        return {
-            "success": True,
-            "payment_id": result["payment_id"],
-            "reference_id": reference_id,
-            "qr_string": result["qr_string"],
-            "status": result["status"],
-            "amount": request.amount,
-            "expired_at": result.get("expired_at")
-        }
-        
+        await insert_payments([row])
+
+        return response
+
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error creating QRIS payment: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error creating QRIS payment: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to create QRIS payment: {str(e)}")
 
 
 @app.post("/api/xendit/payments/virtual-account")
-async def create_virtual_account_payment(request: VirtualAccountRequest):
+async def create_virtual_account_payment(request: VirtualAccountRequest, idempotency_key: Optional[str] = Header(None)):
     """
     Create a Virtual Account payment
+    A retry sent with the same Idempotency-Key header replays the first response
     """
+    return await idempotency_store.run(
+        idempotency_key, "virtual_account", request, lambda: _create_virtual_account_payment(request)
+    )
+
+
+async def _create_virtual_account_payment(request: VirtualAccountRequest):
     try:
-        reference_id = f"va_{request.bank_code}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
-        
-        result = xendit_service.create_virtual_account(
-            amount=request.amount,
-            reference_id=reference_id,
-            bank_code=request.bank_code,
-            customer_name=request.customer_name or "Customer"
-        )
-        
-        if not result.get("success"):
-            raise HTTPException(status_code=500, detail=result.get("error", "Failed to create Virtual Account"))
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO xendit_payments 
-            (reference_id, payment_id, payment_type, channel_code, amount, status, order_id, 
-             customer_name, channel_id, metadata, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
-        """, (
-            reference_id,
-            result["payment_id"],
-            "virtual_account",
-            request.bank_code,
-            request.amount,
-            result["status"],
-            request.order_id,
-            request.customer_name,
-            request.channel_id,
-            json.dumps({
-                "account_number": result["account_number"],
-                "bank_name": result["bank_name"],
-                "expired_at": result.get("expired_at")
-            })
-        ))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        return {
-            "success": True,
-            "payment_id": result["payment_id"],
-            "reference_id": reference_id,
-            "account_number": result["account_number"],
-            "bank_code": request.bank_code,
-            "bank_name": result["bank_name"],
-            "customer_name": result["customer_name"],
-            "status": result["status"],
-            "amount": request.amount,
-            "expired_at": result.get("expired_at")
-        }
-        
+        row, response = await dispatch_virtual_account_payment(request)
+
+        await insert_payments([row])
+
+        return response
+
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error creating Virtual Account: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error creating Virtual Account: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to create Virtual Account: {str(e)}")
 
 
 @app.post("/api/xendit/payments/ewallet")
-async def create_ewallet_payment(request: EWalletPaymentRequest):
+async def create_ewallet_payment(request: EWalletPaymentRequest, idempotency_key: Optional[str] = Header(None)):
     """
     Create an E-wallet payment
+    A retry sent with the same Idempotency-Key header replays the first response
     """
+    return await idempotency_store.run(
+        idempotency_key, "ewallet", request, lambda: _create_ewallet_payment(request)
+    )
+
+
+async def _create_ewallet_payment(request: EWalletPaymentRequest):
     try:
-        reference_id = f"ewallet_{request.wallet_type}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
-        
-        result = xendit_service.create_ewallet_payment(
-            amount=request.amount,
-            reference_id=reference_id,
-            wallet_type=request.wallet_type,
-            success_url=request.success_url,
-            failure_url=request.failure_url
-        )
-        
-        if not result.get("success"):
-            raise HTTPException(status_code=500, detail=result.get("error", "Failed to create E-wallet payment"))
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO xendit_payments 
-            (reference_id, payment_id, payment_type, channel_code, amount, status, order_id, 
-             customer_name, channel_id, metadata, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
-        """, (
-            reference_id,
-            result["payment_id"],
-            "ewallet",
-            request.wallet_type,
-            request.amount,
-            result["status"],
-            request.order_id,
-            request.customer_name,
-            request.channel_id,
-            json.dumps({
-                "redirect_url": result["redirect_url"],
-                "wallet_type": request.wallet_type
-            })
-        ))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        return {
-            "success": True,
-            "payment_id": result["payment_id"],
-            "reference_id": reference_id,
-            "redirect_url": result["redirect_url"],
-            "status": result["status"],
-            "amount": request.amount,
-            "wallet_type": request.wallet_type
-        }
-        
+        row, response = await dispatch_ewallet_payment(request)
+
+        await insert_payments([row])
+
+        return response
+
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error creating E-wallet payment: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error creating E-wallet payment: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to create E-wallet payment: {str(e)}")
 
 
+@app.post("/api/xendit/payments/batch")
+async def create_batch_payments(request: BatchPaymentRequest, idempotency_key: Optional[str] = Header(None)):
+    """
+    Create several payments at once (split bills, group orders)
+    Xendit calls run concurrently, at most BATCH_PAYMENT_CONCURRENCY at a time,
+    and the created payments are stored with one INSERT. Each item reports
+    its own result, so one failed payment does not fail the batch.
+    """
+    return await idempotency_store.run(
+        idempotency_key, "batch", request, lambda: _create_batch_payments(request)
+    )
+
+
+async def _create_batch_payments(request: BatchPaymentRequest):
+    semaphore = asyncio.Semaphore(BATCH_PAYMENT_CONCURRENCY)
+    ids = reference_ids.next_ids(len(request.payments))
+
+    async def dispatch(item, value):
+        dispatcher, prefix, qualifier = PAYMENT_DISPATCHERS[item.payment_type]
+        async with semaphore:
+            try:
+                return await dispatcher(item, reference_ids.reference_id(prefix, qualifier(item), value))
+            except HTTPException as e:
+                return {"success": False, "error": e.detail}
+            except Exception as e:
+                logger.exception("Error creating %s payment in batch: %s", item.payment_type, e)
+                return {"success": False, "error": str(e)}
+
+    outcomes = await asyncio.gather(*[dispatch(item, value) for item, value in zip(request.payments, ids)])
+    results = [outcome if isinstance(outcome, dict) else outcome[1] for outcome in outcomes]
+    created = [(index, outcome) for index, outcome in enumerate(outcomes) if isinstance(outcome, tuple)]
+
+    if created:
+        try:
+            await insert_payments([row for _, (row, _) in created])
+        except Exception as e:
+            # Fall back to one INSERT per row so a single bad row does not drop the rest
+            logger.warning("Batch insert of %d payments failed, storing individually: %s", len(created), e)
+            for index, (row, response) in created:
+                try:
+                    await insert_payments([row])
+                except Exception as row_error:
+                    results[index] = {
+                        "success": False,
+                        "error": f"Payment created but not stored: {row_error}",
+                        "payment_id": response["payment_id"],
+                        "reference_id": response["reference_id"]
+                    }
+
+    for index, result in enumerate(results):
+        result["index"] = index
+        result["payment_type"] = request.payments[index].payment_type
+
+    succeeded = sum(1 for result in results if result["success"])
+    return {
+        "success": succeeded == len(results),
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results
+    }
+
+
 @app.get("/api/xendit/payments/{payment_id}/status")
 async def get_payment_status(payment_id: str):
     """
     Get payment status from database
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        cursor.execute("""
-            SELECT * FROM xendit_payments WHERE payment_id = %s OR reference_id = %s
-        """, (payment_id, payment_id))
-        
-        payment = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        payment = await db.fetch_one(*select_payment_sql(payment_id))
         
         if not payment:
             raise HTTPException(status_code=404, detail="Payment not found")
         
-        return {
+        # Rendered by orjson directly: metadata (a JSON column) is spliced in without
+        # decoding, datetimes and the DECIMAL amount are encoded natively
+        return FastJSONResponse({
             "success": True,
             "payment": {
                 "id": payment["id"],
@@ -288,130 +515,158 @@ async def get_payment_status(payment_id: str):
                 "reference_id": payment["reference_id"],
                 "payment_type": payment["payment_type"],
                 "channel_code": payment["channel_code"],
-                "amount": float(payment["amount"]),
+                "amount": payment["amount"],
                 "status": payment["status"],
                 "order_id": payment["order_id"],
                 "customer_name": payment["customer_name"],
-                "metadata": json.loads(payment["metadata"]) if payment["metadata"] else {},
-                "created_at": payment["created_at"].isoformat() if payment["created_at"] else None,
-                "paid_at": payment["paid_at"].isoformat() if payment["paid_at"] else None
+                "metadata": raw_json(payment["metadata"]) or {},
+                "created_at": payment["created_at"],
+                "paid_at": payment["paid_at"]
             }
-        }
+        })
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error getting payment status: {e}")
+        logger.exception("Error getting payment status: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to get payment status: {str(e)}")
 
 
+@app.get("/api/xendit/payments/{payment_id}/events")
+async def stream_payment_status(payment_id: str, request: Request):
+    """
+    Server-Sent Events stream of a payment's status.
+    Sends the current status, then pushes each change recorded by the webhook
+    consumer; the stream ends once the payment reaches a final status.
+    """
+    payment = await db.fetch_one(*select_payment_sql(
+        payment_id, columns="reference_id, payment_id, status, paid_at"
+    ))
+    if not payment:
+        raise HTTPException(status_code=404, detail="Payment not found")
+    
+    reference_id = payment["reference_id"]
+    xendit_id = payment["payment_id"]
+    
+    async def events():
+        queue = payment_notifier.subscribe(reference_id, xendit_id, payment["status"])
+        try:
+            yield format_sse(payment)
+            status = payment["status"]
+            deadline = asyncio.get_running_loop().time() + PAYMENT_EVENTS_MAX_SECONDS
+            
+            while status not in FINAL_STATUSES:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                try:
+                    event = await asyncio.wait_for(queue.get(), min(PAYMENT_EVENTS_HEARTBEAT, remaining))
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                status = event.get("status")
+                yield format_sse(event)
+        finally:
+            payment_notifier.unsubscribe(reference_id, xendit_id, queue)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+
 @app.post("/api/xendit/webhook")
 async def handle_xendit_webhook(request: Request, x_callback_token: Optional[str] = Header(None)):
     """
-    Handle webhooks from Xendit
+    Handle webhooks from Xendit: verify, persist to the inbox and ack.
+    Background consumers apply the callback to xendit_payments and orders.
     """
+    # Verify webhook token
+    expected_token = os.getenv("XENDIT_WEBHOOK_TOKEN", "")
+    if x_callback_token != expected_token:
+        logger.warning("Webhook token mismatch")
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
     try:
         body = await request.body()
         payload = body.decode('utf-8')
+        # Sampled with the DEBUG level (LOG_SAMPLE_RATES), bodies are high volume
+        logger.debug("Xendit webhook received", extra={"webhook_body": payload})
+        inbox_id = await webhook_inbox.ingest(payload)
+        if inbox_id is None:
+            return {"success": True, "message": "Duplicate webhook ignored"}
+        return {"success": True, "message": "Webhook queued", "inbox_id": inbox_id}
         
-        # Verify webhook token
-        expected_token = os.getenv("XENDIT_WEBHOOK_TOKEN", "")
-        if x_callback_token != expected_token:
-            print(f"Webhook token mismatch")
-            raise HTTPException(status_code=401, detail="Unauthorized")
-        
-        data = json.loads(payload)
-        print(f"Webhook received: {json.dumps(data, indent=2)}")
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        external_id = data.get("external_id") or data.get("reference_id")
-        payment_id = data.get("id")
-        
-        if external_id:
-            status = data.get("status", "PENDING")
-            paid_amount = data.get("paid_amount") or data.get("amount", 0)
-            
-            cursor.execute("""
-                UPDATE xendit_payments 
-                SET status = %s, 
-                    paid_amount = %s,
-                    paid_at = CASE WHEN %s IN ('PAID', 'SETTLED', 'COMPLETED') THEN NOW() ELSE paid_at END,
-                    webhook_data = %s,
-                    updated_at = NOW()
-                WHERE reference_id = %s OR payment_id = %s
-            """, (status, paid_amount, status, payload, external_id, payment_id))
-            
-            if status in ['PAID', 'SETTLED', 'COMPLETED']:
-                cursor.execute("""
-                    UPDATE orders o
-                    JOIN xendit_payments xp ON o.id = xp.order_id
-                    SET o.payment_verified = TRUE,
-                        o.status = 'confirmed'
-                    WHERE xp.reference_id = %s OR xp.payment_id = %s
-                """, (external_id, payment_id))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        return {"success": True, "message": "Webhook processed"}
-        
-    except HTTPException:
-        raise
     except Exception as e:
-        print(f"Error processing webhook: {e}")
-        import traceback
-        traceback.print_exc()
-        return {"success": False, "error": str(e)}
+        # Not persisted: fail so Xendit retries the delivery
+        logger.exception("Error queueing webhook: %s", e)
+        raise HTTPException(status_code=503, detail="Webhook not persisted, retry later")
 
 
 # ========== PAYMENT METHODS ==========
 
 @app.get("/api/payment-methods")
-async def get_payment_methods(channel_id: Optional[str] = None):
+async def get_payment_methods(request: Request,
+                              channel_id: Optional[str] = Query(None, pattern=CHANNEL_ID_PATTERN)):
     """
-    Get available payment methods
+    Get available payment methods (served from the response cache when fresh)
+    Each method carries its channel's circuit state; terminals should hide
+    methods that are not available instead of waiting on them.
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
+        unavailable = xendit_breakers.unavailable_channels()
+        cache_key = f"{channel_id or ''}|{json.dumps(unavailable, sort_keys=True)}"
+        await payment_methods_cache.check_version()
+        cached = payment_methods_cache.get(cache_key)
+        if cached is not None:
+            return payment_methods_cache.respond(cached, request.headers.get("if-none-match"))
+        
+        generation = payment_methods_cache.generation
         if channel_id:
-            cursor.execute("""
+            methods = await db.fetch_all("""
                 SELECT * FROM payment_methods 
                 WHERE is_active = TRUE 
                 AND (channel_id = %s OR channel_id = 'all')
                 ORDER BY display_order, id
             """, (channel_id,))
         else:
-            cursor.execute("""
+            methods = await db.fetch_all("""
                 SELECT * FROM payment_methods 
                 WHERE is_active = TRUE
                 ORDER BY display_order, id
             """)
         
-        methods = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        
         for method in methods:
             if method.get("config"):
-                try:
-                    method["config"] = json.loads(method["config"])
-                except:
-                    method["config"] = {}
-            if method.get("created_at"):
-                method["created_at"] = method["created_at"].isoformat()
+                method["config"] = raw_json(method["config"])
+            method["circuit_state"] = unavailable.get((method.get("channel_code") or "").upper(), "closed")
+            method["available"] = method["circuit_state"] != "open"
         
-        return {"success": True, "payment_methods": methods}
+        cached = payment_methods_cache.put(cache_key, {
+            "success": True,
+            "payment_methods": methods,
+            "unavailable_channels": unavailable
+        }, generation)
+        return payment_methods_cache.respond(cached, request.headers.get("if-none-match"))
         
     except Exception as e:
-        print(f"Error getting payment methods: {e}")
+        logger.exception("Error getting payment methods: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/payment-methods/cache/invalidate", include_in_schema=False,
+          dependencies=[Depends(require_admin_token)])
+async def invalidate_payment_methods_cache():
+    """
+    Drop cached payment method responses in every worker (bumps the shared
+    cache version, as the Go payment method handlers do on each write)
+    """
+    await payment_methods_cache.bump_version()
+    return {"success": True, "cache": payment_methods_cache.stats()}
+
+
 @app.get("/api/xendit/available-banks")
 async def get_available_banks():
     """
@@ -448,6 +703,6 @@ async def get_available_ewallets():
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", "8001"))
-    print(f"Starting POS System API with Xendit on port {port}")
-    print(f"Xendit enabled: {bool(os.getenv('XENDIT_API_KEY'))}")
+    logger.info("Starting POS System API with Xendit on port %d", port)
+    logger.info("Xendit enabled: %s", bool(os.getenv('XENDIT_API_KEY')))
     uvicorn.run(app, host="0.0.0.0", port=port)
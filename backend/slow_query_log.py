@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Slow-Query Log
+Every statement run through AsyncDatabase is timed; those above the
+threshold are logged with normalized SQL and the shape of their bound
+parameters, aggregated per statement shape, and EXPLAINed the first time
+each shape goes slow
+"""
+
+import asyncio
+import logging
+import os
+import re
+import time
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Sequence, Set
+
+from async_db import AsyncDatabase, db, statement_name
+
+
+logger = logging.getLogger(__name__)
+
+EXPLAINABLE = ("select", "insert", "update", "delete", "replace")
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ROW = r"\((?:[^()]|\([^()]*\))*\)"
+_VALUES_ROWS = re.compile(rf"\b(VALUES\s*{_ROW})(?:\s*,\s*{_ROW})+", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql: str) -> str:
+    """
+    One line per statement shape: literals and placeholders become ?,
+    IN lists and multi-row VALUES collapse, so 3 and 30 ids look the same
+    """
+    text = _WHITESPACE.sub(" ", sql).strip()
+    text = _STRING.sub("?", text).replace("%s", "?")
+    text = _NUMBER.sub("?", text)
+    text = _PLACEHOLDER_LIST.sub("(...)", text)
+    return _VALUES_ROWS.sub(r"\1", text)
+
+
+def param_shape(args: Any, many: bool = False) -> str:
+    """Types of the bound parameters, e.g. "(str, int, Decimal)" or "many[50] x (str, int)" """
+    if args is None:
+        return "()"
+    if many:
+        rows = list(args)
+        return f"many[{len(rows)}] x {param_shape(rows[0]) if rows else '()'}"
+    if isinstance(args, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in args.items()) + "}"
+    names = [type(value).__name__ for value in args]
+    if len(names) > 8:
+        return f"({', '.join(names[:8])}, ... {len(names)} total)"
+    return f"({', '.join(names)})"
+
+
+class SlowQueryLog:
+    """Per-shape statistics of statements slower than the threshold"""
+
+    def __init__(self, database: AsyncDatabase, threshold_ms: float = 200.0, explain: bool = True,
+                 max_shapes: int = 200):
+        """
+        Args:
+            database: Async database whose statements are observed and EXPLAINed
+            threshold_ms: Statements at or above this duration are logged
+            explain: Run EXPLAIN the first time a statement shape goes slow
+            max_shapes: Distinct slow shapes kept; the one with the least total time is evicted
+        """
+        self.db = database
+        self.threshold = threshold_ms / 1000
+        self.explain = explain
+        self.max_shapes = max_shapes
+        self.shapes: Dict[str, Dict[str, Any]] = {}
+        self.statements = 0
+        self.slow = 0
+        self._explain_tasks: Set[asyncio.Task] = set()
+
+    @classmethod
+    def from_env(cls, database: AsyncDatabase) -> "SlowQueryLog":
+        return cls(
+            database,
+            threshold_ms=float(os.getenv("SLOW_QUERY_MS", "200")),
+            explain=os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() == "true",
+            max_shapes=int(os.getenv("SLOW_QUERY_MAX_SHAPES", "200")),
+        )
+
+    def observe(self, sql: str, args: Optional[Sequence], seconds: float, many: bool = False):
+        """AsyncDatabase observer: a counter bump unless the statement was slow"""
+        self.statements += 1
+        if seconds < self.threshold:
+            return
+        try:
+            self._record_slow(sql, args, seconds, many)
+        except Exception as e:
+            logger.warning("Slow query log failed: %s", e)
+
+    def _record_slow(self, sql: str, args: Optional[Sequence], seconds: float, many: bool):
+        self.slow += 1
+        normalized = normalize_sql(sql)
+        shape = param_shape(args, many)
+        duration_ms = seconds * 1000
+        logger.warning("Slow query (%.1f ms): %s", duration_ms, normalized, extra={
+            "statement": statement_name(sql), "duration_ms": round(duration_ms, 3), "params": shape,
+        })
+
+        entry = self.shapes.get(normalized)
+        if entry is None:
+            if len(self.shapes) >= self.max_shapes:
+                del self.shapes[min(self.shapes, key=lambda key: self.shapes[key]["total_ms"])]
+            entry = self.shapes[normalized] = {
+                "sql": normalized, "statement": statement_name(sql), "count": 0, "total_ms": 0.0,
+                "max_ms": 0.0, "params": shape, "first_seen": time.time(), "last_seen": 0.0, "explain": None,
+            }
+            verb = entry["statement"].split(" ", 1)[0]
+            if self.explain and not many and verb in EXPLAINABLE:
+                task = asyncio.get_running_loop().create_task(self._explain(entry, sql, args))
+                self._explain_tasks.add(task)
+                task.add_done_callback(self._explain_tasks.discard)
+
+        entry["count"] += 1
+        entry["total_ms"] += duration_ms
+        entry["max_ms"] = max(entry["max_ms"], duration_ms)
+        entry["last_seen"] = time.time()
+        entry["params"] = shape
+
+    async def _explain(self, entry: Dict[str, Any], sql: str, args: Optional[Sequence]):
+        # The EXPLAIN goes through the same observer; its verb is not
+        # explainable, so a slow plan lookup cannot recurse
+        try:
+            entry["explain"] = await self.db.fetch_all(f"EXPLAIN {sql}", args)
+        except Exception as e:
+            entry["explain"] = [{"error": str(e)}]
+
+    def top(self, limit: int = 20, order_by: str = "total_ms") -> List[Dict[str, Any]]:
+        """Worst statement shapes first (order_by: total_ms, max_ms or count)"""
+        if order_by not in ("total_ms", "max_ms", "count"):
+            order_by = "total_ms"
+        entries = sorted(self.shapes.values(), key=lambda entry: entry[order_by], reverse=True)[:limit]
+        return [
+            {**entry, "total_ms": round(entry["total_ms"], 3), "max_ms": round(entry["max_ms"], 3),
+             "avg_ms": round(entry["total_ms"] / entry["count"], 3)}
+            for entry in entries
+        ]
+
+    def reset(self):
+        self.shapes.clear()
+        self.statements = 0
+        self.slow = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "threshold_ms": self.threshold * 1000,
+            "statements": self.statements,
+            "slow": self.slow,
+            "shapes": len(self.shapes),
+        }
+
+
+# Create singleton instance
+slow_query_log = SlowQueryLog.from_env(db)
+db.add_observer(slow_query_log.observe)
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Structured Logging
+Records are queued by the event loop and written as JSON lines by a
+background thread, so a slow stdout never stalls a payment request.
+High-volume levels can be sampled, and every record made while serving a
+request carries that request's id.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import traceback
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+from json_render import dumps
+
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+
+def parse_sample_rates(spec: str) -> Dict[int, float]:
+    """Parse "DEBUG=0.1,INFO=1" into {logging.DEBUG: 0.1, logging.INFO: 1.0}"""
+    rates = {}
+    for part in spec.split(","):
+        if "=" not in part:
+            continue
+        level, rate = part.split("=", 1)
+        level_no = logging.getLevelName(level.strip().upper())
+        if isinstance(level_no, int):
+            rates[level_no] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the id of the request being served, if any"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of the records at each configured level"""
+
+    def __init__(self, rates: Dict[int, float]):
+        """
+        Args:
+            rates: Fraction of records kept per level; unlisted levels are always kept
+        """
+        super().__init__()
+        self.rates = rates
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.levelno)
+        if rate is None or rate >= 1.0 or random.random() < rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, request_id and extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = "".join(traceback.format_exception(*record.exc_info)).rstrip()
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        try:
+            return dumps(entry).decode("utf-8")
+        except TypeError:
+            return dumps({key: value if isinstance(value, (str, int, float, bool, type(None))) else repr(value)
+                          for key, value in entry.items()}).decode("utf-8")
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Enqueue without waiting: when the writer thread falls behind and the
+    queue is full the record is dropped and counted instead of blocking
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only the message is resolved here; tracebacks and JSON are
+        # formatted on the writer thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware binding X-Request-ID (or a generated id) to the request's
+    log records and echoing it in the response
+    """
+
+    def __init__(self, app, header: str = "x-request-id"):
+        self.app = app
+        self.header = header.lower().encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == self.header:
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(self.header, request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
+
+
+class LoggingSetup:
+    """Root logger wiring: caller-side filters and queue, writer thread with the formatter"""
+
+    def __init__(self, level: str = "INFO", json_lines: bool = True, queue_size: int = 10000,
+                 sample_rates: Optional[Dict[int, float]] = None, stream=None):
+        """
+        Args:
+            level: Root log level name
+            json_lines: Write JSON lines; plain text when False (local development)
+            queue_size: Records buffered for the writer thread before new ones are dropped
+            sample_rates: Fraction of records kept per level
+            stream: Output stream (stdout by default)
+        """
+        self.level = level.upper()
+        self.json_lines = json_lines
+        self.queue_size = queue_size
+        self.sample_rates = sample_rates or {}
+        self.stream = stream or sys.stdout
+        self.handler: Optional[NonBlockingQueueHandler] = None
+        self.sampler: Optional[SamplingFilter] = None
+        self.listener: Optional[QueueListener] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "LoggingSetup":
+        return cls(
+            level=os.getenv("LOG_LEVEL", "INFO"),
+            json_lines=os.getenv("LOG_FORMAT", "json").lower() == "json",
+            queue_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+            sample_rates=parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", "DEBUG=0.1")),
+        )
+
+    def start(self):
+        """Install on the root logger; safe to call more than once"""
+        with self._lock:
+            if self.listener is not None:
+                return
+
+            writer = logging.StreamHandler(self.stream)
+            if self.json_lines:
+                writer.setFormatter(JSONFormatter())
+            else:
+                writer.setFormatter(logging.Formatter(
+                    "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+                ))
+
+            self.sampler = SamplingFilter(self.sample_rates)
+            self.handler = NonBlockingQueueHandler(queue.Queue(self.queue_size))
+            self.handler.addFilter(RequestIdFilter())
+            self.handler.addFilter(self.sampler)
+
+            root = logging.getLogger()
+            for handler in list(root.handlers):
+                root.removeHandler(handler)
+            root.addHandler(self.handler)
+            root.setLevel(self.level)
+
+            self.listener = QueueListener(self.handler.queue, writer, respect_handler_level=False)
+            self.listener.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        """Flush queued records and stop the writer thread"""
+        with self._lock:
+            if self.listener is not None:
+                self.listener.stop()
+                self.listener = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "level": self.level,
+            "queued": self.handler.queue.qsize() if self.handler else 0,
+            "dropped": self.handler.dropped if self.handler else 0,
+            "sampled_out": self.sampler.sampled_out if self.sampler else 0,
+        }
+
+
+# Create singleton instance
+logging_setup = LoggingSetup.from_env()
@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""
+Xendit Webhook Inbox
+The webhook endpoint appends raw callbacks to a durable table and acks
+immediately; background consumers apply them to xendit_payments and
+orders in batches. Callbacks that arrive before their payment row is
+committed are parked as 'unmatched' and queued again later.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+from async_db import AsyncDatabase, db
+from payment_lookup import webhook_match
+from payment_events import payment_notifier
+from metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+PAID_STATUSES = ("PAID", "SETTLED", "COMPLETED")
+
+# E-wallet charge status -> status stored in xendit_payments; anything else stays PENDING
+EWALLET_STATUSES = {"SUCCEEDED": "PAID", "FAILED": "FAILED", "VOIDED": "VOIDED"}
+
+# apply_webhook_event result for a callback whose payment row does not exist (yet)
+UNMATCHED = object()
+
+WEBHOOK_LAG_SECONDS = metrics.histogram(
+    "webhook_processing_lag_seconds", "Time from a callback reaching the inbox to it being applied",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+)
+WEBHOOK_EVENTS = metrics.counter(
+    "webhook_events_total", "Inbox callbacks by outcome", ("outcome",)
+)
+
+
+def normalize_callback(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Flatten a v2 callback ({"event": ..., "data": {...}}, e.g. e-wallet charges)
+    to the top-level fields invoice and VA callbacks carry, with e-wallet
+    statuses mapped onto the ones stored in xendit_payments
+    """
+    body = data.get("data")
+    event = data.get("event")
+    if not event or not isinstance(body, dict):
+        return data
+
+    flat = dict(body, event=event)
+    if event.startswith("ewallet."):
+        status = "VOIDED" if event == "ewallet.void" and body.get("void_status") == "SUCCEEDED" else body.get("status")
+        flat["status"] = EWALLET_STATUSES.get(status, "PENDING")
+        flat.setdefault("paid_amount", body.get("capture_amount") or body.get("charge_amount"))
+    return flat
+
+
+def webhook_event_key(data: Dict[str, Any]) -> Optional[str]:
+    """Dedup key for a callback: the same payment reaching the same status is one event"""
+    ident = data.get("id") or data.get("external_id") or data.get("reference_id")
+    if not ident:
+        return None
+    key = f"{ident}:{data.get('status', 'PENDING')}"
+    if data.get("event"):
+        key = f"{data['event']}:{key}"
+    return key[:191]
+
+
+class EventLRU:
+    """Bounded set of recently seen event keys, evicting the least recently used"""
+
+    def __init__(self, capacity: int = 10000):
+        self.capacity = capacity
+        self._keys: "OrderedDict[str, None]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def seen(self, key: str) -> bool:
+        if key in self._keys:
+            self._keys.move_to_end(key)
+            return True
+        return False
+
+    def discard(self, key: Optional[str]):
+        if key:
+            self._keys.pop(key, None)
+
+    def add(self, key: Optional[str]):
+        if not key:
+            return
+        self._keys[key] = None
+        self._keys.move_to_end(key)
+        if len(self._keys) > self.capacity:
+            self._keys.popitem(last=False)
+
+
+async def apply_webhook_event(cursor, data: Dict[str, Any], payload: str) -> Optional[Dict[str, Any]]:
+    """
+    Apply one decoded Xendit callback inside the caller's transaction
+
+    Args:
+        cursor: Cursor of an open transaction
+        data: Decoded callback body, flattened by normalize_callback
+        payload: Raw callback body, stored as webhook_data
+
+    Returns:
+        Status change to publish once the transaction commits, None for a
+        callback without a reference, or UNMATCHED when no payment has that
+        reference (the callback beat the payment INSERT's commit)
+    """
+    external_id = data.get("external_id") or data.get("reference_id")
+    payment_id = data.get("id")
+    if not external_id:
+        return None
+
+    status = data.get("status", "PENDING")
+    paid_amount = data.get("paid_amount") or data.get("amount", 0)
+    column, value = webhook_match(external_id, payment_id)
+
+    await cursor.execute(f"""
+        UPDATE xendit_payments
+        SET status = %s,
+            paid_amount = %s,
+            paid_at = CASE WHEN %s IN ('PAID', 'SETTLED', 'COMPLETED') THEN NOW() ELSE paid_at END,
+            webhook_data = %s,
+            updated_at = NOW()
+        WHERE {column} = %s
+    """, (status, paid_amount, status, payload, value))
+    if cursor.rowcount == 0:
+        # rowcount counts changed rows; tell "no such payment" from "nothing changed"
+        await cursor.execute(f"SELECT 1 FROM xendit_payments WHERE {column} = %s LIMIT 1", (value,))
+        if await cursor.fetchone() is None:
+            return UNMATCHED
+
+    if status in PAID_STATUSES:
+        await cursor.execute(f"""
+            UPDATE orders o
+            JOIN xendit_payments xp ON o.id = xp.order_id
+            SET o.payment_verified = TRUE,
+                o.status = 'confirmed'
+            WHERE xp.{column} = %s
+        """, (value,))
+
+    return {"reference_id": external_id, "payment_id": payment_id, "status": status}
+
+
+class WebhookInbox:
+    """Durable webhook queue with a pool of batch consumers"""
+
+    def __init__(self, database: AsyncDatabase, workers: int = 2, batch_size: int = 50,
+                 poll_interval: float = 1.0, claim_timeout: int = 300, max_attempts: int = 5,
+                 dedup_cache_size: int = 10000, unmatched_retry: float = 30.0):
+        """
+        Args:
+            database: Async database the inbox table lives in
+            workers: Number of consumer tasks in this process
+            batch_size: Maximum callbacks applied per transaction
+            poll_interval: Seconds between polls when no local append wakes a consumer
+            claim_timeout: Seconds after which rows claimed by a dead consumer are reclaimed
+            max_attempts: Failed callbacks are parked as 'failed' after this many attempts
+            dedup_cache_size: Committed event keys remembered in memory for the duplicate fast path
+            unmatched_retry: Seconds before a callback that matched no payment is
+                queued again (up to max_attempts)
+        """
+        self.db = database
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.claim_timeout = claim_timeout
+        self.max_attempts = max_attempts
+        self.recent_events = EventLRU(dedup_cache_size)
+        self.unmatched_retry = unmatched_retry
+        self._next_requeue = 0.0
+
+        self._consumer_prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+        self.received = 0
+        self.processed = 0
+        self.failed = 0
+        self.unmatched = 0
+        self.batches = 0
+        self.duplicates_cached = 0
+        self.duplicates_stored = 0
+        self.last_lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+
+    @classmethod
+    def from_env(cls, database: AsyncDatabase) -> "WebhookInbox":
+        return cls(
+            database,
+            workers=int(os.getenv("WEBHOOK_WORKERS", "2")),
+            batch_size=int(os.getenv("WEBHOOK_BATCH_SIZE", "50")),
+            poll_interval=float(os.getenv("WEBHOOK_POLL_INTERVAL", "1")),
+            claim_timeout=int(os.getenv("WEBHOOK_CLAIM_TIMEOUT", "300")),
+            max_attempts=int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5")),
+            dedup_cache_size=int(os.getenv("WEBHOOK_DEDUP_CACHE_SIZE", "10000")),
+            unmatched_retry=float(os.getenv("WEBHOOK_UNMATCHED_RETRY", "30")),
+        )
+
+    async def ingest(self, payload: str) -> Optional[int]:
+        """
+        Queue a callback unless it is a redelivery of one already applied
+
+        Returns:
+            Inbox row id, or None when the callback was absorbed as a duplicate
+        """
+        key = self._payload_key(payload)  # None is queued anyway; the consumer records why it failed
+        if key and self.recent_events.seen(key):
+            self.duplicates_cached += 1
+            return None
+        return await self.append(payload)
+
+    async def append(self, payload: str) -> int:
+        """Persist a raw callback body and wake a consumer; returns the inbox row id"""
+        inbox_id = await self.db.insert("INSERT INTO xendit_webhook_inbox (payload) VALUES (%s)", (payload,))
+        self.received += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return inbox_id
+
+    def start(self):
+        """Start the consumer tasks (call from application startup)"""
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._consume(f"{self._consumer_prefix}:{n}"))
+            for n in range(self.workers)
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self._tasks),
+            "received": self.received,
+            "processed": self.processed,
+            "failed": self.failed,
+            "unmatched": self.unmatched,
+            "batches": self.batches,
+            "duplicates": self.duplicates_cached + self.duplicates_stored,
+            "duplicates_cached": self.duplicates_cached,
+            "duplicates_stored": self.duplicates_stored,
+            "last_lag_seconds": round(self.last_lag_seconds, 3),
+            "max_lag_seconds": round(self.max_lag_seconds, 3),
+        }
+
+    async def _consume(self, consumer_id: str):
+        while True:
+            try:
+                await self._requeue_unmatched()
+                rows = await self._claim(consumer_id)
+                if rows:
+                    await self._process(rows)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception("Webhook consumer %s error: %s", consumer_id, e)
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _claim(self, consumer_id: str) -> List[Dict[str, Any]]:
+        """Atomically take the oldest pending (or abandoned) rows for this consumer"""
+        claimed = await self.db.execute("""
+            UPDATE xendit_webhook_inbox
+            SET status = 'processing', claimed_by = %s, claimed_at = NOW(), attempts = attempts + 1
+            WHERE status = 'pending'
+               OR (status = 'processing' AND claimed_at < NOW() - INTERVAL %s SECOND)
+            ORDER BY id
+            LIMIT %s
+        """, (consumer_id, self.claim_timeout, self.batch_size))
+        if not claimed:
+            return []
+
+        return await self.db.fetch_all("""
+            SELECT id, payload, attempts, UNIX_TIMESTAMP(received_at) AS received_ts
+            FROM xendit_webhook_inbox
+            WHERE claimed_by = %s AND status = 'processing'
+            ORDER BY id
+        """, (consumer_id,))
+
+    async def _process(self, rows: List[Dict[str, Any]]):
+        events = []
+        for row in rows:
+            try:
+                events.append((row, normalize_callback(json.loads(row["payload"]))))
+            except ValueError as e:
+                await self._mark_failed(row, f"Invalid JSON: {e}", final=True)
+
+        try:
+            # Apply the whole batch in one transaction, oldest first
+            async with self.db.transaction() as cursor:
+                duplicates = 0
+                changes = []
+                unmatched = []
+                for row, data in events:
+                    if await self._claim_event(cursor, row, data):
+                        change = await apply_webhook_event(cursor, data, row["payload"])
+                        if change is UNMATCHED:
+                            await self._unclaim_event(cursor, row, data)
+                            unmatched.append(row)
+                        else:
+                            changes.append(change)
+                    else:
+                        duplicates += 1
+                unmatched_ids = {row["id"] for row in unmatched}
+                await self._mark_done(cursor, [row["id"] for row, _ in events if row["id"] not in unmatched_ids])
+                await self._mark_unmatched(cursor, [row["id"] for row in unmatched])
+            self.duplicates_stored += duplicates
+            self._publish(changes)
+        except Exception as e:
+            logger.warning("Webhook batch of %d failed, retrying one by one: %s", len(events), e)
+            for _, data in events:
+                self.recent_events.discard(webhook_event_key(data))
+            await self._process_individually(events)
+            return
+
+        # Only committed events are remembered, so a rolled back one is still accepted when redelivered
+        for row, data in events:
+            if row["id"] not in unmatched_ids:
+                self.recent_events.add(webhook_event_key(data))
+
+        self.batches += 1
+        self._record_unmatched(unmatched)
+        self._record([(row, data) for row, data in events if row["id"] not in unmatched_ids])
+
+    async def _process_individually(self, events):
+        """Isolate a poison callback so the rest of a failed batch still applies"""
+        for row, data in events:
+            try:
+                change = None
+                async with self.db.transaction() as cursor:
+                    fresh = await self._claim_event(cursor, row, data)
+                    if fresh:
+                        change = await apply_webhook_event(cursor, data, row["payload"])
+                    if change is UNMATCHED:
+                        await self._unclaim_event(cursor, row, data)
+                        await self._mark_unmatched(cursor, [row["id"]])
+                    else:
+                        await self._mark_done(cursor, [row["id"]])
+                if change is UNMATCHED:
+                    self._record_unmatched([row])
+                    continue
+                self.recent_events.add(webhook_event_key(data))
+                if not fresh:
+                    self.duplicates_stored += 1
+                self._publish([change])
+                self._record([(row, data)])
+            except Exception as e:
+                self.recent_events.discard(webhook_event_key(data))
+                await self._mark_failed(row, str(e), final=row["attempts"] >= self.max_attempts)
+
+    async def _claim_event(self, cursor, row: Dict[str, Any], data: Dict[str, Any]) -> bool:
+        """
+        Record the callback's event key in the unique-keyed events table
+
+        Returns:
+            False if another delivery of the same event was already applied
+        """
+        key = webhook_event_key(data)
+        if not key:
+            return True
+        await cursor.execute(
+            "INSERT IGNORE INTO xendit_webhook_events (event_key, inbox_id) VALUES (%s, %s)",
+            (key, row["id"])
+        )
+        return cursor.rowcount > 0
+
+    async def _unclaim_event(self, cursor, row: Dict[str, Any], data: Dict[str, Any]):
+        """Forget the event key of a callback that matched no payment, so a redelivery is applied"""
+        key = webhook_event_key(data)
+        if not key:
+            return
+        await cursor.execute(
+            "DELETE FROM xendit_webhook_events WHERE event_key = %s AND inbox_id = %s", (key, row["id"])
+        )
+        self.recent_events.discard(key)
+
+    @staticmethod
+    async def _mark_unmatched(cursor, ids: List[int]):
+        if not ids:
+            return
+        placeholders = ", ".join(["%s"] * len(ids))
+        await cursor.execute(f"""
+            UPDATE xendit_webhook_inbox
+            SET status = 'unmatched', processed_at = NOW(), claimed_by = NULL,
+                last_error = 'No payment with this reference yet'
+            WHERE id IN ({placeholders})
+        """, ids)
+
+    async def _requeue_unmatched(self):
+        """Queue unmatched callbacks again once unmatched_retry has passed, up to max_attempts"""
+        now = time.monotonic()
+        if now < self._next_requeue:
+            return
+        self._next_requeue = now + self.unmatched_retry
+        await self.db.execute("""
+            UPDATE xendit_webhook_inbox
+            SET status = 'pending'
+            WHERE status = 'unmatched' AND attempts < %s
+              AND processed_at < NOW() - INTERVAL %s SECOND
+        """, (self.max_attempts, int(self.unmatched_retry)))
+
+    def _record_unmatched(self, rows: List[Dict[str, Any]]):
+        for row in rows:
+            self.unmatched += 1
+            final = row["attempts"] >= self.max_attempts
+            WEBHOOK_EVENTS.inc(outcome="unmatched")
+            log = logger.warning if final else logger.info
+            log("Webhook inbox row %s matched no payment (attempt %s)%s", row["id"], row["attempts"],
+                "; giving up" if final else "; will retry",
+                extra={"inbox_id": row["id"], "attempts": row["attempts"]})
+
+    @staticmethod
+    async def _mark_done(cursor, ids: List[int]):
+        if not ids:
+            return
+        placeholders = ", ".join(["%s"] * len(ids))
+        await cursor.execute(f"""
+            UPDATE xendit_webhook_inbox
+            SET status = 'done', processed_at = NOW(), claimed_by = NULL
+            WHERE id IN ({placeholders})
+        """, ids)
+
+    async def _mark_failed(self, row: Dict[str, Any], error: str, final: bool):
+        # Nothing of this callback committed; let Xendit's next redelivery through
+        self.recent_events.discard(self._payload_key(row["payload"]))
+        self.failed += 1
+        WEBHOOK_EVENTS.inc(outcome="failed" if final else "retried")
+        logger.warning("Webhook inbox row %s failed (attempt %s): %s", row["id"], row["attempts"], error,
+                       extra={"inbox_id": row["id"], "attempts": row["attempts"]})
+        await self.db.execute("""
+            UPDATE xendit_webhook_inbox
+            SET status = %s, last_error = %s, claimed_by = NULL
+            WHERE id = %s
+        """, ("failed" if final else "pending", error[:1000], row["id"]))
+
+    @staticmethod
+    def _payload_key(payload: str) -> Optional[str]:
+        try:
+            return webhook_event_key(normalize_callback(json.loads(payload)))
+        except (ValueError, AttributeError):
+            return None
+
+    @staticmethod
+    def _publish(changes):
+        for change in changes:
+            if change:
+                payment_notifier.publish((change["reference_id"], change["payment_id"]), change)
+
+    def _record(self, events):
+        now = time.time()
+        self.processed += len(events)
+        for row, _ in events:
+            if row.get("received_ts") is not None:
+                lag = now - float(row["received_ts"])
+                self.last_lag_seconds = lag
+                self.max_lag_seconds = max(self.max_lag_seconds, lag)
+                WEBHOOK_LAG_SECONDS.observe(lag)
+        WEBHOOK_EVENTS.inc(len(events), outcome="processed")
+
+
+# Create singleton instance
+webhook_inbox = WebhookInbox.from_env(db)
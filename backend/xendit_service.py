@@ -4,24 +4,67 @@ Xendit Payment Integration Service
 Handles QRIS, Virtual Account, and E-wallet payments
 """
 
+import logging
 import os
+import math
 import xendit
-from typing import Dict, Any, Optional
+import asyncio
+from typing import Dict, Any, Awaitable, Callable, Optional
 import json
 import hmac
 import hashlib
 from datetime import datetime
 import requests
+import httpx
+import time
+
+from circuit_breaker import CircuitBreakerRegistry, CircuitOpenError, xendit_breakers
+from metrics import metrics
+from payment_models import channel_key
+from retry_policy import RetryPolicy, LatencyTracker, hedged, is_retryable
+import server_timing
+
+
+logger = logging.getLogger(__name__)
 
 # Initialize Xendit configuration
 XENDIT_API_KEY = os.getenv("XENDIT_API_KEY", "")
 XENDIT_WEBHOOK_TOKEN = os.getenv("XENDIT_WEBHOOK_TOKEN", "")
-XENDIT_BASE_URL = "https://api.xendit.co"
+XENDIT_BASE_URL = os.getenv("XENDIT_BASE_URL", "https://api.xendit.co")
+XENDIT_TIMEOUT = float(os.getenv("XENDIT_TIMEOUT", "15"))
+XENDIT_CONNECT_TIMEOUT = float(os.getenv("XENDIT_CONNECT_TIMEOUT", "5"))
+XENDIT_MAX_CONNECTIONS = int(os.getenv("XENDIT_MAX_CONNECTIONS", "50"))
+XENDIT_MAX_KEEPALIVE = int(os.getenv("XENDIT_MAX_KEEPALIVE", "20"))
+XENDIT_KEEPALIVE_EXPIRY = float(os.getenv("XENDIT_KEEPALIVE_EXPIRY", "60"))
+XENDIT_HEDGE_STATUS_READS = os.getenv("XENDIT_HEDGE_STATUS_READS", "false").lower() == "true"
+XENDIT_HEDGE_PERCENTILE = float(os.getenv("XENDIT_HEDGE_PERCENTILE", "0.95"))
+
+XENDIT_ATTEMPTS = metrics.counter(
+    "xendit_attempts_total", "Xendit API attempts by outcome", ("operation", "channel_code", "outcome")
+)
+XENDIT_ATTEMPT_SECONDS = metrics.histogram(
+    "xendit_attempt_duration_seconds", "Duration of single Xendit API attempts", ("operation", "channel_code")
+)
+XENDIT_RETRIES = metrics.counter(
+    "xendit_retries_total", "Xendit API attempts made after a transient failure", ("operation", "channel_code")
+)
+XENDIT_HEDGES = metrics.counter(
+    "xendit_hedged_requests_total", "Duplicate status reads started past the latency percentile",
+    ("operation", "channel_code")
+)
 
 # Set Xendit API key
 xendit.set_api_key(XENDIT_API_KEY)
 
 
+class XenditAPIError(Exception):
+    """Non-2xx response from the Xendit API"""
+    
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
 class XenditService:
     """Service class for handling Xendit payment operations"""
     
@@ -67,7 +110,7 @@ class XenditService:
                 "channel_code": "QRIS"
             }
         except Exception as e:
-            print(f"Error creating QRIS payment: {e}")
+            logger.error("Error creating QRIS payment: %s", e, extra={"reference_id": reference_id})
             return {
                 "success": False,
                 "error": str(e)
@@ -112,7 +155,7 @@ class XenditService:
                 "expired_at": va["expiration_date"] if "expiration_date" in va else None
             }
         except Exception as e:
-            print(f"Error creating Virtual Account: {e}")
+            logger.error("Error creating Virtual Account: %s", e, extra={"reference_id": reference_id})
             return {
                 "success": False,
                 "error": str(e)
@@ -155,7 +198,7 @@ class XenditService:
                 "wallet_type": wallet_type
             }
         except Exception as e:
-            print(f"Error creating E-wallet payment: {e}")
+            logger.error("Error creating E-wallet payment: %s", e, extra={"reference_id": reference_id})
             return {
                 "success": False,
                 "error": str(e)
@@ -195,7 +238,7 @@ class XenditService:
                     "error": "Unsupported payment type"
                 }
         except Exception as e:
-            print(f"Error getting payment status: {e}")
+            logger.error("Error getting payment status: %s", e, extra={"payment_id": payment_id})
             return {
                 "success": False,
                 "error": str(e)
@@ -221,7 +264,7 @@ class XenditService:
             
             return hmac.compare_digest(expected_signature, signature)
         except Exception as e:
-            print(f"Error verifying webhook signature: {e}")
+            logger.error("Error verifying webhook signature: %s", e)
             return False
     
     def _get_bank_name(self, bank_code: str) -> str:
@@ -239,5 +282,382 @@ class XenditService:
         return bank_names.get(bank_code, bank_code)
 
 
-# Create singleton instance
+class AsyncXenditService(XenditService):
+    """
+    Non-blocking variant of XenditService that calls the Xendit REST API over
+    a shared httpx connection pool, so TLS sessions are kept alive and reused
+    """
+    
+    def __init__(self, base_url: str = XENDIT_BASE_URL, breakers: CircuitBreakerRegistry = xendit_breakers,
+                 create_retry: Optional[RetryPolicy] = None, read_retry: Optional[RetryPolicy] = None,
+                 hedge_status_reads: bool = XENDIT_HEDGE_STATUS_READS):
+        """
+        Args:
+            base_url: Xendit API base URL (XENDIT_BASE_URL, e.g. a local xendit_simulator.py)
+            breakers: Circuit breakers guarding each operation and channel
+            create_retry: Retry policy for payment creation (guarded by external_id)
+            read_retry: Retry policy for status reads
+            hedge_status_reads: Start a duplicate status read once the first
+                passes XENDIT_HEDGE_PERCENTILE of recent status latencies
+        """
+        super().__init__()
+        self.base_url = base_url
+        self.breakers = breakers
+        self.create_retry = create_retry or RetryPolicy.from_env("XENDIT_CREATE_RETRY")
+        self.read_retry = read_retry or RetryPolicy.from_env("XENDIT_READ_RETRY")
+        self.hedge_status_reads = hedge_status_reads
+        self._latency: Dict[str, LatencyTracker] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                auth=(self.api_key, ""),
+                timeout=httpx.Timeout(XENDIT_TIMEOUT, connect=XENDIT_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=XENDIT_MAX_CONNECTIONS,
+                    max_keepalive_connections=XENDIT_MAX_KEEPALIVE,
+                    keepalive_expiry=XENDIT_KEEPALIVE_EXPIRY
+                )
+            )
+        return self._client
+    
+    async def aclose(self):
+        """Close pooled connections (call from application shutdown)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def _request(self, method: str, path: str, json_body: Optional[Dict[str, Any]] = None,
+                       timeout: Optional[float] = None, operation: Optional[str] = None,
+                       channel_code: Optional[str] = None, params: Optional[Dict[str, Any]] = None,
+                       headers: Optional[Dict[str, str]] = None) -> Any:
+        """
+        Send a single request and return the decoded body, raising on non-2xx responses
+
+        When operation and channel_code are given the call goes through their
+        circuit breaker: it raises CircuitOpenError without touching the network
+        while the breaker is open. Timeouts, transport errors, 429 and 5xx count
+        as failures; other 4xx responses are the caller's fault and do not.
+        Every attempt is counted in xendit_attempts_total by outcome.
+        """
+        breaker = self.breakers.get(operation, channel_code) if operation and channel_code else None
+        labels = {"operation": operation or method.lower(), "channel_code": channel_key(channel_code)}
+        if timeout is None and breaker is not None:
+            timeout = self.breakers.call_timeout
+        kwargs = {"json": json_body, "params": params, "headers": headers}
+        if timeout is not None:
+            kwargs["timeout"] = httpx.Timeout(timeout, connect=min(timeout, XENDIT_CONNECT_TIMEOUT))
+        
+        if breaker is not None:
+            try:
+                breaker.before_call()
+            except CircuitOpenError:
+                XENDIT_ATTEMPTS.inc(outcome="circuit_open", **labels)
+                raise
+        started = time.monotonic()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+        except asyncio.CancelledError:
+            # e.g. the losing request of a hedged read
+            if breaker is not None:
+                breaker.cancel_call()
+            raise
+        except Exception as e:
+            elapsed = time.monotonic() - started
+            XENDIT_ATTEMPT_SECONDS.observe(elapsed, **labels)
+            server_timing.record("xendit", elapsed, f"{labels['operation']} {labels['channel_code']}".strip())
+            outcome = "timeout" if isinstance(e, httpx.TimeoutException) else "transport_error"
+            XENDIT_ATTEMPTS.inc(outcome=outcome, **labels)
+            if breaker is not None:
+                breaker.record(False, elapsed, f"{type(e).__name__}: {e}")
+            raise
+        
+        elapsed = time.monotonic() - started
+        XENDIT_ATTEMPT_SECONDS.observe(elapsed, **labels)
+        server_timing.record("xendit", elapsed, f"{labels['operation']} {labels['channel_code']}".strip())
+        XENDIT_ATTEMPTS.inc(outcome="ok" if response.is_success else f"{response.status_code // 100}xx", **labels)
+        if response.is_success:
+            self._latency.setdefault(labels["operation"], LatencyTracker()).record(elapsed)
+        if breaker is not None:
+            failed = response.status_code >= 500 or response.status_code == 429
+            breaker.record(not failed, elapsed, f"HTTP {response.status_code}" if failed else None)
+        
+        if response.is_error:
+            try:
+                error = response.json()
+                message = f"{error.get('error_code', response.status_code)}: {error.get('message', response.text)}"
+            except ValueError:
+                message = f"{response.status_code}: {response.text}"
+            raise XenditAPIError(message, response.status_code)
+        return response.json()
+    
+    async def _call(self, method: str, path: str, json_body: Optional[Dict[str, Any]] = None,
+                    timeout: Optional[float] = None, operation: str = "", channel_code: str = "",
+                    retry: Optional[RetryPolicy] = None, headers: Optional[Dict[str, str]] = None,
+                    hedge: bool = False,
+                    find_existing: Optional[Callable[[], Awaitable[Optional[Dict[str, Any]]]]] = None) -> Any:
+        """
+        _request with retries on transient failures (see retry_policy.is_retryable)
+        
+        Args:
+            retry: Attempt budget and backoff (defaults to the read policy)
+            hedge: Race a duplicate request once the first passes the latency
+                percentile (idempotent reads only)
+            find_existing: For creations, looks the payment up by external_id
+                before a retry so an attempt that reached Xendit is not repeated
+        """
+        retry = retry or self.read_retry
+        labels = {"operation": operation, "channel_code": channel_key(channel_code)}
+        send = lambda: self._request(method, path, json_body, timeout=timeout, operation=operation,
+                                     channel_code=channel_code, headers=headers)
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                if attempt > 1 and find_existing is not None:
+                    existing = await find_existing()
+                    if existing is not None:
+                        return existing
+                
+                if hedge and operation in self._latency:
+                    delay = self._latency[operation].percentile(XENDIT_HEDGE_PERCENTILE)
+                    if delay is not None:
+                        return await hedged(send, delay, on_hedge=lambda: XENDIT_HEDGES.inc(**labels))
+                return await send()
+            except Exception as e:
+                if attempt >= retry.max_attempts or not is_retryable(e):
+                    raise
+                XENDIT_RETRIES.inc(**labels)
+                await asyncio.sleep(retry.backoff(attempt))
+    
+    async def _find_invoice(self, external_id: str) -> Optional[Dict[str, Any]]:
+        """Invoice already created for external_id by an earlier attempt, if any"""
+        invoices = await self._request("GET", "/v2/invoices", params={"external_id": external_id},
+                                       operation="find_invoice", channel_code="QRIS")
+        return invoices[0] if invoices else None
+    
+    @staticmethod
+    def _circuit_open(error: CircuitOpenError) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "error": str(error),
+            "circuit_open": True,
+            "retry_after": max(math.ceil(error.retry_after), 1)
+        }
+    
+    async def create_qris_payment(self, amount: float, reference_id: str, channel_id: str = "pos_main",
+                                  timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Create a QRIS payment
+        
+        Args:
+            amount: Payment amount in IDR
+            reference_id: Unique reference ID for the payment
+            channel_id: Channel identifier (pos_main, dine_in, takeaway)
+            timeout: Per-call timeout in seconds (defaults to XENDIT_TIMEOUT)
+        
+        Returns:
+            Dict containing payment details including QR code string
+        """
+        try:
+            invoice = await self._call("POST", "/v2/invoices", {
+                "external_id": reference_id,
+                "amount": int(amount),
+                "payer_email": "customer@pos-system.com",
+                "description": f"Payment for order {reference_id}",
+                "invoice_duration": 86400,  # 24 hours
+                "currency": "IDR",
+                "payment_methods": ["QRIS"]
+            }, timeout=timeout, operation="create_qris_payment", channel_code="QRIS",
+               retry=self.create_retry, find_existing=lambda: self._find_invoice(reference_id))
+            
+            return {
+                "success": True,
+                "payment_id": invoice["id"],
+                "reference_id": reference_id,
+                "qr_string": invoice["invoice_url"],
+                "status": invoice["status"],
+                "amount": amount,
+                "expired_at": invoice.get("expiry_date"),
+                "channel_code": "QRIS"
+            }
+        except CircuitOpenError as e:
+            return self._circuit_open(e)
+        except Exception as e:
+            logger.error("Error creating QRIS payment: %s", e, extra={"reference_id": reference_id})
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    async def create_virtual_account(self, amount: float, reference_id: str, bank_code: str,
+                                     customer_name: str = "Customer",
+                                     timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Create a Virtual Account payment
+        
+        Args:
+            amount: Payment amount in IDR
+            reference_id: Unique reference ID
+            bank_code: Bank code (BCA, BNI, BRI, MANDIRI, PERMATA)
+            customer_name: Customer name for the VA
+            timeout: Per-call timeout in seconds (defaults to XENDIT_TIMEOUT)
+        
+        Returns:
+            Dict containing VA details including account number
+        """
+        try:
+            va = await self._call("POST", "/callback_virtual_accounts", {
+                "external_id": reference_id,
+                "bank_code": bank_code,
+                "name": customer_name,
+                "expected_amount": int(amount),
+                "is_closed": True,  # Closed VA with exact amount
+                "is_single_use": True
+            }, timeout=timeout, operation="create_virtual_account", channel_code=bank_code,
+               retry=self.create_retry, headers={"X-IDEMPOTENCY-KEY": reference_id})
+            
+            return {
+                "success": True,
+                "payment_id": va["id"],
+                "reference_id": reference_id,
+                "account_number": va["account_number"],
+                "bank_code": bank_code,
+                "bank_name": self._get_bank_name(bank_code),
+                "customer_name": customer_name,
+                "status": va["status"],
+                "amount": amount,
+                "expired_at": va.get("expiration_date")
+            }
+        except CircuitOpenError as e:
+            return self._circuit_open(e)
+        except Exception as e:
+            logger.error("Error creating Virtual Account: %s", e, extra={"reference_id": reference_id})
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    async def create_ewallet_payment(self, amount: float, reference_id: str, wallet_type: str,
+                                     success_url: str, failure_url: str,
+                                     timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Create an E-wallet payment (OVO, DANA, LinkAja, GoPay, ShopeePay)
+        Uses the v2 e-wallet charges API (POST /ewallets/charges) rather than
+        the legacy flat ewallet_type/external_id call of the sync service. Its
+        callbacks wrap the charge in an {"event", "data"} envelope and report
+        SUCCEEDED when paid; the webhook consumers flatten them with
+        webhook_inbox.normalize_callback.
+
+        Args:
+            amount: Payment amount in IDR
+            reference_id: Unique reference ID
+            wallet_type: Type of e-wallet (OVO, DANA, LINKAJA, etc)
+            success_url: URL to redirect on success
+            failure_url: URL to redirect on failure
+            timeout: Per-call timeout in seconds (defaults to XENDIT_TIMEOUT)
+        
+        Returns:
+            Dict containing e-wallet payment details including redirect URL
+        """
+        try:
+            charge = await self._call("POST", "/ewallets/charges", {
+                "reference_id": reference_id,
+                "currency": "IDR",
+                "amount": int(amount),
+                "checkout_method": "ONE_TIME_PAYMENT",
+                "channel_code": f"ID_{wallet_type.upper()}",
+                "channel_properties": {
+                    "mobile_number": "+628123456789",  # Placeholder, should be from customer
+                    "success_redirect_url": success_url,
+                    "failure_redirect_url": failure_url
+                }
+            }, timeout=timeout, operation="create_ewallet_payment", channel_code=wallet_type,
+               retry=self.create_retry, headers={"X-IDEMPOTENCY-KEY": reference_id})
+            
+            actions = charge.get("actions") or {}
+            return {
+                "success": True,
+                "payment_id": charge["id"],
+                "reference_id": reference_id,
+                "redirect_url": actions.get("desktop_web_checkout_url") or actions.get("mobile_web_checkout_url"),
+                "status": charge["status"],
+                "amount": amount,
+                "wallet_type": wallet_type
+            }
+        except CircuitOpenError as e:
+            return self._circuit_open(e)
+        except Exception as e:
+            logger.error("Error creating E-wallet payment: %s", e, extra={"reference_id": reference_id})
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    async def get_payment_status(self, payment_id: str, payment_type: str = "invoice",
+                                 timeout: Optional[float] = None,
+                                 channel_code: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get payment status
+        
+        Args:
+            payment_id: Xendit payment ID
+            payment_type: Type of payment (invoice, va, ewallet)
+            timeout: Per-call timeout in seconds (defaults to XENDIT_TIMEOUT)
+            channel_code: Bank or e-wallet code, selects the circuit breaker
+        
+        Returns:
+            Dict containing payment status
+        """
+        try:
+            if payment_type == "invoice":
+                invoice = await self._call("GET", f"/v2/invoices/{payment_id}", timeout=timeout,
+                                           operation="get_payment_status", channel_code="QRIS",
+                                           hedge=self.hedge_status_reads)
+                return {
+                    "success": True,
+                    "payment_id": payment_id,
+                    "status": invoice["status"],
+                    "amount": invoice["amount"]
+                }
+            elif payment_type == "va":
+                va = await self._call("GET", f"/callback_virtual_accounts/{payment_id}", timeout=timeout,
+                                      operation="get_payment_status", channel_code=channel_code or "VA",
+                                      hedge=self.hedge_status_reads)
+                return {
+                    "success": True,
+                    "payment_id": payment_id,
+                    "status": va["status"],
+                    "amount": va["expected_amount"]
+                }
+            elif payment_type == "ewallet":
+                charge = await self._call("GET", f"/ewallets/charges/{payment_id}", timeout=timeout,
+                                          operation="get_payment_status", channel_code=channel_code or "EWALLET",
+                                          hedge=self.hedge_status_reads)
+                return {
+                    "success": True,
+                    "payment_id": payment_id,
+                    "status": charge["status"],
+                    "amount": charge.get("capture_amount") or charge.get("charge_amount")
+                }
+            else:
+                return {
+                    "success": False,
+                    "error": "Unsupported payment type"
+                }
+        except CircuitOpenError as e:
+            return self._circuit_open(e)
+        except Exception as e:
+            logger.error("Error getting payment status: %s", e, extra={"payment_id": payment_id})
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
+
+# Create singleton instances
 xendit_service = XenditService()
+async_xendit_service = AsyncXenditService()
@@ -0,0 +1,594 @@
+#!/usr/bin/env python3
+"""
+Xendit API Simulator
+Local stand-in for the Xendit endpoints AsyncXenditService calls: invoices
+(QRIS), callback virtual accounts and e-wallet charges, kept in memory.
+Latency is drawn from a configurable distribution, 5xx errors and stalls
+are injected at configurable rates and a token bucket answers 429 past the
+rate limit. Created payments are paid after a delay and the callback is
+POSTed to the POS webhook with the x-callback-token, so end-to-end
+throughput tests run with no network access.
+
+Latency specs: fixed:MS, uniform:LO_MS,HI_MS, normal:MEAN_MS,STDDEV_MS,
+lognormal:MEDIAN_MS,SIGMA (0 disables)
+
+Usage:
+    python xendit_simulator.py --port 9000 --create-latency lognormal:250,0.5 --error-rate 0.01
+    XENDIT_BASE_URL=http://localhost:9000 python server_xendit.py
+"""
+
+import argparse
+import asyncio
+import base64
+import logging
+import math
+import os
+import random
+import secrets
+import time
+import uuid
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional
+
+import httpx
+import uvicorn
+from dotenv import load_dotenv
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+load_dotenv()
+
+
+logger = logging.getLogger(__name__)
+
+INVOICE_DURATION = 86400
+VA_DURATION = 86400
+BANK_PREFIXES = {"BCA": "10766", "BNI": "8808", "BRI": "26215", "MANDIRI": "88908", "PERMATA": "8214"}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _timestamp(value: datetime) -> str:
+    return value.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+class LatencyModel:
+    """Samples response delays from a distribution given as a spec string"""
+
+    def __init__(self, spec: str = "0", rng: Optional[random.Random] = None):
+        """
+        Args:
+            spec: fixed:MS, uniform:LO,HI, normal:MEAN,STDDEV or lognormal:MEDIAN,SIGMA
+                (milliseconds); a bare number means fixed
+            rng: Random source, seeded for repeatable runs
+        """
+        self.spec = spec
+        self.rng = rng or random.Random()
+        kind, _, params = spec.partition(":")
+        if not params:
+            kind, params = "fixed", kind
+        try:
+            values = [float(value) for value in params.split(",")]
+        except ValueError:
+            raise ValueError(f"Invalid latency spec: {spec}")
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if expected.get(kind) != len(values):
+            raise ValueError(f"Invalid latency spec: {spec}")
+        self.kind = kind
+        self.params = values
+
+    def sample(self) -> float:
+        """One delay in seconds"""
+        if self.kind == "fixed":
+            ms = self.params[0]
+        elif self.kind == "uniform":
+            ms = self.rng.uniform(*self.params)
+        elif self.kind == "normal":
+            ms = self.rng.gauss(*self.params)
+        else:
+            median, sigma = self.params
+            ms = self.rng.lognormvariate(math.log(max(median, 0.001)), sigma)
+        return max(ms, 0.0) / 1000
+
+
+class TokenBucket:
+    """Allows rate requests per second with bursts of up to burst"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self._updated = time.monotonic()
+
+    def allow(self) -> bool:
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class XenditSimulator:
+    """In-memory Xendit objects, fault injection and callback delivery"""
+
+    def __init__(self, create_latency: str = "lognormal:250,0.5", read_latency: str = "lognormal:60,0.4",
+                 create_error_rate: float = 0.0, read_error_rate: float = 0.0,
+                 error_codes: tuple = (500, 503), stall_rate: float = 0.0, stall_seconds: float = 30.0,
+                 rate_limit: float = 0.0, burst: int = 50,
+                 callback_url: str = "http://localhost:8001/api/xendit/webhook", callback_token: str = "",
+                 callback_delay: str = "uniform:500,3000", pay_rate: float = 1.0,
+                 callback_retries: int = 3, callback_concurrency: int = 50,
+                 api_key: str = "", max_objects: int = 200000, seed: Optional[int] = None):
+        """
+        Args:
+            create_latency: Delay spec for POST calls (see LatencyModel)
+            read_latency: Delay spec for GET calls
+            create_error_rate: Fraction of POST calls answered with an injected error
+            read_error_rate: Fraction of GET calls answered with an injected error
+            error_codes: Status codes injected errors are drawn from
+            stall_rate: Fraction of calls that create the object and then hold the
+                response for stall_seconds, so the client times out after Xendit
+                has acted (exercises find_existing and idempotency keys)
+            stall_seconds: How long a stalled response is held
+            rate_limit: Requests per second before answering 429 (0 disables)
+            burst: Token bucket size for rate_limit
+            callback_url: POS webhook receiving payment callbacks (empty disables)
+            callback_token: x-callback-token sent with callbacks
+            callback_delay: Delay spec between creation and payment
+            pay_rate: Fraction of created payments that get paid; the rest stay pending
+            callback_retries: Delivery attempts per callback on errors and non-2xx
+            callback_concurrency: Callbacks in flight at once
+            api_key: Secret key clients must send as the basic auth username (empty accepts any)
+            max_objects: Objects kept in memory; the oldest are evicted
+            seed: Random seed for repeatable runs
+        """
+        self.rng = random.Random(seed)
+        self.create_latency = LatencyModel(create_latency, self.rng)
+        self.read_latency = LatencyModel(read_latency, self.rng)
+        self.callback_delay = LatencyModel(callback_delay, self.rng)
+        self.create_error_rate = create_error_rate
+        self.read_error_rate = read_error_rate
+        self.error_codes = tuple(error_codes) or (500,)
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.bucket = TokenBucket(rate_limit, burst)
+        self.callback_url = callback_url
+        self.callback_token = callback_token
+        self.pay_rate = pay_rate
+        self.callback_retries = max(callback_retries, 1)
+        self.api_key = api_key
+        self.max_objects = max_objects
+        self.objects: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.by_external_id: Dict[str, str] = {}
+        self.idempotency_keys: Dict[str, str] = {}
+        self.counts: Counter = Counter()
+        self._callback_slots = asyncio.Semaphore(callback_concurrency)
+        self._tasks = set()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> "XenditSimulator":
+        return cls(
+            create_latency=args.create_latency,
+            read_latency=args.read_latency,
+            create_error_rate=args.create_error_rate if args.create_error_rate is not None else args.error_rate,
+            read_error_rate=args.read_error_rate if args.read_error_rate is not None else args.error_rate,
+            error_codes=tuple(int(code) for code in args.error_codes.split(",") if code.strip()),
+            stall_rate=args.stall_rate,
+            stall_seconds=args.stall_seconds,
+            rate_limit=args.rate_limit,
+            burst=args.burst,
+            callback_url=args.callback_url,
+            callback_token=args.callback_token,
+            callback_delay=args.callback_delay,
+            pay_rate=args.pay_rate,
+            callback_retries=args.callback_retries,
+            callback_concurrency=args.callback_concurrency,
+            api_key=args.api_key,
+            max_objects=args.max_objects,
+            seed=args.seed,
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=10.0)
+        return self._client
+
+    async def aclose(self):
+        for task in list(self._tasks):
+            task.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # Objects
+
+    def store(self, obj: Dict[str, Any], kind: str, external_id: str, idempotency_key: Optional[str] = None):
+        self.objects[obj["id"]] = {"kind": kind, "body": obj, "external_id": external_id,
+                                   "idempotency_key": idempotency_key}
+        self.by_external_id[external_id] = obj["id"]
+        if idempotency_key:
+            self.idempotency_keys[idempotency_key] = obj["id"]
+        while len(self.objects) > self.max_objects:
+            evicted_id, evicted = self.objects.popitem(last=False)
+            if self.by_external_id.get(evicted["external_id"]) == evicted_id:
+                del self.by_external_id[evicted["external_id"]]
+            self.idempotency_keys.pop(evicted["idempotency_key"], None)
+        self.counts[f"created_{kind}"] += 1
+        if self.callback_url and self.rng.random() < self.pay_rate:
+            self.schedule(self.pay(obj["id"]))
+
+    def get(self, object_id: str, kind: str) -> Optional[Dict[str, Any]]:
+        entry = self.objects.get(object_id)
+        return entry["body"] if entry is not None and entry["kind"] == kind else None
+
+    def replay(self, idempotency_key: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Object already created under this X-IDEMPOTENCY-KEY, if any"""
+        object_id = self.idempotency_keys.get(idempotency_key) if idempotency_key else None
+        entry = self.objects.get(object_id) if object_id else None
+        return entry["body"] if entry is not None else None
+
+    def create_invoice(self, body: Dict[str, Any], base_url: str) -> Dict[str, Any]:
+        now = _now()
+        invoice_id = secrets.token_hex(12)
+        invoice = {
+            "id": invoice_id,
+            "external_id": body["external_id"],
+            "user_id": "simulator",
+            "status": "PENDING",
+            "merchant_name": "POS Simulator",
+            "amount": body["amount"],
+            "payer_email": body.get("payer_email"),
+            "description": body.get("description"),
+            "expiry_date": _timestamp(now + timedelta(seconds=body.get("invoice_duration", INVOICE_DURATION))),
+            "invoice_url": f"{base_url}web/invoices/{invoice_id}",
+            "available_qr_codes": [{"qr_code_type": "QRIS"}],
+            "currency": body.get("currency", "IDR"),
+            "created": _timestamp(now),
+            "updated": _timestamp(now),
+        }
+        self.store(invoice, "invoice", body["external_id"])
+        return invoice
+
+    def create_virtual_account(self, body: Dict[str, Any], idempotency_key: Optional[str]) -> Dict[str, Any]:
+        now = _now()
+        bank_code = body["bank_code"]
+        prefix = BANK_PREFIXES.get(bank_code, "9999")
+        va = {
+            "id": secrets.token_hex(12),
+            "owner_id": "simulator",
+            "external_id": body["external_id"],
+            "bank_code": bank_code,
+            "merchant_code": prefix,
+            "name": body.get("name"),
+            "account_number": prefix + "".join(str(self.rng.randrange(10)) for _ in range(16 - len(prefix))),
+            "expected_amount": body.get("expected_amount"),
+            "is_closed": body.get("is_closed", False),
+            "is_single_use": body.get("is_single_use", False),
+            "expiration_date": _timestamp(now + timedelta(seconds=VA_DURATION)),
+            "currency": "IDR",
+            "status": "PENDING",
+        }
+        self.store(va, "va", body["external_id"], idempotency_key)
+        # Xendit answers PENDING and activates the account right after
+        va = dict(va)
+        self.objects[va["id"]]["body"]["status"] = "ACTIVE"
+        return va
+
+    def create_ewallet_charge(self, body: Dict[str, Any], idempotency_key: Optional[str],
+                              base_url: str) -> Dict[str, Any]:
+        now = _now()
+        charge_id = f"ewc_{uuid.uuid4()}"
+        checkout_url = f"{base_url}web/ewallets/{charge_id}"
+        charge = {
+            "id": charge_id,
+            "business_id": "simulator",
+            "reference_id": body["reference_id"],
+            "status": "PENDING",
+            "currency": body.get("currency", "IDR"),
+            "charge_amount": body["amount"],
+            "capture_amount": None,
+            "checkout_method": body.get("checkout_method", "ONE_TIME_PAYMENT"),
+            "channel_code": body["channel_code"],
+            "channel_properties": body.get("channel_properties") or {},
+            "actions": {
+                "desktop_web_checkout_url": checkout_url,
+                "mobile_web_checkout_url": checkout_url,
+                "mobile_deeplink_checkout_url": None,
+                "qr_checkout_string": None,
+            },
+            "is_redirect_required": True,
+            "created": _timestamp(now),
+            "updated": _timestamp(now),
+        }
+        self.store(charge, "ewallet", body["reference_id"], idempotency_key)
+        return charge
+
+    # Payments and callbacks
+
+    def schedule(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def pay(self, object_id: str, delay: bool = True) -> Optional[Dict[str, Any]]:
+        """Mark the object paid and deliver its callback"""
+        if delay:
+            await asyncio.sleep(self.callback_delay.sample())
+        entry = self.objects.get(object_id)
+        if entry is None:
+            return None
+        payload = self.settle(entry["kind"], entry["body"])
+        if payload is None:
+            return None
+        self.counts[f"paid_{entry['kind']}"] += 1
+        if self.callback_url:
+            async with self._callback_slots:
+                await self.deliver(payload)
+        return payload
+
+    def settle(self, kind: str, obj: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Update the stored object and build its callback body in Xendit's
+        shape: invoice and VA callbacks are flat, e-wallet callbacks wrap
+        the charge in the v2 {"event", "business_id", "created", "data"}
+        envelope
+        """
+        now = _timestamp(_now())
+        if kind == "invoice":
+            if obj["status"] != "PENDING":
+                return None
+            obj.update(status="PAID", paid_amount=obj["amount"], paid_at=now, payment_method="QR_CODE",
+                       payment_channel="QRIS", updated=now)
+            return {key: obj[key] for key in (
+                "id", "external_id", "user_id", "status", "merchant_name", "amount", "paid_amount", "paid_at",
+                "payer_email", "description", "payment_method", "payment_channel", "currency", "created", "updated",
+            )}
+        if kind == "va":
+            if obj["status"] == "INACTIVE":
+                return None
+            if obj["is_single_use"]:
+                obj["status"] = "INACTIVE"
+            payment_id = secrets.token_hex(12)
+            return {
+                "id": payment_id,
+                "payment_id": payment_id,
+                "callback_virtual_account_id": obj["id"],
+                "external_id": obj["external_id"],
+                "owner_id": obj["owner_id"],
+                "bank_code": obj["bank_code"],
+                "merchant_code": obj["merchant_code"],
+                "account_number": obj["account_number"],
+                "amount": obj["expected_amount"],
+                "status": "COMPLETED",
+                "transaction_timestamp": now,
+                "created": now,
+                "updated": now,
+            }
+        if obj["status"] != "PENDING":
+            return None
+        obj.update(status="SUCCEEDED", capture_amount=obj["charge_amount"], updated=now)
+        return {"event": "ewallet.capture", "business_id": obj["business_id"], "created": now, "data": dict(obj)}
+
+    async def deliver(self, payload: Dict[str, Any]):
+        headers = {"x-callback-token": self.callback_token}
+        for attempt in range(1, self.callback_retries + 1):
+            try:
+                response = await self.client.post(self.callback_url, json=payload, headers=headers)
+                if response.is_success:
+                    self.counts["callbacks_delivered"] += 1
+                    return
+                error = f"HTTP {response.status_code}"
+            except httpx.HTTPError as e:
+                error = f"{type(e).__name__}: {e}"
+            if attempt < self.callback_retries:
+                await asyncio.sleep(min(2 ** attempt * 0.5, 10.0))
+        self.counts["callbacks_failed"] += 1
+        body = payload.get("data") or payload
+        logger.warning("Callback for %s failed after %d attempts: %s",
+                       body.get("external_id") or body.get("reference_id"), self.callback_retries, error)
+
+    # Faults
+
+    def authorized(self, request: Request) -> bool:
+        if not self.api_key:
+            return True
+        credentials = base64.b64encode(f"{self.api_key}:".encode("utf-8")).decode("ascii")
+        return request.headers.get("authorization") == f"Basic {credentials}"
+
+    def fault(self, request: Request, create: bool) -> Optional[JSONResponse]:
+        """Rejection to answer instead of handling the call, if any"""
+        if not self.authorized(request):
+            self.counts["unauthorized"] += 1
+            return error_response(401, "INVALID_API_KEY", "API key is invalid")
+        if not self.bucket.allow():
+            self.counts["rate_limited"] += 1
+            return error_response(429, "RATE_LIMIT_EXCEEDED", "Too many requests")
+        if self.rng.random() < (self.create_error_rate if create else self.read_error_rate):
+            self.counts["injected_errors"] += 1
+            status = self.rng.choice(self.error_codes)
+            return error_response(status, "SERVER_ERROR", "Simulated failure")
+        return None
+
+    async def respond(self, create: bool, body: Any, status: int = 200) -> JSONResponse:
+        """Hold the response for the sampled latency (or a stall) and return it"""
+        if self.stall_rate and self.rng.random() < self.stall_rate:
+            self.counts["stalled"] += 1
+            await asyncio.sleep(self.stall_seconds)
+        else:
+            await asyncio.sleep((self.create_latency if create else self.read_latency).sample())
+        return JSONResponse(body, status_code=status)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "objects": len(self.objects),
+            "callbacks_pending": len(self._tasks),
+            "counts": dict(self.counts),
+        }
+
+
+def error_response(status: int, error_code: str, message: str) -> JSONResponse:
+    return JSONResponse({"error_code": error_code, "message": message}, status_code=status)
+
+
+def create_app(simulator: XenditSimulator) -> FastAPI:
+    app = FastAPI(title="Xendit API Simulator")
+
+    @app.on_event("shutdown")
+    async def shutdown_event():
+        await simulator.aclose()
+
+    @app.middleware("http")
+    async def count_requests(request: Request, call_next):
+        simulator.counts["requests"] += 1
+        return await call_next(request)
+
+    @app.post("/v2/invoices")
+    async def create_invoice(request: Request):
+        rejected = simulator.fault(request, create=True)
+        if rejected is not None:
+            return rejected
+        body = await request.json()
+        if not body.get("external_id") or not body.get("amount"):
+            return error_response(400, "API_VALIDATION_ERROR", "external_id and amount are required")
+        invoice = simulator.create_invoice(body, str(request.base_url))
+        return await simulator.respond(True, invoice)
+
+    @app.get("/v2/invoices")
+    async def list_invoices(request: Request, external_id: Optional[str] = None):
+        rejected = simulator.fault(request, create=False)
+        if rejected is not None:
+            return rejected
+        invoices: List[Dict[str, Any]] = []
+        invoice = simulator.get(simulator.by_external_id.get(external_id, ""), "invoice") if external_id else None
+        if invoice is not None:
+            invoices.append(invoice)
+        return await simulator.respond(False, invoices)
+
+    @app.get("/v2/invoices/{invoice_id}")
+    async def get_invoice(invoice_id: str, request: Request):
+        rejected = simulator.fault(request, create=False)
+        if rejected is not None:
+            return rejected
+        invoice = simulator.get(invoice_id, "invoice")
+        if invoice is None:
+            return error_response(404, "INVOICE_NOT_FOUND_ERROR", "Invoice not found")
+        return await simulator.respond(False, invoice)
+
+    @app.post("/callback_virtual_accounts")
+    async def create_virtual_account(request: Request):
+        rejected = simulator.fault(request, create=True)
+        if rejected is not None:
+            return rejected
+        idempotency_key = request.headers.get("x-idempotency-key")
+        existing = simulator.replay(idempotency_key)
+        if existing is not None:
+            return await simulator.respond(True, existing)
+        body = await request.json()
+        if not body.get("external_id") or not body.get("bank_code"):
+            return error_response(400, "API_VALIDATION_ERROR", "external_id and bank_code are required")
+        va = simulator.create_virtual_account(body, idempotency_key)
+        return await simulator.respond(True, va)
+
+    @app.get("/callback_virtual_accounts/{va_id}")
+    async def get_virtual_account(va_id: str, request: Request):
+        rejected = simulator.fault(request, create=False)
+        if rejected is not None:
+            return rejected
+        va = simulator.get(va_id, "va")
+        if va is None:
+            return error_response(404, "CALLBACK_VIRTUAL_ACCOUNT_NOT_FOUND_ERROR", "Virtual account not found")
+        return await simulator.respond(False, va)
+
+    @app.post("/ewallets/charges")
+    async def create_ewallet_charge(request: Request):
+        rejected = simulator.fault(request, create=True)
+        if rejected is not None:
+            return rejected
+        idempotency_key = request.headers.get("x-idempotency-key")
+        existing = simulator.replay(idempotency_key)
+        if existing is not None:
+            return await simulator.respond(True, existing, status=202)
+        body = await request.json()
+        if not body.get("reference_id") or not body.get("amount") or not body.get("channel_code"):
+            return error_response(400, "API_VALIDATION_ERROR", "reference_id, amount and channel_code are required")
+        charge = simulator.create_ewallet_charge(body, idempotency_key, str(request.base_url))
+        return await simulator.respond(True, charge, status=202)
+
+    @app.get("/ewallets/charges/{charge_id}")
+    async def get_ewallet_charge(charge_id: str, request: Request):
+        rejected = simulator.fault(request, create=False)
+        if rejected is not None:
+            return rejected
+        charge = simulator.get(charge_id, "ewallet")
+        if charge is None:
+            return error_response(404, "DATA_NOT_FOUND", "Charge not found")
+        return await simulator.respond(False, charge)
+
+    @app.post("/_simulator/payments/{object_id}/pay")
+    async def pay_now(object_id: str):
+        """Pay an object immediately (no fault injection) and return the callback body"""
+        if object_id not in simulator.objects:
+            return error_response(404, "DATA_NOT_FOUND", "Object not found")
+        payload = await simulator.pay(object_id, delay=False)
+        if payload is None:
+            return error_response(409, "ALREADY_PAID", "Object is already paid")
+        return payload
+
+    @app.get("/_simulator/stats")
+    async def simulator_stats():
+        return simulator.stats()
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.getenv("XENDIT_SIM_PORT", "9000")))
+    parser.add_argument("--create-latency", default="lognormal:250,0.5", help="Delay spec for POST calls")
+    parser.add_argument("--read-latency", default="lognormal:60,0.4", help="Delay spec for GET calls")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls answered with a 5xx")
+    parser.add_argument("--create-error-rate", type=float, help="Overrides --error-rate for POST calls")
+    parser.add_argument("--read-error-rate", type=float, help="Overrides --error-rate for GET calls")
+    parser.add_argument("--error-codes", default="500,503", help="Status codes injected errors are drawn from")
+    parser.add_argument("--stall-rate", type=float, default=0.0,
+                        help="Fraction of calls held for --stall-seconds after acting")
+    parser.add_argument("--stall-seconds", type=float, default=30.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Requests per second before 429 (0 = off)")
+    parser.add_argument("--burst", type=int, default=50, help="Token bucket size for --rate-limit")
+    parser.add_argument("--callback-url", default=os.getenv("XENDIT_SIM_CALLBACK_URL",
+                                                            "http://localhost:8001/api/xendit/webhook"),
+                        help="POS webhook for payment callbacks (empty disables callbacks)")
+    parser.add_argument("--callback-token", default=os.getenv("XENDIT_WEBHOOK_TOKEN", ""),
+                        help="x-callback-token sent with callbacks")
+    parser.add_argument("--callback-delay", default="uniform:500,3000", help="Delay spec from creation to payment")
+    parser.add_argument("--pay-rate", type=float, default=1.0, help="Fraction of payments that get paid")
+    parser.add_argument("--callback-retries", type=int, default=3, help="Delivery attempts per callback")
+    parser.add_argument("--callback-concurrency", type=int, default=50, help="Callbacks in flight at once")
+    parser.add_argument("--api-key", default="", help="Required basic auth username (empty accepts any)")
+    parser.add_argument("--max-objects", type=int, default=200000, help="Objects kept in memory")
+    parser.add_argument("--seed", type=int, help="Random seed for repeatable runs")
+    args = parser.parse_args()
+
+    try:
+        simulator = XenditSimulator.from_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    logger.info("Xendit simulator on http://%s:%d, callbacks to %s", args.host, args.port,
+                args.callback_url or "(disabled)")
+    uvicorn.run(create_app(simulator), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,24 @@
 """
 Backend API Test Suite for POS System
 Tests specific endpoints as requested in the review request
+
+Load mode (--load) drives the payment endpoints concurrently and writes a
+JSON report of throughput and latency percentiles per endpoint:
+    python backend_test.py --load --concurrency 50 --duration 60
+    python backend_test.py --load --rate 200 --duration 60 --warmup 10 \
+        --mix create_qris=3,poll_status=5,webhook_burst=1,list_payment_methods=2 --report load.json
 """
 
+import argparse
+import asyncio
+import os
+import random
 import requests
 import json
 import sys
-from typing import Dict, Any, Optional
+import time
+import uuid
+from typing import Dict, Any, List, Optional
 
 class POSAPITester:
     def __init__(self, base_url: str):
@@ -872,7 +884,44 @@ class POSAPITester:
                 
         except Exception as e:
             self.log_test('/api/payment-methods', 'GET', 'FAIL', f"Exception: {str(e)}")
-    
+
+    def test_webhook_redelivery(self, webhook_token: str = "", wait: float = 15.0):
+        """A callback that fails to apply must not swallow Xendit's redelivery of it"""
+        print("\n=== Testing Webhook Redelivery After A Failed Callback ===")
+
+        try:
+            response = self.make_request('POST', '/api/xendit/payments/qris',
+                                         {"amount": 25000, "customer_name": "Redelivery Test"})
+            if response.status_code != 200:
+                self.log_test('/api/xendit/webhook', 'POST', 'FAIL',
+                            f"Could not create payment: {response.status_code}")
+                return
+            payment = response.json()
+            callback = {"id": payment["payment_id"], "external_id": payment["reference_id"], "status": "PAID"}
+            headers = {"x-callback-token": webhook_token}
+
+            # paid_amount is not a number, so applying it fails and rolls back
+            self.make_request('POST', '/api/xendit/webhook', dict(callback, paid_amount="not-a-number"), dict(headers))
+            time.sleep(2)
+            response = self.make_request('POST', '/api/xendit/webhook', dict(callback, paid_amount=25000), dict(headers))
+            if "Duplicate" in response.json().get("message", ""):
+                self.log_test('/api/xendit/webhook', 'POST', 'FAIL', "Redelivery ignored as a duplicate")
+                return
+
+            status = None
+            deadline = time.time() + wait
+            while time.time() < deadline:
+                response = self.make_request('GET', f"/api/xendit/payments/{payment['payment_id']}/status")
+                status = response.json().get("payment", {}).get("status")
+                if status == "PAID":
+                    self.log_test('/api/xendit/webhook', 'POST', 'PASS', "Redelivered callback applied")
+                    return
+                time.sleep(0.5)
+            self.log_test('/api/xendit/webhook', 'POST', 'FAIL', f"Payment still {status} after redelivery")
+
+        except Exception as e:
+            self.log_test('/api/xendit/webhook', 'POST', 'FAIL', f"Exception: {str(e)}")
+
     def run_all_tests(self):
         """Run all test suites as specified in review request"""
         print("🚀 Starting POS API Testing - Product Bundle & Portion Support")
@@ -918,10 +967,271 @@ class POSAPITester:
         
         print("\n" + "=" * 50)
 
+# Scenario weights used when --mix is not given
+DEFAULT_LOAD_MIX = {
+    "create_qris": 3,
+    "poll_status": 5,
+    "webhook_burst": 1,
+    "list_payment_methods": 2,
+}
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(q * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class POSLoadTester(POSAPITester):
+    """
+    Load generator over the payment endpoints.
+    Closed loop: --concurrency workers each issue the next scenario as soon
+    as the previous one finishes. Open loop: scenarios start at --rate per
+    second (Poisson arrivals) whether or not earlier ones have finished, so
+    a slow server shows up as latency instead of lower offered load.
+    """
+
+    def __init__(self, base_url: str, concurrency: int = 10, rate: Optional[float] = None,
+                 duration: float = 30.0, warmup: float = 5.0, mix: Optional[Dict[str, float]] = None,
+                 webhook_burst: int = 10, webhook_token: str = "", max_in_flight: int = 1000,
+                 timeout: float = 10.0):
+        super().__init__(base_url)
+        self.concurrency = concurrency
+        self.rate = rate
+        self.duration = duration
+        self.warmup = warmup
+        self.mix = mix or dict(DEFAULT_LOAD_MIX)
+        self.webhook_burst = webhook_burst
+        self.webhook_token = webhook_token
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+
+        self.scenarios = {
+            "create_qris": self.scenario_create_qris,
+            "poll_status": self.scenario_poll_status,
+            "webhook_burst": self.scenario_webhook_burst,
+            "list_payment_methods": self.scenario_list_payment_methods,
+        }
+        unknown = set(self.mix) - set(self.scenarios)
+        if unknown:
+            raise ValueError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        self.client = None
+        self.recording = False
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+        self.payments: List[Dict[str, Any]] = []
+        self.dropped = 0
+
+    async def timed_request(self, method: str, endpoint: str, url: str, **kwargs):
+        """Send one request and record its latency under the endpoint template"""
+        headers = kwargs.pop("headers", {})
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=headers, **kwargs)
+            status = str(response.status_code)
+        except Exception as e:
+            response, status = None, type(e).__name__
+        elapsed = time.perf_counter() - started
+
+        if self.recording:
+            key = f"{method} {endpoint}"
+            self.latencies.setdefault(key, []).append(elapsed)
+            counts = self.statuses.setdefault(key, {})
+            counts[status] = counts.get(status, 0) + 1
+        return response
+
+    async def scenario_create_qris(self):
+        response = await self.timed_request(
+            "POST", "/api/xendit/payments/qris", "/api/xendit/payments/qris",
+            json={"amount": random.choice([15000, 25000, 48500, 120000]), "customer_name": "Load Test"}
+        )
+        if response is not None and response.status_code == 200:
+            data = response.json()
+            if data.get("payment_id"):
+                self.payments.append(data)
+                del self.payments[:-1000]
+
+    async def scenario_poll_status(self):
+        payment_id = random.choice(self.payments)["payment_id"] if self.payments else f"load-{uuid.uuid4().hex}"
+        await self.timed_request(
+            "GET", "/api/xendit/payments/{payment_id}/status", f"/api/xendit/payments/{payment_id}/status"
+        )
+
+    async def scenario_webhook_burst(self):
+        """Several PAID callbacks at once, as Xendit sends after a settlement batch"""
+        async def callback():
+            payment = random.choice(self.payments) if self.payments else {
+                "payment_id": f"load-{uuid.uuid4().hex}", "reference_id": f"load-{uuid.uuid4().hex}", "amount": 10000
+            }
+            await self.timed_request(
+                "POST", "/api/xendit/webhook", "/api/xendit/webhook",
+                headers={"x-callback-token": self.webhook_token},
+                json={"id": payment["payment_id"], "external_id": payment.get("reference_id"),
+                      "status": "PAID", "paid_amount": payment.get("amount", 0)}
+            )
+        await asyncio.gather(*[callback() for _ in range(self.webhook_burst)])
+
+    async def scenario_list_payment_methods(self):
+        await self.timed_request("GET", "/api/payment-methods", "/api/payment-methods")
+
+    def pick_scenario(self):
+        names = list(self.mix)
+        return self.scenarios[random.choices(names, weights=[self.mix[name] for name in names])[0]]
+
+    async def closed_loop(self, seconds: float):
+        deadline = time.perf_counter() + seconds
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                await self.pick_scenario()()
+
+        await asyncio.gather(*[worker() for _ in range(self.concurrency)])
+
+    async def open_loop(self, seconds: float):
+        deadline = time.perf_counter() + seconds
+        next_start = time.perf_counter()
+        tasks = set()
+        while True:
+            next_start += random.expovariate(self.rate)
+            if next_start >= deadline:
+                break
+            await asyncio.sleep(max(next_start - time.perf_counter(), 0))
+            if len(tasks) >= self.max_in_flight:
+                # The server is this far behind; count it rather than queue without bound
+                if self.recording:
+                    self.dropped += 1
+                continue
+            task = asyncio.create_task(self.pick_scenario()())
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def run_load(self) -> Dict[str, Any]:
+        import httpx
+
+        # No client-side connection cap: waiting for a pooled connection would be counted as server latency
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=max(self.concurrency, 100))
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=limits) as client:
+            self.client = client
+            run = self.open_loop if self.rate else self.closed_loop
+
+            if self.warmup > 0:
+                print(f"Warming up for {self.warmup:.0f}s...")
+                await run(self.warmup)
+
+            print(f"Measuring for {self.duration:.0f}s...")
+            self.recording = True
+            started = time.perf_counter()
+            await run(self.duration)
+            elapsed = time.perf_counter() - started
+            self.recording = False
+        return self.load_report(elapsed)
+
+    def load_report(self, elapsed: float) -> Dict[str, Any]:
+        endpoints = {}
+        total = errors = 0
+        for key, values in sorted(self.latencies.items()):
+            values.sort()
+            failed = sum(count for status, count in self.statuses[key].items()
+                         if not status.isdigit() or int(status) >= 500)
+            total += len(values)
+            errors += failed
+            endpoints[key] = {
+                "requests": len(values),
+                "errors": failed,
+                "statuses": self.statuses[key],
+                "throughput_rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2),
+                "mean_ms": round(sum(values) / len(values) * 1000, 2),
+            }
+        return {
+            "base_url": self.base_url,
+            "mode": "open" if self.rate else "closed",
+            "concurrency": None if self.rate else self.concurrency,
+            "arrival_rate": self.rate,
+            "mix": self.mix,
+            "warmup_seconds": self.warmup,
+            "duration_seconds": round(elapsed, 3),
+            "requests": total,
+            "errors": errors,
+            "dropped_arrivals": self.dropped,
+            "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "endpoints": endpoints,
+        }
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Parse "create_qris=3,poll_status=5" into scenario weights"""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip():
+            mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def run_load_test(args):
+    """Load mode: run the scenario mix and print/write the JSON report"""
+    tester = POSLoadTester(
+        args.base_url, concurrency=args.concurrency, rate=args.rate, duration=args.duration,
+        warmup=args.warmup, mix=parse_mix(args.mix) if args.mix else None,
+        webhook_burst=args.webhook_burst, webhook_token=args.webhook_token,
+        max_in_flight=args.max_in_flight
+    )
+    mode = f"open loop at {args.rate}/s" if args.rate else f"closed loop with {args.concurrency} workers"
+    print(f"Load testing POS API at: {args.base_url} ({mode})")
+    report = asyncio.run(tester.run_load())
+
+    output = json.dumps(report, indent=2)
+    if args.report:
+        with open(args.report, "w") as f:
+            f.write(output)
+        print(f"Report written to {args.report}")
+    else:
+        print(output)
+    sys.exit(1 if report["errors"] else 0)
+
+
 def main():
     """Main test execution"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8001", help="API base URL")
+    parser.add_argument("--load", action="store_true", help="Run the load test instead of the functional tests")
+    parser.add_argument("--concurrency", type=int, default=10, help="Closed loop: concurrent workers")
+    parser.add_argument("--rate", type=float, default=None, help="Open loop: scenario arrivals per second")
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="Unmeasured seconds before measuring")
+    parser.add_argument("--mix", help="Scenario weights, e.g. create_qris=3,poll_status=5,webhook_burst=1")
+    parser.add_argument("--webhook-burst", type=int, default=10, help="Callbacks per webhook_burst scenario")
+    parser.add_argument("--webhook-token", default=os.getenv("XENDIT_WEBHOOK_TOKEN", ""),
+                        help="x-callback-token sent with webhooks")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="Open loop: arrivals dropped past this")
+    parser.add_argument("--report", help="Write the JSON report to this file instead of stdout")
+    parser.add_argument("--webhook-redelivery", action="store_true",
+                        help="Only check that a redelivery of a failed callback is applied")
+    args = parser.parse_args()
+
+    if args.load:
+        run_load_test(args)
+        return
+
+    if args.webhook_redelivery:
+        tester = POSAPITester(args.base_url)
+        tester.test_webhook_redelivery(args.webhook_token)
+        tester.print_summary()
+        sys.exit(0 if all(t['status'] == 'PASS' for t in tester.test_results) else 1)
+
     # Use localhost for testing as the Go backend is running on port 8001
-    base_url = "http://localhost:8001"
+    base_url = args.base_url
     
     print(f"Testing POS API at: {base_url}")
     print("Testing Product API endpoints with new bundle and portion fields:")